@@ -0,0 +1,70 @@
+"""
+Month-end metrics generation for many restaurants in one pass.
+
+Seeds RESTAURANTS scratch restaurants with ORDERS_PER_RESTAURANT orders each in one month, then
+times PerformanceService.generate_all_monthly_metrics for that month. Needs the configured
+database, the scratch rows (and the metrics generated for every other restaurant) are deleted afterwards.
+
+    python -m benchmarks.bulk_metrics --restaurants 50000
+"""
+
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import text
+
+from core.database import dispose_async, get_active_engine
+from jobs.reconcile_rollups import rebuild_in_place
+from repository.performance import PerformanceRepository
+from services.performance import PerformanceService
+
+PREFIX = "benchmark-bulk-"
+YEAR, MONTH = 2024, 2
+
+SEED_STATEMENTS = [
+    """INSERT INTO restaurant (restaurant_id, name, address, phone, email, status, created_at, updated_at)
+       SELECT :prefix || g, 'Restaurant ' || g, 'addr', '1', 'r@example.com', 'NEW', now(), now() FROM generate_series(1, :restaurants) g""",
+    """INSERT INTO "user" (user_id, name, email, phone, role, hashed_password, restaurant_id, created_at, updated_at)
+       SELECT :prefix || g, 'User ' || g, :prefix || g || '@example.com', '1', 'STAFF', 'x', :prefix || g, now(), now() FROM generate_series(1, :restaurants) g""",
+    # One shared interaction, deleting one per restaurant would scan "order" for each of them
+    """INSERT INTO interaction (interaction_id, user_id, restaurant_id, interaction_type, interaction_date) VALUES (:prefix || 1, :prefix || 1, :prefix || 1, 'Order', now())""",
+    """INSERT INTO "order" (order_id, restaurant_id, user_id, interaction_id, status, amount, created_at, updated_at)
+       SELECT :prefix || r || '-' || o, :prefix || r, :prefix || r, :prefix || 1, 'NEW', (r * o) % 500 + 1,
+              timestamptz '2024-02-01' + random() * interval '29 days', now()
+       FROM generate_series(1, :restaurants) r, generate_series(1, :orders) o""",
+]
+
+
+def _cleanup(connection):
+    connection.execute(text("DELETE FROM performance_metric WHERE period_start = make_date(:year, :month, 1)"), {"year": YEAR, "month": MONTH})
+    for table in ("order_rollup", '"order"', "interaction", '"user"', "restaurant"):
+        connection.execute(text(f"DELETE FROM {table} WHERE restaurant_id LIKE :prefix || '%'"), {"prefix": PREFIX})
+
+
+async def main(args):
+    engine = get_active_engine()
+    try:
+        with engine.begin() as connection:
+            _cleanup(connection)
+            started = time.perf_counter()
+            for statement in SEED_STATEMENTS:
+                connection.execute(text(statement), {"prefix": PREFIX, "restaurants": args.restaurants, "orders": args.orders_per_restaurant})
+            # Orders written directly bypass OrderService, so their rollups are built as a migration would
+            rebuild_in_place(connection)
+            connection.execute(text("ANALYZE"))
+            print(f"Seeded {args.restaurants} restaurants with {args.restaurants * args.orders_per_restaurant} orders in {time.perf_counter() - started:.1f}s")
+
+        result = await PerformanceService(PerformanceRepository()).generate_all_monthly_metrics(YEAR, MONTH, progress=lambda done, total: None)
+        print(f"Generated metrics of {result['restaurants']} restaurants in {result['duration_seconds']}s")
+    finally:
+        with engine.begin() as connection:
+            _cleanup(connection)
+        await dispose_async()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--restaurants", type=int, default=50_000)
+    parser.add_argument("--orders-per-restaurant", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,141 @@
+"""
+Memory and latency of PerformanceRepository.calculate_metrics against loading the orders into Python.
+
+Seeds ORDERS orders for one scratch restaurant within a single month, then computes the month's
+metrics three ways: the original implementation that fetched every Order as an ORM object and summed
+them in Python, the aggregate query calculate_metrics runs over the orders of an arbitrary period, and
+the single order rollup row it reads for a calendar month. Reports the median latency and the peak
+Python memory (tracemalloc) of each. Needs the configured database, the scratch rows
+are deleted afterwards.
+
+    python -m benchmarks.calculate_metrics --orders 300000
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from sqlalchemy import select, text
+
+from core.database import DbConnector, dispose, get_active_engine
+from models.order import Order
+from jobs.reconcile_rollups import repair
+from repository.performance import _day_start, _period_aggregate, _rollup_aggregate
+
+RESTAURANT_ID = "benchmark-calculate-metrics"
+START_DATE = date(2024, 3, 1)
+END_DATE = date(2024, 3, 31)
+
+
+def _seed(orders: int):
+    with get_active_engine().begin() as connection:
+        _cleanup(connection)
+        connection.execute(
+            text(
+                "INSERT INTO restaurant (restaurant_id, name, address, phone, email, status, created_at, updated_at) "
+                "VALUES (:id, 'Benchmark', 'addr', '1', 'benchmark@example.com', 'NEW', now(), now())"
+            ),
+            {"id": RESTAURANT_ID},
+        )
+        connection.execute(
+            text(
+                'INSERT INTO "user" (user_id, name, email, phone, role, hashed_password, restaurant_id, created_at, updated_at) '
+                "VALUES (:id, 'Benchmark', 'benchmark-calculate-metrics@example.com', '1', 'STAFF', 'x', :id, now(), now())"
+            ),
+            {"id": RESTAURANT_ID},
+        )
+        connection.execute(
+            text("INSERT INTO interaction (interaction_id, user_id, restaurant_id, interaction_type, interaction_date) VALUES (:id, :id, :id, 'Order', now())"),
+            {"id": RESTAURANT_ID},
+        )
+        connection.execute(
+            text(
+                'INSERT INTO "order" (order_id, restaurant_id, user_id, interaction_id, status, amount, created_at, updated_at) '
+                "SELECT :id || '-' || g, :id, :id, :id, 'NEW', (g % 500) + 1, timestamptz '2024-03-01' + random() * interval '31 days', now() "
+                "FROM generate_series(1, :orders) g"
+            ),
+            {"id": RESTAURANT_ID, "orders": orders},
+        )
+        repair(connection, RESTAURANT_ID, START_DATE)
+        connection.execute(text('ANALYZE "order"'))
+
+
+def _cleanup(connection):
+    for table in ("order_rollup", '"order"', "interaction", '"user"', "restaurant"):
+        connection.execute(text(f"DELETE FROM {table} WHERE restaurant_id = :id"), {"id": RESTAURANT_ID})
+
+
+async def _in_python():
+    """The previous implementation: every order of the period becomes an ORM object"""
+    db = DbConnector()
+    await db.open()
+    try:
+        result = await db.execute(
+            select(Order).where(Order.restaurant_id == RESTAURANT_ID, Order.created_at >= _day_start(START_DATE), Order.created_at < _day_start(END_DATE + timedelta(days=1)))
+        )
+        orders = result.scalars().all()
+        total_orders = len(orders)
+        total_amount = sum(order.amount for order in orders)
+        return total_orders, total_amount
+    finally:
+        await db.close_session()
+
+
+async def _in_sql():
+    db = DbConnector()
+    await db.open()
+    try:
+        total_orders, total_amount, _, _ = (await db.execute(_period_aggregate(RESTAURANT_ID, START_DATE, END_DATE))).one()
+        return total_orders, total_amount
+    finally:
+        await db.close_session()
+
+
+async def _from_rollup():
+    db = DbConnector()
+    await db.open()
+    try:
+        total_orders, total_amount, _, _ = (await db.execute(_rollup_aggregate(RESTAURANT_ID, START_DATE))).one()
+        return total_orders, total_amount
+    finally:
+        await db.close_session()
+
+
+def _measure(implementation, repeat: int) -> dict:
+    tracemalloc.start()
+    result = asyncio.run(implementation())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        asyncio.run(implementation())
+        timings.append((time.perf_counter() - started) * 1000)
+    return {"result": result, "median_ms": statistics.median(timings), "peak_mib": peak / 2**20}
+
+
+def main(args):
+    try:
+        _seed(args.orders)
+        in_python = _measure(_in_python, args.repeat)
+        in_sql = _measure(_in_sql, args.repeat)
+        from_rollup = _measure(_from_rollup, args.repeat)
+        for measured in (in_sql, from_rollup):
+            assert tuple(measured["result"]) == tuple(in_python["result"]), f"{measured['result']} != {in_python['result']}"
+        for name, measured in (("ORM objects in Python", in_python), ("aggregate query", in_sql), ("order rollup", from_rollup)):
+            print(f"{name:>22}: median={measured['median_ms']:.1f}ms  peak_memory={measured['peak_mib']:.1f}MiB  orders={measured['result'][0]}")
+    finally:
+        with get_active_engine().begin() as connection:
+            _cleanup(connection)
+        dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=300_000, help="Orders seeded for the measured month")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per implementation, the median is reported")
+    main(parser.parse_args())
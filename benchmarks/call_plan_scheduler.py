@@ -0,0 +1,85 @@
+"""
+Due calls from the in-process scheduler against the database query, as the call plan table grows.
+
+Seeds --call-plans scratch call plans spread over --users key account managers, then times the first page of one
+user's due calls from CallPlanRepository.get_due_calls and from CallPlanScheduler.due, and how long loading the
+scheduler takes. Needs the configured database, the scratch rows are deleted afterwards.
+
+    python -m benchmarks.call_plan_scheduler --call-plans 2000000 --users 1000
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import date
+
+from sqlalchemy import text
+
+from core.database import dispose, dispose_async, get_active_engine
+from repository.call_plan import CallPlanRepository, iter_schedule
+from services.call_plan import CallPlanScheduler
+
+PREFIX = "benchmark-scheduler-"
+
+SEED_STATEMENTS = [
+    """INSERT INTO restaurant (restaurant_id, name, address, phone, email, status, created_at, updated_at)
+       VALUES (:prefix || 1, 'Restaurant', 'addr', '1', 'r@example.com', 'NEW', now(), now())""",
+    """INSERT INTO "user" (user_id, name, email, phone, role, hashed_password, restaurant_id, created_at, updated_at)
+       SELECT :prefix || g, 'KAM', :prefix || g || '@example.com', '1', 'MANAGER', 'x', :prefix || 1, now(), now() FROM generate_series(1, :users) g""",
+    """INSERT INTO call_plan (call_plan_id, restaurant_id, user_id, frequency_days, next_call_date, created_at, updated_at)
+       SELECT :prefix || g, :prefix || 1, :prefix || (g % :users + 1), 7, current_date + (g % 365) - 180, now(), now() FROM generate_series(1, :call_plans) g""",
+]
+
+
+def _cleanup(connection):
+    for table in ("call_plan", '"user"', "restaurant"):
+        connection.execute(text(f"DELETE FROM {table} WHERE restaurant_id LIKE :prefix || '%'"), {"prefix": PREFIX})
+
+
+async def _median_ms(call, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await call()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+async def main(args):
+    engine = get_active_engine()
+    repository = CallPlanRepository()
+    try:
+        with engine.begin() as connection:
+            _cleanup(connection)
+            for statement in SEED_STATEMENTS:
+                connection.execute(text(statement), {"prefix": PREFIX, "users": args.users, "call_plans": args.call_plans})
+            connection.execute(text("ANALYZE call_plan"))
+
+        scheduler = CallPlanScheduler()
+        started = time.perf_counter()
+        scheduler.reconcile(iter_schedule(engine), since=0)
+        print(f"Loaded {scheduler.stats()['call_plans']} call plans into the scheduler in {time.perf_counter() - started:.1f}s")
+
+        user_id, today = f"{PREFIX}1", date.today()
+
+        async def from_scheduler():
+            return scheduler.due(user_id, today, args.limit)
+
+        database = await _median_ms(lambda: repository.get_due_calls(user_id, today, args.limit), args.repeat)
+        in_process = await _median_ms(from_scheduler, args.repeat)
+        print(f"First {args.limit} due calls of one user: database {database:.2f}ms, scheduler {in_process:.3f}ms")
+    finally:
+        with engine.begin() as connection:
+            _cleanup(connection)
+        dispose()
+        await dispose_async()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--call-plans", type=int, default=2_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,85 @@
+"""
+Latency of concurrent API requests with the sync and async session modes.
+
+Fires PARALLEL_REQUESTS requests at once against the ASGI app for every mode and
+reports p50/p99/max latency, along with the p99 of /health requests sent alongside
+them, which shows how long the event loop is held up by database work.
+Needs the configured database with at least one user.
+
+    python -m benchmarks.db_concurrency --email kfc_user1@email.com --restaurant-id <id>
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import httpx
+
+from core.config import AUTH_CONTROLLER
+from core.database import SESSION_MODE_ASYNC, SESSION_MODE_SYNC, dispose_async
+from main import app
+
+
+class _TokenUser:
+    def __init__(self, email: str):
+        self.email = email
+
+
+def _percentile(values, percentile: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def _timed_request(client: httpx.AsyncClient, url: str, headers: dict = None) -> float:
+    started = time.perf_counter()
+    response = await client.get(url, headers=headers)
+    response.raise_for_status()
+    return (time.perf_counter() - started) * 1000
+
+
+async def run_mode(mode: str, parallel_requests: int, rounds: int, url: str, headers: dict) -> dict:
+    os.environ["DB_SESSION_MODE"] = mode
+    latencies = []
+    health_latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        # Warm up the pool so connection setup does not skew the first round
+        await _timed_request(client, url, headers)
+        for _ in range(rounds):
+            db_requests = [_timed_request(client, url, headers) for _ in range(parallel_requests)]
+            health_requests = [_timed_request(client, "/health") for _ in range(parallel_requests)]
+            results = await asyncio.gather(*db_requests, *health_requests)
+            latencies.extend(results[:parallel_requests])
+            health_latencies.extend(results[parallel_requests:])
+    await dispose_async()
+    return {
+        "mode": mode,
+        "requests": len(latencies),
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": _percentile(latencies, 99),
+        "max_ms": max(latencies),
+        "health_p99_ms": _percentile(health_latencies, 99),
+    }
+
+
+async def main(args):
+    headers = {"Authorization": f"Bearer {AUTH_CONTROLLER.token_strategy.create_token(_TokenUser(args.email))}"}
+    url = f"/v1/restaurants/{args.restaurant_id}"
+    for mode in args.modes:
+        result = await run_mode(mode, args.parallel, args.rounds, url, headers)
+        print(
+            f"{result['mode']:>10}  requests={result['requests']}  p50={result['p50_ms']:.1f}ms  p99={result['p99_ms']:.1f}ms  max={result['max_ms']:.1f}ms  health_p99={result['health_p99_ms']:.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--email", required=True, help="Email of an existing user to issue the token for")
+    parser.add_argument("--restaurant-id", required=True, help="Restaurant fetched by every request")
+    parser.add_argument("--parallel", type=int, default=200, help="Concurrent requests per round")
+    parser.add_argument("--rounds", type=int, default=5, help="Number of rounds per mode")
+    parser.add_argument("--modes", nargs="+", default=[SESSION_MODE_SYNC, SESSION_MODE_ASYNC])
+    asyncio.run(main(parser.parse_args()))
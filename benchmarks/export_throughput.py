@@ -0,0 +1,81 @@
+"""
+Throughput of the columnar export.
+
+Seeds ORDERS scratch orders spread over 12 months, then times exporting the order table to Parquet
+(python -m jobs.export_tables) and streaming it as Arrow IPC (GET /v1/exports/order). Reports rows/sec and
+the peak resident memory of the process, which stays flat as --orders grows. Needs the configured database,
+the scratch rows are deleted afterwards.
+
+    python -m benchmarks.export_throughput --orders 1000000
+"""
+
+import argparse
+import resource
+import shutil
+import tempfile
+import time
+
+from sqlalchemy import text
+
+from core.database import dispose, get_active_engine
+from services.export import DEFAULT_BATCH_SIZE, arrow_stream, export_parquet
+
+PREFIX = "benchmark-export-"
+
+SEED_STATEMENTS = [
+    """INSERT INTO restaurant (restaurant_id, name, address, phone, email, status, created_at, updated_at)
+       VALUES (:prefix || 1, 'Restaurant', 'addr', '1', 'r@example.com', 'NEW', now(), now())""",
+    """INSERT INTO "user" (user_id, name, email, phone, role, hashed_password, restaurant_id, created_at, updated_at)
+       VALUES (:prefix || 1, 'User', :prefix || '1@example.com', '1', 'STAFF', 'x', :prefix || 1, now(), now())""",
+    """INSERT INTO interaction (interaction_id, user_id, restaurant_id, interaction_type, interaction_date) VALUES (:prefix || 1, :prefix || 1, :prefix || 1, 'Order', now())""",
+    """INSERT INTO "order" (order_id, restaurant_id, user_id, interaction_id, status, amount, created_at, updated_at)
+       SELECT :prefix || g, :prefix || 1, :prefix || 1, :prefix || 1, 'NEW', g % 500 + 1,
+              timestamptz '2024-01-01' + random() * interval '365 days', now()
+       FROM generate_series(1, :orders) g""",
+]
+
+
+def _cleanup(connection):
+    connection.execute(text("""DELETE FROM "order" WHERE order_id LIKE :prefix || '%'"""), {"prefix": PREFIX})
+    for table in ("interaction", '"user"', "restaurant"):
+        connection.execute(text(f"DELETE FROM {table} WHERE restaurant_id LIKE :prefix || '%'"), {"prefix": PREFIX})
+
+
+def _peak_memory_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main(args):
+    engine = get_active_engine()
+    directory = tempfile.mkdtemp(prefix="export-benchmark-")
+    try:
+        with engine.begin() as connection:
+            _cleanup(connection)
+            started = time.perf_counter()
+            for statement in SEED_STATEMENTS:
+                connection.execute(text(statement), {"prefix": PREFIX, "orders": args.orders})
+            connection.execute(text('ANALYZE "order"'))
+            print(f"Seeded {args.orders} orders in {time.perf_counter() - started:.1f}s, peak memory {_peak_memory_mb():.0f}MB")
+
+        started = time.perf_counter()
+        rows = export_parquet(engine, directory, ["order"], batch_size=args.batch_size)["order"]
+        elapsed = time.perf_counter() - started
+        print(f"Parquet export: {rows} rows in {elapsed:.1f}s, {rows / elapsed:,.0f} rows/sec, peak memory {_peak_memory_mb():.0f}MB")
+
+        started = time.perf_counter()
+        size = sum(len(chunk) for chunk in arrow_stream(engine, "order", batch_size=args.batch_size))
+        elapsed = time.perf_counter() - started
+        print(f"Arrow stream: {size / 2**20:.0f}MB in {elapsed:.1f}s, {rows / elapsed:,.0f} rows/sec, peak memory {_peak_memory_mb():.0f}MB")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+        with engine.begin() as connection:
+            _cleanup(connection)
+        dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    main(parser.parse_args())
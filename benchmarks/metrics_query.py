@@ -0,0 +1,103 @@
+"""
+Monthly metrics query over ISO-string versus TIMESTAMP WITH TIME ZONE order timestamps.
+
+Fills two scratch tables shaped like "order" with the same ORDERS rows, one keeping created_at
+as the ISO string of schema version 1 and one with the native column of version 2, both indexed
+on (restaurant_id, created_at). Then times the query calculate_metrics runs for one restaurant
+and one month: func.date(created_at) on the string column against a half-open range on the typed one.
+Needs the configured database, the scratch tables are dropped afterwards.
+
+    python -m benchmarks.metrics_query --orders 10000000
+"""
+
+import argparse
+import statistics
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import text
+
+from core.database import dispose, get_active_engine
+
+RESTAURANTS = 1000
+DAYS = 730
+
+BEFORE_QUERY = """
+SELECT count(*), sum(amount) FROM benchmark_order_text
+WHERE restaurant_id = :restaurant_id AND date(created_at) >= :start_date AND date(created_at) <= :end_date
+"""
+
+AFTER_QUERY = """
+SELECT count(*), sum(amount) FROM benchmark_order_ts
+WHERE restaurant_id = :restaurant_id AND created_at >= :start_date AND created_at < :end_date + 1
+"""
+
+
+def _create_tables(connection, orders: int):
+    for table, column_type, value in (
+        ("benchmark_order_text", "VARCHAR", "to_char(ts, 'YYYY-MM-DD\"T\"HH24:MI:SS.US')"),
+        ("benchmark_order_ts", "TIMESTAMP WITH TIME ZONE", "ts"),
+    ):
+        connection.execute(text(f"DROP TABLE IF EXISTS {table}"))
+        connection.execute(
+            text(f"CREATE UNLOGGED TABLE {table} (order_id BIGINT PRIMARY KEY, restaurant_id VARCHAR NOT NULL, amount INTEGER NOT NULL, created_at {column_type} NOT NULL)")
+        )
+        connection.execute(
+            text(
+                f"INSERT INTO {table} SELECT g, 'restaurant-' || (g % {RESTAURANTS}), (g % 500) + 1, {value} "
+                f"FROM generate_series(1, :orders) g, LATERAL (SELECT timestamp '2023-01-01' + ((g::bigint * 7919) % ({DAYS} * 86400)) * interval '1 second' AS ts) t"
+            ),
+            {"orders": orders},
+        )
+        connection.execute(text(f"CREATE INDEX ON {table} (restaurant_id, created_at)"))
+        connection.execute(text(f"ANALYZE {table}"))
+
+
+def _drop_tables(connection):
+    connection.execute(text("DROP TABLE IF EXISTS benchmark_order_text"))
+    connection.execute(text("DROP TABLE IF EXISTS benchmark_order_ts"))
+
+
+def _time_query(connection, query: str, params: dict, repeat: int) -> tuple:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        row = connection.execute(text(query), params).one()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), tuple(row)
+
+
+def main(args):
+    engine = get_active_engine()
+    try:
+        with engine.begin() as connection:
+            started = time.perf_counter()
+            _create_tables(connection, args.orders)
+            print(f"Loaded {args.orders} orders into both tables in {time.perf_counter() - started:.1f}s")
+
+        month_end = (args.month.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        params = {"restaurant_id": "restaurant-42", "start_date": args.month, "end_date": month_end}
+        with engine.connect() as connection:
+            before_ms, before_row = _time_query(connection, BEFORE_QUERY, params, args.repeat)
+            after_ms, after_row = _time_query(connection, AFTER_QUERY, params, args.repeat)
+            after_plan = "\n".join(row[0] for row in connection.execute(text(f"EXPLAIN {AFTER_QUERY}"), params))
+
+        assert before_row == after_row, f"Queries disagree: {before_row} != {after_row}"
+        print(f"string column, func.date filter:  median={before_ms:.1f}ms  orders={before_row[0]}")
+        print(f"timestamptz column, range filter: median={after_ms:.1f}ms  orders={after_row[0]}")
+        print(f"speedup: {before_ms / after_ms:.1f}x\n\n{after_plan}")
+    finally:
+        if not args.keep:
+            with engine.begin() as connection:
+                _drop_tables(connection)
+        dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=10_000_000, help="Rows loaded into each scratch table")
+    parser.add_argument("--month", type=date.fromisoformat, default="2024-03-01", help="First day of the measured month")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per query, the median is reported")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch tables for further inspection")
+    args = parser.parse_args()
+    main(args)
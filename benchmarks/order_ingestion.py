@@ -0,0 +1,96 @@
+"""
+Throughput of the bulk order import (POST /v1/orders/bulk, python -m jobs.import_orders).
+
+Writes ORDERS scratch orders for --restaurants restaurants over 12 months to a temporary NDJSON or CSV file, then
+imports it and reports orders/sec and the peak resident memory of the process. Every --invalid-every-th order is
+rejected. Needs the configured database, the scratch rows are deleted afterwards.
+
+    python -m benchmarks.order_ingestion --orders 200000 --format ndjson
+"""
+
+import argparse
+import csv
+import json
+import os
+import resource
+import tempfile
+import time
+
+from sqlalchemy import text
+
+from core.database import dispose, get_active_engine
+from services.order_import import DEFAULT_CHUNK_SIZE, IMPORT_FORMATS, import_orders, parse_file
+
+PREFIX = "benchmark-ingestion-"
+
+SEED_STATEMENTS = [
+    """INSERT INTO restaurant (restaurant_id, name, address, phone, email, status, created_at, updated_at)
+       SELECT :prefix || g, 'Restaurant ' || g, 'addr', '1', 'r@example.com', 'NEW', now(), now() FROM generate_series(1, :restaurants) g""",
+    """INSERT INTO "user" (user_id, name, email, phone, role, hashed_password, restaurant_id, created_at, updated_at)
+       SELECT :prefix || g, 'User ' || g, :prefix || g || '@example.com', '1', 'STAFF', 'x', :prefix || g, now(), now() FROM generate_series(1, :restaurants) g""",
+]
+
+
+def _cleanup(connection):
+    for table in ("order_rollup", '"order"', "interaction", '"user"', "restaurant"):
+        connection.execute(text(f"DELETE FROM {table} WHERE restaurant_id LIKE :prefix || '%'"), {"prefix": PREFIX})
+
+
+def _write_orders(path: str, args):
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file) if args.format == "csv" else None
+        if writer:
+            writer.writerow(["restaurant_id", "user_id", "amount", "created_at", "notes"])
+        for n in range(args.orders):
+            restaurant = f"{PREFIX}{n % args.restaurants + 1}"
+            amount = -1 if args.invalid_every and n % args.invalid_every == 0 else n % 500 + 1
+            created_at = f"2024-{n % 12 + 1:02d}-{n % 28 + 1:02d}T12:00:00Z"
+            if writer:
+                writer.writerow([restaurant, restaurant, amount, created_at, "POS sync"])
+            else:
+                file.write(json.dumps({"restaurant_id": restaurant, "user_id": restaurant, "amount": amount, "created_at": created_at, "notes": "POS sync"}) + "\n")
+
+
+def _peak_memory_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main(args):
+    engine = get_active_engine()
+    path = tempfile.mktemp(suffix=f".{args.format}")
+    try:
+        with engine.begin() as connection:
+            _cleanup(connection)
+            for statement in SEED_STATEMENTS:
+                connection.execute(text(statement), {"prefix": PREFIX, "restaurants": args.restaurants})
+        # Foreign key checks are planned from the statistics, stale ones make them scan the seeded tables
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text('ANALYZE restaurant, "user", interaction, "order", order_rollup'))
+        _write_orders(path, args)
+        print(f"Wrote {args.orders} orders to a {os.path.getsize(path) / 2**20:.0f}MB {args.format} file")
+
+        started = time.perf_counter()
+        with open(path, "rb") as file:
+            report = import_orders(engine, parse_file(file, args.format), args.chunk_size)
+        elapsed = time.perf_counter() - started
+        print(
+            f"Imported {report['inserted']} orders ({report['failed']} rejected) in {elapsed:.1f}s, "
+            f"{report['received'] / elapsed:,.0f} orders/sec, peak memory {_peak_memory_mb():.0f}MB"
+        )
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+        with engine.begin() as connection:
+            _cleanup(connection)
+        dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--orders", type=int, default=200_000)
+    parser.add_argument("--restaurants", type=int, default=1000)
+    parser.add_argument("--format", choices=IMPORT_FORMATS, default="ndjson")
+    parser.add_argument("--invalid-every", type=int, default=100)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    main(parser.parse_args())
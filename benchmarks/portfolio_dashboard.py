@@ -0,0 +1,84 @@
+"""
+Latency of the key account manager dashboard (GET /v1/portfolio) by portfolio size.
+
+Seeds one scratch key account manager per size in --sizes, each with that many restaurants, a call plan,
+INTERACTIONS interactions and a month of orders per restaurant, then times PortfolioService.get_portfolio.
+Run it with DB_SESSION_MODE=async or threadpool to let the four queries run in parallel. Needs the configured
+database, the scratch rows are deleted afterwards.
+
+    python -m benchmarks.portfolio_dashboard --sizes 10 100 1000 3000
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import text
+
+from core.database import dispose_async, get_active_engine
+from jobs.reconcile_rollups import rebuild_in_place
+from repository.portfolio import PortfolioRepository
+from repository.user import UserRepository
+from services.portfolio import PortfolioService
+
+PREFIX = "benchmark-portfolio-"
+
+SEED_STATEMENTS = [
+    """INSERT INTO restaurant (restaurant_id, name, address, phone, email, status, created_at, updated_at)
+       SELECT :prefix || :size || '-' || g, 'Restaurant ' || g, 'addr', '1', 'r@example.com', 'NEW', now(), now() FROM generate_series(1, :size) g""",
+    """INSERT INTO "user" (user_id, name, email, phone, role, hashed_password, restaurant_id, created_at, updated_at)
+       VALUES (:prefix || :size, 'KAM', :prefix || :size || '@example.com', '1', 'MANAGER', 'x', :prefix || :size || '-1', now(), now())""",
+    """INSERT INTO call_plan (call_plan_id, restaurant_id, user_id, frequency_days, next_call_date, created_at, updated_at)
+       SELECT :prefix || :size || '-' || g, :prefix || :size || '-' || g, :prefix || :size, 7, current_date + (g % 14) - 7, now(), now()
+       FROM generate_series(1, :size) g""",
+    """INSERT INTO interaction (interaction_id, user_id, restaurant_id, interaction_type, interaction_date)
+       SELECT :prefix || :size || '-' || g || '-' || i, :prefix || :size, :prefix || :size || '-' || g, 'Call', now() - i * interval '1 day'
+       FROM generate_series(1, :size) g, generate_series(1, :interactions) i""",
+    """INSERT INTO "order" (order_id, restaurant_id, user_id, interaction_id, status, amount, created_at, updated_at)
+       SELECT :prefix || :size || '-' || g || '-' || i, :prefix || :size || '-' || g, :prefix || :size, :prefix || :size || '-' || g || '-' || i, 'NEW', 100,
+              date_trunc('month', now()) + i * interval '1 hour', now()
+       FROM generate_series(1, :size) g, generate_series(1, 5) i""",
+]
+
+
+def _cleanup(connection):
+    for table in ("order_rollup", '"order"', "interaction", "call_plan", '"user"', "restaurant"):
+        connection.execute(text(f"DELETE FROM {table} WHERE restaurant_id LIKE :prefix || '%'"), {"prefix": PREFIX})
+
+
+async def main(args):
+    engine = get_active_engine()
+    try:
+        with engine.begin() as connection:
+            _cleanup(connection)
+            for size in args.sizes:
+                for statement in SEED_STATEMENTS:
+                    connection.execute(text(statement), {"prefix": PREFIX, "size": size, "interactions": args.interactions})
+            # Orders written directly bypass OrderService, so their rollups are built as a migration would
+            rebuild_in_place(connection)
+            connection.execute(text("ANALYZE"))
+
+        service = PortfolioService(PortfolioRepository(), UserRepository())
+        for size in args.sizes:
+            email = f"{PREFIX}{size}@example.com"
+            await service.get_portfolio(email)
+            timings = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                portfolio = await service.get_portfolio(email)
+                timings.append((time.perf_counter() - started) * 1000)
+            assert portfolio["total"] == size
+            print(f"{size:>6} restaurants: median {statistics.median(timings):.1f}ms, max {max(timings):.1f}ms")
+    finally:
+        with engine.begin() as connection:
+            _cleanup(connection)
+        await dispose_async()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 3000])
+    parser.add_argument("--interactions", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,102 @@
+"""
+Portfolio-wide trend analysis.
+
+Seeds RESTAURANTS scratch restaurants with a monthly metric for each of the last MONTHS months, then
+times PerformanceService.analyze_portfolio_trends end to end and each of its steps, next to a
+per-restaurant Python loop doing the same least-squares fit. Needs the configured database, the scratch
+rows are deleted afterwards.
+
+    python -m benchmarks.portfolio_trends --restaurants 100000 --months 12
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import text
+
+from core.database import dispose_async, get_active_engine
+from repository.performance import PerformanceRepository
+from services.performance import PerformanceService, group_series, series_trends
+
+PREFIX = "benchmark-trends-"
+
+SEED_STATEMENTS = [
+    """INSERT INTO restaurant (restaurant_id, name, address, phone, email, status, created_at, updated_at)
+       SELECT :prefix || g, 'Restaurant ' || g, 'addr', '1', 'r@example.com', 'NEW', now(), now() FROM generate_series(1, :restaurants) g""",
+    """INSERT INTO performance_metric (metric_id, restaurant_id, period_start, period_end, total_orders, total_amount, average_order_value, order_frequency,
+                                       created_at, updated_at)
+       SELECT :prefix || r || '-' || m, :prefix || r, period_start, (period_start + interval '1 month - 1 day')::date,
+              orders, orders * 150.0, 150.0 + r % 50, 30.0 / orders, now(), now()
+       FROM generate_series(1, :restaurants) r, generate_series(0, :months - 1) m,
+            LATERAL (SELECT (date_trunc('month', current_date) - m * interval '1 month')::date AS period_start,
+                            greatest(1, 20 + (r % 7 - 3) * m + (random() * 10)::int) AS orders) s""",
+]
+
+
+def _cleanup(connection):
+    for table in ("performance_metric", "restaurant"):
+        connection.execute(text(f"DELETE FROM {table} WHERE restaurant_id LIKE :prefix || '%'"), {"prefix": PREFIX})
+
+
+def _python_slopes(months: np.ndarray, values: np.ndarray, starts: np.ndarray) -> list:
+    bounds = np.append(starts, len(months))
+    slopes = []
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        x = months[first:last].tolist()
+        for column in range(values.shape[1]):
+            y = values[first:last, column].tolist()
+            mean_x, mean_y = sum(x) / len(x), sum(y) / len(y)
+            sxx = sum((xi - mean_x) ** 2 for xi in x)
+            slopes.append(sum((xi - mean_x) * (yi - mean_y) for xi, yi in zip(x, y)) / sxx if sxx else 0)
+    return slopes
+
+
+async def main(args):
+    engine = get_active_engine()
+    try:
+        with engine.begin() as connection:
+            _cleanup(connection)
+            started = time.perf_counter()
+            for statement in SEED_STATEMENTS:
+                connection.execute(text(statement), {"prefix": PREFIX, "restaurants": args.restaurants, "months": args.months})
+            connection.execute(text("ANALYZE performance_metric"))
+            print(f"Seeded {args.restaurants} restaurants with {args.restaurants * args.months} metrics in {time.perf_counter() - started:.1f}s")
+
+        service = PerformanceService(PerformanceRepository())
+        # Window reaching back past the first day of the oldest seeded month
+        window = args.months + 1
+
+        started = time.perf_counter()
+        trends = await service.analyze_portfolio_trends(window, "total_orders", "slope", 100)
+        print(f"analyze_portfolio_trends (query + trends): {(time.perf_counter() - started) * 1000:.0f}ms, top slope {trends[0]['trends']['total_orders']['slope']:.2f}")
+
+        started = time.perf_counter()
+        rows = await service.repository.get_metric_series(date.today() - timedelta(days=window * 30), date.today())
+        print(f"get_metric_series: {len(rows)} rows in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+        started = time.perf_counter()
+        _, months, values, starts = group_series(rows)
+        print(f"group_series: {(time.perf_counter() - started) * 1000:.0f}ms")
+
+        started = time.perf_counter()
+        vectorized = series_trends(months, values, starts)
+        print(f"series_trends on {len(starts)} restaurants: {(time.perf_counter() - started) * 1000:.0f}ms")
+
+        started = time.perf_counter()
+        looped = _python_slopes(months, values, starts)
+        print(f"Python loop, slopes only: {(time.perf_counter() - started) * 1000:.0f}ms")
+        assert np.allclose(vectorized["slope"].ravel(), looped)
+    finally:
+        with engine.begin() as connection:
+            _cleanup(connection)
+        await dispose_async()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--restaurants", type=int, default=100_000)
+    parser.add_argument("--months", type=int, default=12)
+    asyncio.run(main(parser.parse_args()))
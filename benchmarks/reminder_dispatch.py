@@ -0,0 +1,85 @@
+"""
+Run time and memory of one reminder dispatch (python -m jobs.dispatch_reminders).
+
+Seeds --call-plans scratch call plans spread over --users key account managers, all due, then dispatches them
+to a notifier that only counts the digests. Reports plans/sec and the peak resident memory of the process,
+which stays flat as --call-plans grows. Needs the configured database, the scratch rows are deleted afterwards.
+
+    python -m benchmarks.reminder_dispatch --call-plans 1000000 --users 1000
+"""
+
+import argparse
+import resource
+import time
+from datetime import date
+
+from sqlalchemy import text
+
+from core.database import dispose, get_active_engine
+from core.notifier import Notifier
+from jobs.dispatch_reminders import DEFAULT_CHUNK_SIZE, dispatch
+
+PREFIX = "benchmark-reminders-"
+DISPATCH_NAME = "benchmark-reminders"
+
+SEED_STATEMENTS = [
+    """INSERT INTO restaurant (restaurant_id, name, address, phone, email, status, created_at, updated_at)
+       VALUES (:prefix || 1, 'Restaurant', 'addr', '1', 'r@example.com', 'NEW', now(), now())""",
+    """INSERT INTO "user" (user_id, name, email, phone, role, hashed_password, restaurant_id, created_at, updated_at)
+       SELECT :prefix || g, 'KAM', :prefix || g || '@example.com', '1', 'MANAGER', 'x', :prefix || 1, now(), now() FROM generate_series(1, :users) g""",
+    """INSERT INTO call_plan (call_plan_id, restaurant_id, user_id, frequency_days, next_call_date, created_at, updated_at)
+       SELECT :prefix || g, :prefix || 1, :prefix || (g % :users + 1), 7, date '1980-01-01' + g % 365, now(), now() FROM generate_series(1, :call_plans) g""",
+]
+
+
+class CountingNotifier(Notifier):
+    def __init__(self):
+        self.digests = 0
+
+    def send(self, digest):
+        self.digests += 1
+
+
+def _cleanup(connection):
+    connection.execute(text("DELETE FROM reminder_dispatch WHERE name = :name"), {"name": DISPATCH_NAME})
+    for table in ("call_plan", '"user"', "restaurant"):
+        connection.execute(text(f"DELETE FROM {table} WHERE restaurant_id LIKE :prefix || '%'"), {"prefix": PREFIX})
+
+
+def _peak_memory_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main(args):
+    engine = get_active_engine()
+    try:
+        with engine.begin() as connection:
+            _cleanup(connection)
+            for statement in SEED_STATEMENTS:
+                connection.execute(text(statement), {"prefix": PREFIX, "users": args.users, "call_plans": args.call_plans})
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text("VACUUM ANALYZE call_plan"))
+        print(f"Seeded {args.call_plans} call plans, peak memory {_peak_memory_mb():.0f}MB")
+
+        notifier = CountingNotifier()
+        started = time.perf_counter()
+        # The scratch plans are all due in 1980, so plans of real users are left out of the run
+        result = dispatch(engine, notifier, "benchmark", until=date(1980, 12, 31), name=DISPATCH_NAME, chunk_size=args.chunk_size)
+        elapsed = time.perf_counter() - started
+        print(
+            f"Dispatched {notifier.digests} digests for {result['calls']} plans in {elapsed:.1f}s, "
+            f"{result['calls'] / elapsed:,.0f} plans/sec, peak memory {_peak_memory_mb():.0f}MB"
+        )
+    finally:
+        with engine.begin() as connection:
+            _cleanup(connection)
+        dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--call-plans", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    main(parser.parse_args())
@@ -2,24 +2,87 @@ import logging
 import os
 import functools
 import inspect
+import threading
+import asyncio
+import weakref
+import contextvars
+import time
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional
 
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.engine import URL
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
 
 from core.custom_exception import AppRuntimeException, handle_exception
-from models import base_model
+from core.instrumentation import instrument_engine, reset_current_operation, set_current_operation
 
 
 logger = logging.getLogger(__name__)  # Create or Get logger
 
 default_db = os.getenv("DB_TYPE", default="postgres")
 
+SESSION_MODE_SYNC = "sync"
+SESSION_MODE_ASYNC = "async"
+SESSION_MODE_THREADPOOL = "threadpool"
+SESSION_MODES = (SESSION_MODE_SYNC, SESSION_MODE_ASYNC, SESSION_MODE_THREADPOOL)
+
+# Engines (and their connection pools) are process-wide, one per configured DB type
+_ENGINES = {}
+_SESSION_FACTORIES = {}
+# Async connections belong to the event loop that opened them, so async engines are kept per loop
+_ASYNC_ENGINES = weakref.WeakKeyDictionary()
+_ASYNC_SESSION_FACTORIES = weakref.WeakKeyDictionary()
+_engine_lock = threading.Lock()
+_db_thread_pool = None
+# Session shared by every managed_transaction call made inside a unit of work
+_current_db = contextvars.ContextVar("current_db", default=None)
+# Inside read_your_writes(), a one-element list set to True once a write has been committed, later reads then stay on
+# the primary. A list so that writes made in child tasks, which run in copies of the context, are seen by the parent
+_request_wrote = contextvars.ContextVar("request_wrote", default=None)
+_replica_set = None
+
+
+def get_session_mode() -> str:
+    from core.config import APP_CONFIG
+
+    mode = os.getenv("DB_SESSION_MODE", APP_CONFIG.get("db_session_mode", SESSION_MODE_SYNC))
+    if mode not in SESSION_MODES:
+        logger.error(f"DB session mode not supported: {mode}")
+        raise AppRuntimeException(500, "DB session mode not supported in the system")
+    return mode
+
 
-def postgresql_engine():
-    connection_dict = get_connection_map()
+def get_pool_settings() -> dict:
+    from core.config import APP_CONFIG
+
+    pool_config = APP_CONFIG.get("db_pool", {})
+    return {
+        "pool_size": int(os.getenv("DB_POOL_SIZE", pool_config.get("pool_size", 10))),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", pool_config.get("max_overflow", 20))),
+        "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", pool_config.get("pool_timeout", 30))),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", pool_config.get("pool_recycle", 3600))),
+        "pool_pre_ping": pool_config.get("pool_pre_ping", True),
+    }
+
+
+def postgresql_engine(connection_overrides: dict = None):
+    connection_dict = get_connection_map(connection_overrides)
     _SQLALCHEMY_DATABASE_URL = connection_dict["connection_string"]
-    _engine = create_engine(_SQLALCHEMY_DATABASE_URL, pool_recycle=3600, pool_pre_ping=True)
+    _engine = create_engine(_SQLALCHEMY_DATABASE_URL, **get_pool_settings())
+    return _engine
+
+
+def postgresql_async_engine(connection_overrides: dict = None):
+    # Imported lazily so that sync deployments do not need greenlet/asyncpg installed
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    connection_dict = get_connection_map(connection_overrides)
+    _SQLALCHEMY_DATABASE_URL = connection_dict["connection_string"].set(drivername="postgresql+asyncpg")
+    _engine = create_async_engine(_SQLALCHEMY_DATABASE_URL, **get_pool_settings())
     return _engine
 
 
@@ -27,8 +90,12 @@ DB_ENGINE_MAPPING = {
     "postgres": postgresql_engine,
 }
 
+ASYNC_DB_ENGINE_MAPPING = {
+    "postgres": postgresql_async_engine,
+}
+
 
-def get_connection_map():
+def get_connection_map(connection_overrides: dict = None):
     from core.config import APP_CONFIG
 
     _SQLALCHEMY_DATABASE_URL = ""
@@ -39,6 +106,10 @@ def get_connection_map():
         "db": os.getenv("DB_NAME", APP_CONFIG.get("db_name", "postgres")),
         "password": os.getenv("DB_PASSWORD", APP_CONFIG.get("db_password", "password")),
     }
+    # Replica entries use the same keys as the primary settings in config/app.json
+    for config_key, prop in (("db_host", "host"), ("db_port", "port"), ("db_user", "user"), ("db_name", "db"), ("db_password", "password")):
+        if connection_overrides and config_key in connection_overrides:
+            _db_session_props[prop] = connection_overrides[config_key]
 
     _SQLALCHEMY_DATABASE_URL = URL(
         drivername="postgresql",
@@ -53,55 +124,327 @@ def get_connection_map():
     return {"db_name": default_db, "connection_string": _SQLALCHEMY_DATABASE_URL}
 
 
-def get_active_engine():
-    logger.info(f'Getting active db engine, default db is set as "{default_db}"')
-    _engine = None
-    try:
-        _engine = DB_ENGINE_MAPPING[default_db]()
-    except KeyError:
-        logger.error(f"DB Type not supported: {default_db}")
-        raise AppRuntimeException(500, "DB Type not supported in the system")
+def _engine_key(replica: Optional[int] = None) -> str:
+    return default_db if replica is None else f"{default_db}:replica:{replica}"
+
+
+def _get_or_create_engine(cache: dict, mapping: dict, replica: Optional[int] = None):
+    engine_key = _engine_key(replica)
+    _engine = cache.get(engine_key)
+    if _engine is not None:
+        return _engine
+
+    with _engine_lock:
+        _engine = cache.get(engine_key)
+        if _engine is None:
+            logger.info(f'Creating db engine "{engine_key}", default db is set as "{default_db}"')
+            try:
+                engine_factory = mapping[default_db]
+            except KeyError:
+                logger.error(f"DB Type not supported: {default_db}")
+                raise AppRuntimeException(500, "DB Type not supported in the system")
+            _engine = engine_factory() if replica is None else engine_factory(get_replica_set().replicas[replica])
+            instrument_engine(_engine)
+            cache[engine_key] = _engine
 
     return _engine
 
 
-def get_session():
-    _SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=get_active_engine(), expire_on_commit=False)
+def get_active_engine(replica: Optional[int] = None):
+    return _get_or_create_engine(_ENGINES, DB_ENGINE_MAPPING, replica)
+
+
+def _release_closed_loops():
+    """Drop the engines of event loops that have closed. Their pooled connections reference the loop, so the weak
+    keys alone never let them go, and they cannot be closed without the loop, the sockets close with the connection objects"""
+    for loop in [loop for loop in list(_ASYNC_ENGINES) if loop.is_closed()]:
+        for _engine in _ASYNC_ENGINES.pop(loop).values():
+            _engine.sync_engine.dispose(close=False)
+        _ASYNC_SESSION_FACTORIES.pop(loop, None)
+
+
+def get_active_async_engine(replica: Optional[int] = None):
+    loop = asyncio.get_running_loop()
+    if loop not in _ASYNC_ENGINES:
+        _release_closed_loops()
+    return _get_or_create_engine(_ASYNC_ENGINES.setdefault(loop, {}), ASYNC_DB_ENGINE_MAPPING, replica)
+
+
+def get_session(replica: Optional[int] = None):
+    engine_key = _engine_key(replica)
+    _SessionLocal = _SESSION_FACTORIES.get(engine_key)
+    if _SessionLocal is None:
+        _SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=get_active_engine(replica), expire_on_commit=False)
+        _SESSION_FACTORIES[engine_key] = _SessionLocal
     return _SessionLocal()
 
 
+def get_async_session(replica: Optional[int] = None):
+    engine_key = _engine_key(replica)
+    session_factories = _ASYNC_SESSION_FACTORIES.setdefault(asyncio.get_running_loop(), {})
+    _SessionLocal = session_factories.get(engine_key)
+    if _SessionLocal is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        _SessionLocal = async_sessionmaker(autoflush=False, bind=get_active_async_engine(replica), expire_on_commit=False)
+        session_factories[engine_key] = _SessionLocal
+    return _SessionLocal()
+
+
+class ReplicaSet:
+    """Round-robin over the configured read replicas, skipping the ones ejected after a connection failure"""
+
+    def __init__(self, replicas: list, eject_seconds: float = 30):
+        self.replicas = replicas
+        self.eject_seconds = eject_seconds
+        self._counter = itertools.count()
+        self._ejected_until = {}
+        self._lock = threading.Lock()
+
+    def choose(self) -> Optional[int]:
+        """Index of the next healthy replica, None when every replica is ejected"""
+        if not self.replicas:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            for _ in range(len(self.replicas)):
+                index = next(self._counter) % len(self.replicas)
+                if self._ejected_until.get(index, 0) <= now:
+                    return index
+        return None
+
+    def eject(self, index: int):
+        with self._lock:
+            self._ejected_until[index] = time.monotonic() + self.eject_seconds
+        logger.warning(f"Read replica {index} ejected for {self.eject_seconds}s")
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "replicas": len(self.replicas),
+                "ejected": sorted(index for index, until in self._ejected_until.items() if until > now),
+            }
+
+
+def get_replica_set() -> ReplicaSet:
+    global _replica_set
+    if _replica_set is None:
+        from core.config import APP_CONFIG
+
+        _replica_set = ReplicaSet(APP_CONFIG.get("db_replicas", []), APP_CONFIG.get("db_replica_eject_seconds", 30))
+    return _replica_set
+
+
+def _is_connection_error(error: BaseException) -> bool:
+    """Repositories wrap driver errors in AppRuntimeException, so look through the exception chain"""
+    while error is not None:
+        if isinstance(error, (OperationalError, InterfaceError)) or (isinstance(error, DBAPIError) and error.connection_invalidated):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class DbThreadPool:
+    """Bounded executor that runs blocking session calls off the event loop, sized to the connection pool"""
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="db-worker")
+        self._stats_lock = threading.Lock()
+        # A session keeps its connection between offloaded calls, so admitting more sessions than workers
+        # could leave every worker blocked on pool checkout while the connection holders wait for a worker
+        self._session_slots = weakref.WeakKeyDictionary()
+        self.sessions_waiting = 0
+        self.sessions_admitted = 0
+        self.total_session_wait_time = 0.0
+        self.queue_depth = 0
+        self.active = 0
+        self.completed = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    async def acquire_session_slot(self):
+        loop = asyncio.get_running_loop()
+        slots = self._session_slots.get(loop)
+        if slots is None:
+            slots = self._session_slots[loop] = asyncio.Semaphore(self.max_workers)
+
+        requested_at = time.perf_counter()
+        with self._stats_lock:
+            self.sessions_waiting += 1
+        try:
+            await slots.acquire()
+        finally:
+            with self._stats_lock:
+                self.sessions_waiting -= 1
+        with self._stats_lock:
+            self.sessions_admitted += 1
+            self.total_session_wait_time += time.perf_counter() - requested_at
+
+    def release_session_slot(self):
+        slots = self._session_slots.get(asyncio.get_running_loop())
+        if slots is not None:
+            slots.release()
+
+    async def run(self, func, *args, **kwargs):
+        submitted_at = time.perf_counter()
+        with self._stats_lock:
+            self.queue_depth += 1
+
+        def _task():
+            wait_time = time.perf_counter() - submitted_at
+            with self._stats_lock:
+                self.queue_depth -= 1
+                self.active += 1
+                self.total_wait_time += wait_time
+                self.max_wait_time = max(self.max_wait_time, wait_time)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._stats_lock:
+                    self.active -= 1
+                    self.completed += 1
+
+        # Copy the context so context variables set by the request are visible inside the worker
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, context.run, _task)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "max_workers": self.max_workers,
+                "sessions_waiting": self.sessions_waiting,
+                "avg_session_wait_ms": (self.total_session_wait_time / self.sessions_admitted * 1000) if self.sessions_admitted else 0.0,
+                "queue_depth": self.queue_depth,
+                "active": self.active,
+                "completed": self.completed,
+                "avg_wait_ms": (self.total_wait_time / self.completed * 1000) if self.completed else 0.0,
+                "max_wait_ms": self.max_wait_time * 1000,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+def get_db_thread_pool() -> DbThreadPool:
+    global _db_thread_pool
+    if _db_thread_pool is None:
+        from core.config import APP_CONFIG
+
+        with _engine_lock:
+            if _db_thread_pool is None:
+                pool_settings = get_pool_settings()
+                # One worker per connection the pool can hand out, so workers never queue on the pool itself
+                max_workers = int(APP_CONFIG.get("db_thread_pool_size") or pool_settings["pool_size"] + pool_settings["max_overflow"])
+                _db_thread_pool = DbThreadPool(max_workers)
+                logger.info(f"Created db thread pool with {max_workers} workers")
+    return _db_thread_pool
+
+
+def get_db_thread_pool_stats() -> dict:
+    return _db_thread_pool.stats() if _db_thread_pool is not None else {}
+
+
+def dispose():
+    """Close every pooled connection and drop the cached engines"""
+    global _db_thread_pool
+    with _engine_lock:
+        if _db_thread_pool is not None:
+            _db_thread_pool.shutdown()
+            _db_thread_pool = None
+        for db_type, _engine in list(_ENGINES.items()):
+            try:
+                _engine.dispose()
+                logger.info(f'Disposed db engine "{db_type}"')
+            except Exception:
+                logger.error(f'Error disposing db engine "{db_type}"', exc_info=True)
+        _ENGINES.clear()
+        _SESSION_FACTORIES.clear()
+
+
+async def dispose_async():
+    """Same as dispose, but also closes the async engines which can only be disposed from the event loop"""
+    loop = asyncio.get_running_loop()
+    for db_type, _engine in list(_ASYNC_ENGINES.pop(loop, {}).items()):
+        try:
+            await _engine.dispose()
+            logger.info(f'Disposed async db engine "{db_type}"')
+        except Exception:
+            logger.error(f'Error disposing async db engine "{db_type}"', exc_info=True)
+    _ASYNC_SESSION_FACTORIES.pop(loop, None)
+    dispose()
+
+
 class DbConnector:
-    def __init__(self):
+    """Wraps one session; repositories go through the awaitable helpers so they work in every session mode"""
+
+    def __init__(self, mode: str = None, replica: Optional[int] = None):
+        self.Session = None
+        self._holds_slot = False
+        self.replica = replica
         try:
-            self._bind_tables()
+            self.mode = mode or get_session_mode()
             self._create_session()
         except:
             handle_exception(message="Error in db initialization")
 
     def _create_session(self):
-        self.Session = get_session()
+        self.Session = get_async_session(self.replica) if self.mode == SESSION_MODE_ASYNC else get_session(self.replica)
+
+    async def open(self):
+        """Wait for a free worker slot before the session starts using connections (threadpool mode only)"""
+        if self.mode == SESSION_MODE_THREADPOOL and not self._holds_slot:
+            await get_db_thread_pool().acquire_session_slot()
+            self._holds_slot = True
+
+    async def _run(self, method, *args, **kwargs):
+        if self.mode == SESSION_MODE_ASYNC:
+            return await method(*args, **kwargs)
+        if self.mode == SESSION_MODE_THREADPOOL:
+            return await get_db_thread_pool().run(method, *args, **kwargs)
+        return method(*args, **kwargs)
 
-    def _bind_tables(self):
-        base_model.Base.metadata.create_all(bind=get_active_engine())
+    async def execute(self, statement, params=None):
+        return await self._run(self.Session.execute, statement, params)
 
-    def close_session(self):
+    def add(self, instance):
+        self.Session.add(instance)
+
+    def add_all(self, instances):
+        self.Session.add_all(instances)
+
+    async def delete(self, instance):
+        return await self._run(self.Session.delete, instance)
+
+    async def flush(self):
+        return await self._run(self.Session.flush)
+
+    async def commit(self):
+        return await self._run(self.Session.commit)
+
+    async def close_session(self):
         try:
             if self.Session is not None:
-                self.Session.close()
+                await self._run(self.Session.close)
         except:
             logger.error("Exception happened during db close", exc_info=True)
+        finally:
+            if self._holds_slot:
+                get_db_thread_pool().release_session_slot()
+                self._holds_slot = False
 
-    def roll_back_transaction(self):
+    async def roll_back_transaction(self):
         if self.Session is not None:
             try:
-                self.Session.rollback()
+                await self._run(self.Session.rollback)
             except Exception:
                 logger.error("Additional Exception happened during rollback", exc_info=True)
 
 
-def get_db() -> DbConnector:
+def get_db(replica: Optional[int] = None) -> DbConnector:
     try:
-        db = DbConnector()
+        db = DbConnector(replica=replica)
         if db:
             return db
     except:
@@ -109,45 +452,137 @@ def get_db() -> DbConnector:
         raise AppRuntimeException(500, "Error on getting DB")
 
 
+def get_current_db() -> Optional[DbConnector]:
+    return _current_db.get()
+
+
+@contextmanager
+def read_your_writes():
+    """Keep reads on the primary once a write has been committed inside the block, one block per request. Outside of
+    any block, reads are never pinned to the primary"""
+    token = _request_wrote.set([False])
+    try:
+        yield
+    finally:
+        _request_wrote.reset(token)
+
+
+def _mark_written():
+    wrote = _request_wrote.get()
+    if wrote is not None:
+        wrote[0] = True
+
+
+def _has_written() -> bool:
+    wrote = _request_wrote.get()
+    return wrote is not None and wrote[0]
+
+
+@asynccontextmanager
+async def unit_of_work():
+    """Share one session and one commit across every managed_transaction call made inside the block"""
+    outer_db = _current_db.get()
+    if outer_db is not None:
+        yield outer_db
+        return
+
+    db: DbConnector = get_db()
+    token = _current_db.set(db)
+    try:
+        await db.open()
+        yield db
+        await db.commit()
+        _mark_written()
+    except Exception:
+        logger.error("Error raised inside unit of work and now doing rollback", exc_info=False)
+        await db.roll_back_transaction()
+        raise
+    finally:
+        try:
+            _current_db.reset(token)
+        except ValueError:
+            # Exited from a different context than the one that entered
+            _current_db.set(None)
+        await db.close_session()
+
+
+async def get_unit_of_work():
+    """FastAPI dependency giving the request one session, use it with scope="function" so the commit happens before the response is sent"""
+    async with unit_of_work() as db:
+        yield db
+
+
 async def call_function(func, *args, **kwargs):
     if inspect.iscoroutinefunction(func):
         result = await func(*args, **kwargs)
+    elif get_session_mode() == SESSION_MODE_THREADPOOL:
+        result = await get_db_thread_pool().run(func, *args, **kwargs)
     else:
         result = func(*args, **kwargs)
     return result
 
 
-def managed_transaction(func):
-    logger.debug(f"Initializing managed_transaction with func.__name__: {func.__name__}")
+def managed_transaction(func=None, *, read_only: bool = False):
+    """Use as @managed_transaction, or @managed_transaction(read_only=True) to let the call run on a read replica"""
+    if func is None:
+        return functools.partial(managed_transaction, read_only=read_only)
 
-    @functools.wraps(func)
-    async def wrap_func(*args, **kwargs):
-        logger.debug(f"Start of wrap function")
-        if "db" in kwargs and kwargs["db"] is not None:
-            return await call_function(func, *args, **kwargs)
-        else:
-            db: DbConnector = get_db()
-            kwargs["db"] = db
+    logger.debug(f"Initializing managed_transaction with func.__name__: {func.__name__}")
 
+    async def run_in_transaction(db: DbConnector, *args, **kwargs):
+        kwargs["db"] = db
         try:
+            await db.open()
             result = await call_function(func, *args, **kwargs)
-            db.Session.commit()
+            await db.commit()
             logger.debug(f"Post call to the wrapped func: {func.__name__}")
         except AppRuntimeException as e:
             logger.error(f"Error raised and now doing rollback", exc_info=False)
-            db.roll_back_transaction()
+            await db.roll_back_transaction()
             raise e
         except Exception as e:
             logger.exception(str(e), exc_info=True)
             logger.error(f"Error raised and now doing rollback")
-            db.roll_back_transaction()
+            await db.roll_back_transaction()
             handle_exception()
         finally:
             logger.debug(f"Finally called and will close session now")
-            db.close_session()
+            await db.close_session()
 
         logger.debug("End of wrap function. Returning result now")
         return result
 
+    async def run_managed(*args, **kwargs):
+        logger.debug(f"Start of wrap function")
+        if "db" in kwargs and kwargs["db"] is not None:
+            return await call_function(func, *args, **kwargs)
+        elif _current_db.get() is not None:
+            kwargs["db"] = _current_db.get()
+            return await call_function(func, *args, **kwargs)
+
+        # Reads go to a replica unless this request already wrote, so it always sees its own writes
+        replica = get_replica_set().choose() if read_only and not _has_written() else None
+        if replica is not None:
+            try:
+                return await run_in_transaction(get_db(replica), *args, **kwargs)
+            except AppRuntimeException as e:
+                if not _is_connection_error(e):
+                    raise e
+                get_replica_set().eject(replica)
+                logger.warning(f"Read replica {replica} unavailable, running {func.__name__} on the primary")
+
+        result = await run_in_transaction(get_db(), *args, **kwargs)
+        if not read_only:
+            _mark_written()
+        return result
+
+    @functools.wraps(func)
+    async def wrap_func(*args, **kwargs):
+        operation_token = set_current_operation(func.__qualname__)
+        try:
+            return await run_managed(*args, **kwargs)
+        finally:
+            reset_current_operation(operation_token)
+
     logger.debug(f"Initialization complete of managed_transaction returning func.__name__: {func.__name__}")
     return wrap_func
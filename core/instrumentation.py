@@ -0,0 +1,241 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+import weakref
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+
+# Statistics of the request being served, None when the request is not sampled
+_request_stats: ContextVar = ContextVar("request_query_stats", default=None)
+_recent_requests = deque(maxlen=100)
+_recent_requests_lock = threading.Lock()
+# Repository method currently running, set by managed_transaction
+_current_operation: ContextVar = ContextVar("current_operation", default=None)
+
+_slow_query_config = None
+_slow_queries = None
+_slow_queries_lock = threading.Lock()
+_explain_executor = None
+_explain_tasks = set()
+# Async engines by their sync engine, EXPLAIN for them has to go through the async driver on the event loop
+_async_engines = weakref.WeakKeyDictionary()
+
+
+class RequestQueryStats:
+    """SQL statements issued while serving one request"""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.statement_count = 0
+        self.total_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+        self.statement_counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, duration: float):
+        with self._lock:
+            self.statement_count += 1
+            self.total_time += duration
+            self.statement_counts[statement] += 1
+            if duration > self.slowest_time:
+                self.slowest_time = duration
+                self.slowest_statement = statement
+
+    def repeated_statements(self, repeat_threshold: int) -> dict:
+        """Statements issued more than repeat_threshold times, the usual sign of an N+1 pattern"""
+        return {statement: count for statement, count in self.statement_counts.items() if count > repeat_threshold}
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.total_time * 1000:.2f};desc="{self.statement_count} queries", db-slowest;dur={self.slowest_time * 1000:.2f}'
+
+    def summary(self, repeat_threshold: int) -> dict:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "statement_count": self.statement_count,
+            "total_db_ms": round(self.total_time * 1000, 3),
+            "slowest_ms": round(self.slowest_time * 1000, 3),
+            "slowest_statement": self.slowest_statement,
+            "repeated_statements": self.repeated_statements(repeat_threshold),
+        }
+
+
+def get_instrumentation_config() -> dict:
+    from core.config import APP_CONFIG
+
+    config = APP_CONFIG.get("sql_instrumentation", {})
+    return {
+        "enabled": config.get("enabled", True),
+        "sample_rate": float(config.get("sample_rate", 0.01)),
+        "repeat_threshold": int(config.get("repeat_threshold", 10)),
+    }
+
+
+def start_request(method: str, path: str, sample_rate: float) -> Optional[RequestQueryStats]:
+    if sample_rate <= 0 or (sample_rate < 1 and random.random() >= sample_rate):
+        return None
+    stats = RequestQueryStats(method, path)
+    _request_stats.set(stats)
+    return stats
+
+
+def finish_request(stats: RequestQueryStats, repeat_threshold: int) -> dict:
+    summary = stats.summary(repeat_threshold)
+    if summary["repeated_statements"]:
+        logger.warning(f"Repeated SQL statements in {stats.method} {stats.path}: {summary['repeated_statements']}")
+    with _recent_requests_lock:
+        _recent_requests.append(summary)
+    return summary
+
+
+def get_recent_requests() -> list:
+    with _recent_requests_lock:
+        return list(_recent_requests)
+
+
+def get_current_operation() -> Optional[str]:
+    return _current_operation.get()
+
+
+def set_current_operation(operation: str):
+    return _current_operation.set(operation)
+
+
+def reset_current_operation(token):
+    _current_operation.reset(token)
+
+
+def get_slow_query_config() -> dict:
+    global _slow_query_config, _slow_queries
+    if _slow_query_config is None:
+        from core.config import APP_CONFIG
+
+        config = APP_CONFIG.get("slow_query_log", {})
+        _slow_query_config = {
+            "enabled": config.get("enabled", True),
+            "threshold_ms": float(config.get("threshold_ms", 200)),
+            "buffer_size": int(config.get("buffer_size", 50)),
+            "explain": config.get("explain", False),
+        }
+        _slow_queries = deque(maxlen=_slow_query_config["buffer_size"])
+    return _slow_query_config
+
+
+def get_slow_queries() -> list:
+    get_slow_query_config()
+    with _slow_queries_lock:
+        return [dict(entry) for entry in _slow_queries]
+
+
+# DDL and utility statements have no plan to capture
+_EXPLAINABLE_PREFIXES = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+
+def _explain_statement(statement: str) -> str:
+    # ANALYZE runs the statement again, so it is only used for plain SELECTs. A WITH may hold an INSERT, UPDATE or DELETE
+    head = statement.lstrip().upper()
+    options = "ANALYZE, BUFFERS" if head.startswith("SELECT") and " FOR UPDATE" not in head and " FOR SHARE" not in head else "BUFFERS false"
+    return f"EXPLAIN ({options}) {statement}"
+
+
+def _store_plan(entry: dict, rows):
+    with _slow_queries_lock:
+        entry["plan"] = "\n".join(row[0] for row in rows)
+
+
+def _explain_sync(engine, entry: dict, statement: str, parameters):
+    try:
+        with engine.connect() as connection:
+            rows = connection.exec_driver_sql(_explain_statement(statement), parameters).fetchall()
+            connection.rollback()
+        _store_plan(entry, rows)
+    except Exception as e:
+        logger.warning(f"Could not capture plan of slow query: {str(e)}")
+        entry["plan_error"] = str(e)
+
+
+async def _explain_async(async_engine, entry: dict, statement: str, parameters):
+    try:
+        async with async_engine.connect() as connection:
+            rows = (await connection.exec_driver_sql(_explain_statement(statement), parameters)).fetchall()
+            await connection.rollback()
+        _store_plan(entry, rows)
+    except Exception as e:
+        logger.warning(f"Could not capture plan of slow query: {str(e)}")
+        entry["plan_error"] = str(e)
+
+
+def _capture_plan(engine, entry: dict, statement: str, parameters):
+    """Run EXPLAIN in the background so the request that issued the slow statement is not delayed"""
+    global _explain_executor
+    async_engine = _async_engines.get(engine)
+    if async_engine is not None:
+        task = asyncio.get_running_loop().create_task(_explain_async(async_engine, entry, statement, parameters))
+        _explain_tasks.add(task)
+        task.add_done_callback(_explain_tasks.discard)
+        return
+    if _explain_executor is None:
+        _explain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain")
+    _explain_executor.submit(_explain_sync, engine, entry, statement, parameters)
+
+
+def _record_slow_query(conn, statement: str, parameters, duration: float, executemany: bool):
+    entry = {
+        "recorded_at": datetime.now().isoformat(),
+        "operation": get_current_operation(),
+        "duration_ms": round(duration * 1000, 3),
+        "statement": statement,
+        "parameters": repr(parameters)[:500],
+        "plan": None,
+    }
+    logger.warning(f"Slow query ({entry['duration_ms']}ms) in {entry['operation']}: {statement} parameters={entry['parameters']}")
+    with _slow_queries_lock:
+        _slow_queries.append(entry)
+    if _slow_query_config["explain"] and not executemany and statement.lstrip().upper().startswith(_EXPLAINABLE_PREFIXES):
+        try:
+            _capture_plan(conn.engine, entry, statement, parameters)
+        except Exception:
+            logger.warning("Could not schedule plan capture of slow query", exc_info=True)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _request_stats.get() is not None or get_slow_query_config()["enabled"]:
+        context._query_start_time = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_start_time", None)
+    if started is None:
+        return
+    duration = time.perf_counter() - started
+
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.record(statement, duration)
+
+    slow_query_config = get_slow_query_config()
+    if slow_query_config["enabled"] and duration * 1000 >= slow_query_config["threshold_ms"] and not statement.startswith("EXPLAIN"):
+        _record_slow_query(conn, statement, parameters, duration, executemany)
+
+
+def instrument_engine(engine):
+    """Attach the statement timing hooks, async engines are instrumented through their sync engine"""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if sync_engine is not engine:
+        _async_engines[sync_engine] = engine
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    return engine
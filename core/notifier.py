@@ -0,0 +1,40 @@
+import importlib
+import json
+import logging
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+class Notifier:
+    """Delivers reminder digests. Subclass it and name the class by its import path in reminders.notifier to plug in another channel"""
+
+    def send(self, digest: Dict):
+        raise NotImplementedError
+
+
+class LogNotifier(Notifier):
+    def send(self, digest: Dict):
+        logger.info(f"Reminder for {digest['user_id']}: {digest['due_calls']} calls due by {digest['due_date']}, {digest['overdue']} overdue")
+
+
+class FileNotifier(Notifier):
+    """Appends every digest to a JSON lines file, the local stand-in for an email or push channel"""
+
+    def __init__(self, path: str = "reminders.jsonl"):
+        self.path = path
+
+    def send(self, digest: Dict):
+        with open(self.path, "a") as file:
+            file.write(json.dumps(digest, default=str) + "\n")
+
+
+NOTIFIERS = {"log": LogNotifier, "file": FileNotifier}
+
+
+def create_notifier(name: str, **options) -> Notifier:
+    """A notifier by its short name, or any Notifier subclass by its dotted import path"""
+    if name in NOTIFIERS:
+        return NOTIFIERS[name](**options)
+    module_name, _, class_name = name.rpartition(".")
+    return getattr(importlib.import_module(module_name), class_name)(**options)
@@ -0,0 +1,115 @@
+import logging
+from datetime import datetime
+
+from sqlalchemy import inspect as sa_inspect, select, func, text
+
+from core.custom_exception import handle_exception
+from core.database import get_active_engine
+from jobs import deduplicate_metrics, reconcile_rollups, refresh_rollup_view
+from migrations import indexes, timestamp_columns
+from models import base_model
+
+# Every model has to be imported so that it is registered on Base.metadata
+from models import restaurant, user, interaction, order, order_rollup, call_plan, performance_metric, reminder_dispatch, schema_version  # noqa: F401
+from models.schema_version import SchemaVersion
+
+logger = logging.getLogger(__name__)
+
+
+SCHEMA_VERSION = 12
+
+# Ordered upgrade steps keyed by the version they bring the schema to.
+# A step is either a raw SQL string or a callable taking the open connection.
+MIGRATIONS = {
+    1: [],
+    2: [timestamp_columns.migrate_in_place],
+    3: [
+        indexes.create_indexes(
+            "ix_user_email",
+            "ix_user_restaurant_id",
+            "ix_order_restaurant_id_created_at",
+            "ix_order_user_id",
+            "ix_call_plan_next_call_date",
+            "ix_performance_metric_period_start_period_end",
+        )
+    ],
+    4: [indexes.create_indexes("ix_order_interaction_id")],
+    # The unique index needs the duplicates gone
+    5: [deduplicate_metrics.deduplicate_in_place, indexes.create_indexes("uq_performance_metric_period")],
+    6: [reconcile_rollups.rebuild_in_place],
+    7: [refresh_rollup_view.create_view],
+    # The (restaurant_id, interaction_date) index replaces the one on restaurant_id alone
+    8: [indexes.create_indexes("ix_interaction_restaurant_id_interaction_date"), "DROP INDEX IF EXISTS ix_interaction_restaurant_id"],
+    # The (user_id, next_call_date) index replaces the one on user_id alone
+    9: [indexes.create_indexes("ix_call_plan_user_id_next_call_date"), "DROP INDEX IF EXISTS ix_call_plan_user_id"],
+    # Adds the reminder_dispatch table, which create_all builds before the steps run
+    10: [],
+    # The version of an order, compared by conditional status changes. The constant default adds it without a rewrite
+    11: ['ALTER TABLE "order" ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1'],
+    # Reminders are tracked per call plan, which replaces the resume point of the dispatch
+    12: ["ALTER TABLE call_plan ADD COLUMN IF NOT EXISTS reminded_for DATE", "ALTER TABLE reminder_dispatch DROP COLUMN IF EXISTS resume_after_user_id"],
+}
+
+# Arbitrary key so that concurrently starting workers bootstrap one at a time
+_BOOTSTRAP_LOCK_KEY = 720_001
+
+
+def get_schema_version(connection) -> int:
+    """Return the version recorded in schema_version, 0 when the table does not exist"""
+    if not sa_inspect(connection).has_table(SchemaVersion.__tablename__):
+        return 0
+    return connection.execute(select(func.coalesce(func.max(SchemaVersion.version), 0))).scalar()
+
+
+def _has_application_tables(connection) -> bool:
+    existing = set(sa_inspect(connection).get_table_names())
+    return any(table in existing for table in base_model.Base.metadata.tables if table != SchemaVersion.__tablename__)
+
+
+def _stamp(connection, version: int, description: str):
+    connection.execute(SchemaVersion.__table__.insert().values(version=version, description=description, applied_at=datetime.now().isoformat()))
+
+
+def _run_step(connection, step):
+    if callable(step):
+        step(connection)
+    else:
+        connection.execute(text(step))
+
+
+def bootstrap_schema() -> int:
+    """Create or upgrade the database schema to SCHEMA_VERSION, returns the resulting version"""
+    try:
+        with get_active_engine().begin() as connection:
+            connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _BOOTSTRAP_LOCK_KEY})
+
+            current_version = get_schema_version(connection)
+            if current_version >= SCHEMA_VERSION:
+                logger.info(f"Database schema is up to date at version {current_version}")
+                return current_version
+
+            if current_version == 0 and not _has_application_tables(connection):
+                # Fresh database, the declared models already describe the latest schema
+                base_model.Base.metadata.create_all(bind=connection)
+                # Views are not declared models, create_all leaves them out
+                refresh_rollup_view.create_view(connection)
+                _stamp(connection, SCHEMA_VERSION, "initial schema")
+                logger.info(f"Created database schema at version {SCHEMA_VERSION}")
+                return SCHEMA_VERSION
+
+            # Existing database: new tables come from create_all, migrations only alter what was already there
+            base_model.Base.metadata.create_all(bind=connection)
+            if current_version == 0:
+                # Tables predate the version table, they match the initial schema
+                _stamp(connection, 1, "baseline of pre-existing schema")
+                current_version = 1
+
+            for version in range(current_version + 1, SCHEMA_VERSION + 1):
+                logger.info(f"Upgrading database schema to version {version}")
+                for step in MIGRATIONS.get(version, []):
+                    _run_step(connection, step)
+                _stamp(connection, version, f"upgrade to version {version}")
+
+            return SCHEMA_VERSION
+    except Exception:
+        handle_exception(message="Error in database schema bootstrap")
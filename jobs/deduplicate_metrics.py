@@ -0,0 +1,66 @@
+"""
+Removes duplicated performance metrics, keeping the most recently updated row of every restaurant and period.
+
+Metric generation used to insert a new row on every call, schema version 5 adds the unique index on
+(restaurant_id, period_start, period_end) that generation now upserts on. Schema bootstrap deduplicates
+inside its own transaction; on a large table run the job first, it deletes in short batches:
+
+    python -m jobs.deduplicate_metrics --batch-size 10000
+"""
+
+import argparse
+import logging
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+_DELETE_DUPLICATES = """
+DELETE FROM performance_metric WHERE metric_id IN (
+    SELECT metric_id FROM (
+        SELECT metric_id, row_number() OVER (
+            PARTITION BY restaurant_id, period_start, period_end ORDER BY updated_at DESC, created_at DESC, metric_id DESC
+        ) AS position
+        FROM performance_metric
+    ) ranked
+    WHERE position > 1
+    LIMIT :batch_size
+)
+"""
+
+
+def deduplicate(connection, batch_size: int = None) -> int:
+    """Delete duplicated rows, at most batch_size of them when given. Returns the number of deleted rows"""
+    statement = _DELETE_DUPLICATES if batch_size else _DELETE_DUPLICATES.replace("LIMIT :batch_size", "")
+    return connection.execute(text(statement), {"batch_size": batch_size}).rowcount
+
+
+def deduplicate_in_place(connection):
+    """Schema bootstrap step, no new duplicates can be written until the unique index exists"""
+    connection.execute(text("LOCK TABLE performance_metric IN SHARE ROW EXCLUSIVE MODE"))
+    deleted = deduplicate(connection)
+    logger.info(f"Removed {deleted} duplicated performance metrics")
+
+
+def deduplicate_online(engine, batch_size: int) -> int:
+    deleted = 0
+    while True:
+        with engine.begin() as connection:
+            batch = deduplicate(connection, batch_size)
+        if not batch:
+            return deleted
+        deleted += batch
+        logger.info(f"Removed {deleted} duplicated performance metrics")
+
+
+if __name__ == "__main__":
+    from core.database import dispose, get_active_engine
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=10000, help="Rows deleted per transaction")
+    args = parser.parse_args()
+    try:
+        print(f"Removed {deduplicate_online(get_active_engine(), args.batch_size)} duplicated performance metrics")
+    finally:
+        dispose()
@@ -0,0 +1,185 @@
+"""
+Sends every key account manager one digest of their due call plans.
+
+A run covers the plans due up to today that have not been reminded today, so a plan is reminded once a day
+while it is due, including plans created or moved to an earlier date after the day's first run. They are read
+in keyset chunks ordered by user, so memory stays bounded whatever the number of plans, and each user's digest
+goes out once their last plan has been read. A sent plan records the run's due date in call_plan.reminded_for.
+Runs are coordinated through the reminder_dispatch table: a worker only dispatches while it holds the lease,
+which it renews after every chunk in the transaction that records the plans sent so far. A run that dies is
+finished by the next lease holder with the same due date, digests sent after the last renewal may go out
+twice. With "reminders": {"enabled": true} the application dispatches every interval_seconds, and a run can
+also be started from the command line or cron:
+
+    python -m jobs.dispatch_reminders --notifier file --path reminders.jsonl
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import String, any_, bindparam, func, or_, select, tuple_, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+
+from core.notifier import Notifier, create_notifier
+from models.call_plan import CallPlan
+from models.reminder_dispatch import ReminderDispatch
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_NAME = "due_calls"
+DEFAULT_CHUNK_SIZE = 10_000
+DEFAULT_LEASE_SECONDS = 300
+# Calls listed in a digest, its counts still cover all of them
+DIGEST_CALLS = 50
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _acquire_lease(connection, name: str, owner: str, lease_seconds: float):
+    """Take the lease if it is free or expired, returns the dispatch row or None when another worker holds it"""
+    connection.execute(insert(ReminderDispatch).values(name=name).on_conflict_do_nothing())
+    return connection.execute(
+        update(ReminderDispatch)
+        .where(
+            ReminderDispatch.name == name,
+            or_(ReminderDispatch.lease_owner.is_(None), ReminderDispatch.lease_owner == owner, ReminderDispatch.lease_expires_at < func.now()),
+        )
+        .values(lease_owner=owner, lease_expires_at=func.now() + timedelta(seconds=lease_seconds))
+        .returning(ReminderDispatch.run_until)
+    ).first()
+
+
+def _renew_lease(connection, name: str, owner: str, lease_seconds: float, **progress) -> bool:
+    """Extend the lease and record progress, returns False if the lease expired and was taken over"""
+    result = connection.execute(
+        update(ReminderDispatch)
+        .where(ReminderDispatch.name == name, ReminderDispatch.lease_owner == owner)
+        .values(lease_expires_at=func.now() + timedelta(seconds=lease_seconds), **progress)
+    )
+    return result.rowcount == 1
+
+
+def _mark_reminded(connection, call_plan_ids: List[str], until: date):
+    # One array parameter, a user's plans can outnumber the bind parameter limit
+    if call_plan_ids:
+        connection.execute(update(CallPlan).where(CallPlan.call_plan_id == any_(bindparam(None, call_plan_ids, type_=ARRAY(String)))).values(reminded_for=until))
+
+
+def _due_calls(until: date, after, chunk_size: int):
+    query = select(CallPlan.user_id, CallPlan.call_plan_id, CallPlan.restaurant_id, CallPlan.next_call_date).where(
+        CallPlan.next_call_date <= until, or_(CallPlan.reminded_for.is_(None), CallPlan.reminded_for < until)
+    )
+    if after is not None:
+        query = query.where(after)
+    # Walks the (user_id, next_call_date) index, so every user's calls arrive together
+    return query.order_by(CallPlan.user_id, CallPlan.next_call_date, CallPlan.call_plan_id).limit(chunk_size)
+
+
+def dispatch(
+    engine,
+    notifier: Notifier,
+    owner: str,
+    until: Optional[date] = None,
+    name: str = DISPATCH_NAME,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+) -> Optional[Dict]:
+    """Send the digests of the calls due up to until (today) not yet reminded for it, returns None if another worker holds the lease"""
+    with engine.begin() as connection:
+        state = _acquire_lease(connection, name, owner, lease_seconds)
+    if state is None:
+        return None
+    (run_until,) = state
+    # An interrupted run is finished first, with the due date it started with
+    if run_until is None:
+        run_until = until or date.today()
+        with engine.begin() as connection:
+            _renew_lease(connection, name, owner, lease_seconds, run_until=run_until)
+
+    digests = calls = 0
+    digest, sent, after = None, [], None
+    while True:
+        with engine.connect() as connection:
+            rows = connection.execute(_due_calls(run_until, after, chunk_size)).all()
+        for user_id, call_plan_id, restaurant_id, next_call_date in rows:
+            if digest is not None and digest["user_id"] != user_id:
+                notifier.send(digest)
+                digests, digest = digests + 1, None
+                sent.extend(plan_ids)
+            if digest is None:
+                digest, plan_ids = {"user_id": user_id, "due_date": run_until, "due_calls": 0, "overdue": 0, "calls": []}, []
+            digest["due_calls"] += 1
+            digest["overdue"] += next_call_date < run_until
+            plan_ids.append(call_plan_id)
+            if len(digest["calls"]) < DIGEST_CALLS:
+                digest["calls"].append({"call_plan_id": call_plan_id, "restaurant_id": restaurant_id, "next_call_date": next_call_date})
+        calls += len(rows)
+        if len(rows) < chunk_size:
+            break
+        last = rows[-1]
+        after = tuple_(CallPlan.user_id, CallPlan.next_call_date, CallPlan.call_plan_id) > tuple_(last.user_id, last.next_call_date, last.call_plan_id)
+        with engine.begin() as connection:
+            # The plans are recorded even if the lease was lost, their digests went out
+            _mark_reminded(connection, sent, run_until)
+            sent = []
+            if not _renew_lease(connection, name, owner, lease_seconds):
+                logger.warning(f"Lost the {name} reminder lease after {digests} digests")
+                return {"digests": digests, "calls": calls, "completed": False}
+    if digest is not None:
+        notifier.send(digest)
+        digests += 1
+        sent.extend(plan_ids)
+
+    with engine.begin() as connection:
+        _mark_reminded(connection, sent, run_until)
+        connection.execute(
+            update(ReminderDispatch)
+            .where(ReminderDispatch.name == name, ReminderDispatch.lease_owner == owner)
+            .values(dispatched_through=run_until, run_until=None, lease_owner=None, lease_expires_at=None)
+        )
+    return {"digests": digests, "calls": calls, "completed": True}
+
+
+async def dispatch_periodically(interval_seconds: float, notifier: Notifier, chunk_size: int = DEFAULT_CHUNK_SIZE, lease_seconds: float = DEFAULT_LEASE_SECONDS):
+    """Dispatch the reminders every interval_seconds until cancelled, started by the application lifespan"""
+    from core.database import get_active_engine
+
+    owner = worker_id()
+    while True:
+        started = time.perf_counter()
+        try:
+            result = await asyncio.to_thread(dispatch, get_active_engine(), notifier, owner, chunk_size=chunk_size, lease_seconds=lease_seconds)
+            if result is not None:
+                logger.info(f"Sent {result['digests']} reminder digests for {result['calls']} due calls in {time.perf_counter() - started:.1f}s")
+        except Exception:
+            logger.error("Error dispatching reminders", exc_info=True)
+        await asyncio.sleep(interval_seconds)
+
+
+if __name__ == "__main__":
+    from core.database import dispose, get_active_engine
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--notifier", default="log", help="log, file or the import path of a Notifier subclass")
+    parser.add_argument("--path", help="File the file notifier appends the digests to")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+    try:
+        started = time.perf_counter()
+        result = dispatch(get_active_engine(), create_notifier(args.notifier, **({"path": args.path} if args.path else {})), worker_id(), chunk_size=args.chunk_size)
+        if result is None:
+            print("Reminders are being dispatched by another worker")
+        else:
+            print(f"Sent {result['digests']} digests for {result['calls']} due calls in {time.perf_counter() - started:.1f}s")
+    finally:
+        dispose()
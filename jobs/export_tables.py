@@ -0,0 +1,42 @@
+"""
+Exports the order, interaction and performance_metric tables to Parquet for analytics.
+
+Every table is written to <directory>/<table>/month=YYYY-MM/part-0.parquet, partitioned by the UTC
+month of its order date, interaction date or metric period start, a layout Arrow, pandas, Spark and
+DuckDB read as one dataset. Rows are streamed from a server-side cursor in batches, so memory stays flat
+however large the tables are. Export into an empty directory, a partition is overwritten only when its
+month is exported again.
+
+    python -m jobs.export_tables exports/ [--tables order interaction] [--year 2024 --month 1]
+"""
+
+import argparse
+import logging
+import time
+from datetime import date
+
+from services.export import DEFAULT_BATCH_SIZE, EXPORTED_TABLES, export_parquet
+
+logger = logging.getLogger(__name__)
+
+
+if __name__ == "__main__":
+    from core.database import dispose, get_active_engine
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("directory", help="Directory the table datasets are written to")
+    parser.add_argument("--tables", nargs="+", choices=list(EXPORTED_TABLES), default=list(EXPORTED_TABLES))
+    parser.add_argument("--year", type=int, help="Only export this month, together with --month")
+    parser.add_argument("--month", type=int, choices=range(1, 13), metavar="MONTH")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+    if (args.year is None) != (args.month is None):
+        parser.error("--year and --month go together")
+    try:
+        started = time.perf_counter()
+        counts = export_parquet(get_active_engine(), args.directory, args.tables, date(args.year, args.month, 1) if args.year else None, args.batch_size)
+        elapsed = time.perf_counter() - started
+        print(f"Exported {sum(counts.values())} rows ({', '.join(f'{name}: {count}' for name, count in counts.items())}) in {elapsed:.1f}s")
+    finally:
+        dispose()
@@ -0,0 +1,38 @@
+"""
+Month-end performance metrics of every restaurant.
+
+    python -m jobs.monthly_metrics --year 2024 --month 11
+
+Without arguments the previous month is generated.
+"""
+
+import argparse
+import asyncio
+import logging
+from datetime import date, timedelta
+
+from core.database import dispose_async
+from repository.performance import PerformanceRepository
+from services.performance import PerformanceService
+
+
+def _print_progress(done: int, total: int):
+    print(f"\rStored metrics of {done}/{total} restaurants", end="" if done < total else "\n", flush=True)
+
+
+async def main(year: int, month: int):
+    try:
+        result = await PerformanceService(PerformanceRepository()).generate_all_monthly_metrics(year, month, progress=_print_progress)
+        print(f"Generated metrics of {result['restaurants']} restaurants for {result['period_start']} - {result['period_end']} in {result['duration_seconds']}s")
+    finally:
+        await dispose_async()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    previous_month = date.today().replace(day=1) - timedelta(days=1)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--year", type=int, default=previous_month.year)
+    parser.add_argument("--month", type=int, choices=range(1, 13), default=previous_month.month)
+    args = parser.parse_args()
+    asyncio.run(main(args.year, args.month))
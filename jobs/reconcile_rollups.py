@@ -0,0 +1,114 @@
+"""
+Verifies the monthly order rollups against the raw orders and repairs drift.
+
+Rollups are maintained incrementally by OrderService, anything that writes orders around it (manual
+fixes, imports, a failed deploy) makes them drift. The job compares every rollup row with the orders
+it counts and rewrites the rows that differ:
+
+    python -m jobs.reconcile_rollups [--since 2024-01-01] [--dry-run]
+
+Schema version 6 builds the rollups of existing orders with rebuild_in_place.
+"""
+
+import argparse
+import logging
+from datetime import date, datetime, timezone
+
+from sqlalchemy import func, or_, select, text, update
+from sqlalchemy.dialects.postgresql import insert
+
+from models.base_model import utc_now
+from models.order import Order
+from models.order_rollup import OrderRollup
+from repository.order_rollup import counted_orders, expected_rollups
+
+logger = logging.getLogger(__name__)
+
+_COMPARED_COLUMNS = ("order_count", "amount_sum", "first_order_at", "last_order_at")
+
+
+def find_drift(connection, since: date = None) -> list:
+    """(restaurant_id, month) of the rollup rows that disagree with the orders, including missing rows"""
+    expected = expected_rollups()
+    if since:
+        # Whole months only, a partial month would never match its rollup
+        since = since.replace(day=1)
+        expected = expected.where(Order.created_at >= datetime.combine(since, datetime.min.time(), timezone.utc))
+    expected = expected.subquery()
+    restaurant_id = func.coalesce(expected.c.restaurant_id, OrderRollup.restaurant_id)
+    month = func.coalesce(expected.c.month, OrderRollup.month)
+    query = (
+        select(restaurant_id, month)
+        .select_from(expected)
+        .join(OrderRollup, (OrderRollup.restaurant_id == expected.c.restaurant_id) & (OrderRollup.month == expected.c.month), full=True)
+        .where(
+            or_(
+                # Missing on either side counts as zero orders, a rollup row emptied by cancellations matches no orders
+                func.coalesce(OrderRollup.order_count, 0) != func.coalesce(expected.c.order_count, 0),
+                func.coalesce(OrderRollup.amount_sum, 0) != func.coalesce(expected.c.amount_sum, 0),
+                OrderRollup.first_order_at.is_distinct_from(expected.c.first_order_at),
+                OrderRollup.last_order_at.is_distinct_from(expected.c.last_order_at),
+            )
+        )
+        .order_by(restaurant_id, month)
+    )
+    if since:
+        query = query.where(month >= since)
+    return [tuple(row) for row in connection.execute(query)]
+
+
+def repair(connection, restaurant_id: str, month: date):
+    """Rewrite one rollup row from the orders, in its own short transaction"""
+    # Locking the row first makes orders placed concurrently wait, and count on top of the repaired values
+    connection.execute(insert(OrderRollup).values(restaurant_id=restaurant_id, month=month, updated_at=utc_now()).on_conflict_do_nothing())
+    connection.execute(select(OrderRollup.month).where(OrderRollup.restaurant_id == restaurant_id, OrderRollup.month == month).with_for_update())
+    order_count, amount_sum, first_order_at, last_order_at = connection.execute(
+        select(func.count(), func.coalesce(func.sum(Order.amount), 0), func.min(Order.created_at), func.max(Order.created_at)).where(*counted_orders(restaurant_id, month))
+    ).one()
+    connection.execute(
+        update(OrderRollup)
+        .where(OrderRollup.restaurant_id == restaurant_id, OrderRollup.month == month)
+        .values(order_count=order_count, amount_sum=amount_sum, first_order_at=first_order_at, last_order_at=last_order_at, updated_at=utc_now())
+    )
+
+
+def reconcile(engine, since: date = None, dry_run: bool = False) -> list:
+    with engine.connect() as connection:
+        drift = find_drift(connection, since)
+    for restaurant_id, month in drift:
+        logger.warning(f"Order rollup of restaurant {restaurant_id} for {month} has drifted{'' if dry_run else ', repairing it'}")
+        if not dry_run:
+            with engine.begin() as connection:
+                repair(connection, restaurant_id, month)
+    return drift
+
+
+def rebuild_in_place(connection):
+    """Schema bootstrap step, order writes wait until the rollups of every existing order are stored"""
+    connection.execute(text('LOCK TABLE "order" IN SHARE MODE'))
+    expected = expected_rollups().subquery()
+    statement = insert(OrderRollup).from_select(
+        ["restaurant_id", "month", *_COMPARED_COLUMNS, "updated_at"],
+        select(expected, func.now()),
+    )
+    connection.execute(
+        statement.on_conflict_do_update(
+            index_elements=[OrderRollup.restaurant_id, OrderRollup.month],
+            set_={column: statement.excluded[column] for column in (*_COMPARED_COLUMNS, "updated_at")},
+        )
+    )
+
+
+if __name__ == "__main__":
+    from core.database import dispose, get_active_engine
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--since", type=date.fromisoformat, help="Only check months starting from this date")
+    parser.add_argument("--dry-run", action="store_true", help="Report drift without repairing it")
+    args = parser.parse_args()
+    try:
+        drift = reconcile(get_active_engine(), args.since, args.dry_run)
+        print(f"{len(drift)} drifted rollup rows {'found' if args.dry_run else 'repaired'}")
+    finally:
+        dispose()
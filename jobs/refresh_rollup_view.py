@@ -0,0 +1,79 @@
+"""
+Refreshes the materialized view of the monthly order rollups.
+
+order_rollup_view recomputes the monthly totals from the raw orders. Unlike the order_rollup table it
+needs no maintenance on the write path and cannot drift, but it only changes when it is refreshed.
+Schema version 7 creates it empty. With "order_rollup_source": "view" the application refreshes it
+every order_rollup_view_refresh_seconds, and it can also be refreshed once from the command line or cron:
+
+    python -m jobs.refresh_rollup_view
+"""
+
+import asyncio
+import logging
+import time
+
+from sqlalchemy import func, text
+from sqlalchemy.dialects.postgresql import insert
+
+from models.order_rollup import RollupViewRefresh, order_rollup_view
+from repository.order_rollup import expected_rollups
+
+logger = logging.getLogger(__name__)
+
+VIEW_NAME = order_rollup_view.name
+
+# Arbitrary key so that only one worker refreshes at a time, the others skip their turn
+_REFRESH_LOCK_KEY = 720_002
+
+
+def create_view(connection):
+    """Create the view if it does not exist, without data so that schema bootstrap does not scan the orders"""
+    query = expected_rollups().compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True})
+    connection.execute(text(f"CREATE MATERIALIZED VIEW IF NOT EXISTS {VIEW_NAME} AS {query} WITH NO DATA"))
+    # A concurrent refresh needs a unique index covering every row
+    connection.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS uq_{VIEW_NAME}_restaurant_id_month ON {VIEW_NAME} (restaurant_id, month)"))
+
+
+def refresh(engine) -> bool:
+    """Refresh the view and record when, returns False if another process is refreshing it already"""
+    with engine.begin() as connection:
+        if not connection.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": _REFRESH_LOCK_KEY}).scalar():
+            return False
+        populated = connection.execute(
+            text("SELECT ispopulated FROM pg_matviews WHERE schemaname = current_schema() AND matviewname = :name"), {"name": VIEW_NAME}
+        ).scalar()
+        # CONCURRENTLY keeps the view readable during the refresh, but cannot fill a view that was never populated
+        connection.execute(text(f"REFRESH MATERIALIZED VIEW {'CONCURRENTLY ' if populated else ''}{VIEW_NAME}"))
+        # now() is the start of this transaction, every order committed before it is in the refreshed view
+        statement = insert(RollupViewRefresh).values(view_name=VIEW_NAME, refreshed_at=func.now())
+        connection.execute(statement.on_conflict_do_update(index_elements=[RollupViewRefresh.view_name], set_={"refreshed_at": statement.excluded.refreshed_at}))
+    return True
+
+
+async def refresh_periodically(interval_seconds: float):
+    """Refresh the view every interval_seconds until cancelled, started by the application lifespan"""
+    from core.database import get_active_engine
+
+    while True:
+        started = time.perf_counter()
+        try:
+            if await asyncio.to_thread(refresh, get_active_engine()):
+                logger.info(f"Refreshed {VIEW_NAME} in {time.perf_counter() - started:.1f}s")
+        except Exception:
+            logger.error(f"Error refreshing {VIEW_NAME}", exc_info=True)
+        await asyncio.sleep(interval_seconds)
+
+
+if __name__ == "__main__":
+    from core.database import dispose, get_active_engine
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        started = time.perf_counter()
+        if refresh(get_active_engine()):
+            print(f"Refreshed {VIEW_NAME} in {time.perf_counter() - started:.1f}s")
+        else:
+            print(f"{VIEW_NAME} is being refreshed by another process")
+    finally:
+        dispose()
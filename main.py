@@ -8,16 +8,27 @@ from contextlib import asynccontextmanager
 
 from core.config import APP_CONFIG, AUTH_CONTROLLER
 from core.custom_exception import AppRuntimeException
-from core.database import get_db
+from core.database import dispose, dispose_async, get_db_thread_pool_stats, get_replica_set
+from core.notifier import create_notifier
+from core.instrumentation import get_instrumentation_config
+from core.schema import bootstrap_schema
+from jobs.dispatch_reminders import dispatch_periodically
+from jobs.refresh_rollup_view import refresh_periodically
+from services.call_plan import reconcile_periodically
 from middleware.auth_middleware import AuthMiddleware
 from middleware.exception_middleware import ExceptionMiddleware
+from middleware.query_stats_middleware import QueryStatsMiddleware
+from middleware.read_your_writes_middleware import ReadYourWritesMiddleware
 from router.restaurant import router as restaurant_router
 from router.user import router as user_router
 from router.interaction import router as interaction_router
 from router.call_plan import router as call_plan_router
-from router.order import router as order_router
+from router.order import bulk_router as order_bulk_router, router as order_router
 from router.performance import router as performance_router
+from router.portfolio import router as portfolio_router
 from router.auth import router as auth_router
+from router.debug import router as debug_router
+from router.export import router as export_router
 
 
 logger = logging.getLogger(__name__)
@@ -26,16 +37,39 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting up application...")
+    background_tasks = []
     try:
-        get_db()
-        logger.info("Database initialization completed")
+        try:
+            if APP_CONFIG.get("db_bootstrap_on_startup", True):
+                bootstrap_schema()
+                logger.info("Database initialization completed")
+            if APP_CONFIG.get("order_rollup_source", "table") == "view":
+                background_tasks.append(asyncio.create_task(refresh_periodically(APP_CONFIG.get("order_rollup_view_refresh_seconds", 300))))
+            call_plan_scheduler = APP_CONFIG.get("call_plan_scheduler", {})
+            if call_plan_scheduler.get("enabled", False):
+                background_tasks.append(asyncio.create_task(reconcile_periodically(call_plan_scheduler.get("reconcile_seconds", 300))))
+            reminders = APP_CONFIG.get("reminders", {})
+            if reminders.get("enabled", False):
+                notifier = create_notifier(reminders.get("notifier", "log"), **reminders.get("notifier_options", {}))
+                background_tasks.append(
+                    asyncio.create_task(
+                        dispatch_periodically(reminders.get("interval_seconds", 3600), notifier, reminders.get("chunk_size", 10_000), reminders.get("lease_seconds", 300))
+                    )
+                )
+        except Exception as e:
+            logger.error(f"Error during startup: {str(e)}")
+            raise AppRuntimeException(error_code=500, message="Failed to start the database") from e
         yield
-    except Exception as e:
-        logger.error(f"Error during startup: {str(e)}")
-        AppRuntimeException(error_code=500, message="Failed to start the database")
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        # Let cancelled tasks finish their database work and release their leases before the engines go away
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        await dispose_async()
+        logger.info("Database connections released")
 
 
-app = FastAPI(title=APP_CONFIG["app_name"], description=APP_CONFIG["description"], version=APP_CONFIG["version"])
+app = FastAPI(title=APP_CONFIG["app_name"], description=APP_CONFIG["description"], version=APP_CONFIG["version"], lifespan=lifespan)
 
 # Version1 API
 v1_app = APIRouter(prefix="/v1")
@@ -43,6 +77,10 @@ v1_app = APIRouter(prefix="/v1")
 # Middleware
 app.add_middleware(AuthMiddleware, auth_controller=AUTH_CONTROLLER)
 app.add_middleware(ExceptionMiddleware)
+app.add_middleware(ReadYourWritesMiddleware)
+sql_instrumentation = get_instrumentation_config()
+if sql_instrumentation["enabled"]:
+    app.add_middleware(QueryStatsMiddleware, sample_rate=sql_instrumentation["sample_rate"], repeat_threshold=sql_instrumentation["repeat_threshold"])
 
 
 @app.get("/health")
@@ -50,13 +88,22 @@ async def health():
     return {"status": "OK"}
 
 
+@app.get("/health/db")
+async def db_health():
+    return {"status": "OK", "thread_pool": get_db_thread_pool_stats(), "replicas": get_replica_set().stats()}
+
+
 v1_app.include_router(auth_router)
 v1_app.include_router(user_router)
 v1_app.include_router(restaurant_router)
 v1_app.include_router(interaction_router)
 v1_app.include_router(call_plan_router)
 v1_app.include_router(order_router)
+v1_app.include_router(order_bulk_router)
 v1_app.include_router(performance_router)
+v1_app.include_router(portfolio_router)
+v1_app.include_router(debug_router)
+v1_app.include_router(export_router)
 
 
 app.include_router(v1_app)
@@ -66,14 +113,22 @@ def _get_command_line_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("-p", "--PORT", help="Port")
     parser.add_argument("-ip", "--IP", help="IP Binding")
+    parser.add_argument("--init-db", action="store_true", help="Create or upgrade the database schema and exit")
     args = parser.parse_args()
     ip_to_run_on = args.IP if args.IP else APP_CONFIG.get("host")
     port_to_run_on = args.PORT if args.PORT else APP_CONFIG.get("port")
-    return ip_to_run_on, port_to_run_on
+    return ip_to_run_on, port_to_run_on, args.init_db
 
 
 if __name__ == "__main__":
-    ip_to_bind, port_to_bind = _get_command_line_args()
+    ip_to_bind, port_to_bind, init_db = _get_command_line_args()
+    if init_db:
+        try:
+            version = bootstrap_schema()
+            logger.info(f"Database schema is at version {version}")
+        finally:
+            dispose()
+        raise SystemExit(0)
     logger.info(f"Starting the app with IP:{ip_to_bind} and port:{port_to_bind}")
     config = Config()
     config.bind = [ip_to_bind + ":" + port_to_bind]
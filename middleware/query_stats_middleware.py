@@ -0,0 +1,20 @@
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from core.instrumentation import finish_request, start_request
+
+
+class QueryStatsMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app, sample_rate: float = 1.0, repeat_threshold: int = 1):
+        super().__init__(app)
+        self.sample_rate = sample_rate
+        self.repeat_threshold = repeat_threshold
+
+    async def dispatch(self, request, call_next):
+        stats = start_request(request.method, request.url.path, self.sample_rate)
+        if stats is None:
+            return await call_next(request)
+
+        response = await call_next(request)
+        finish_request(stats, self.repeat_threshold)
+        response.headers["Server-Timing"] = stats.server_timing()
+        return response
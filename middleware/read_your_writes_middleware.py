@@ -0,0 +1,11 @@
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from core.database import read_your_writes
+
+
+class ReadYourWritesMiddleware(BaseHTTPMiddleware):
+    """Once a request has written, its later reads stay on the primary. The marker is dropped with the request"""
+
+    async def dispatch(self, request, call_next):
+        with read_your_writes():
+            return await call_next(request)
@@ -0,0 +1,87 @@
+"""
+Schema versions 3, 4, 5, 8 and 9: the indexes declared on the models.
+
+Each version creates the indexes declared in models/ (index=True, unique=True or Index in
+__table_args__) that it introduced, if they are missing from the database. Naming them per version
+keeps an upgrade from an old schema building an index before the earlier steps have prepared its
+data, like the deduplication that the unique index on performance metrics needs. Schema bootstrap
+creates them inside its transaction, which blocks writes to each table while its index is built.
+For large tables build them beforehand without blocking writes:
+
+    python -m migrations.indexes
+"""
+
+import logging
+
+from sqlalchemy import func, select, text
+from sqlalchemy.schema import CreateIndex
+
+from models import base_model
+
+# Every model has to be imported so that its indexes are registered on Base.metadata
+from models import restaurant, user, interaction, order, order_rollup, call_plan, performance_metric  # noqa: F401
+from models.user import User
+
+logger = logging.getLogger(__name__)
+
+
+def declared_indexes() -> list:
+    return [index for table in base_model.Base.metadata.sorted_tables for index in sorted(table.indexes, key=lambda index: index.name)]
+
+
+def _existing_indexes(connection) -> dict:
+    """Index name -> whether the index is valid, an interrupted concurrent build leaves an invalid one behind"""
+    rows = connection.execute(
+        text(
+            "SELECT c.relname, i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "JOIN pg_namespace n ON n.oid = c.relnamespace WHERE n.nspname = current_schema()"
+        )
+    )
+    return {row[0]: row[1] for row in rows}
+
+
+def _check_unique_emails(connection):
+    duplicates = connection.execute(select(User.email).group_by(User.email).having(func.count() > 1).limit(10)).scalars().all()
+    if duplicates:
+        raise ValueError(f"Cannot create the unique index on user.email, duplicated emails: {', '.join(duplicates)}")
+
+
+def create_indexes(*names: str):
+    """Schema bootstrap step creating the named indexes, those already in the database are left alone"""
+
+    def create_missing_indexes(connection):
+        existing = _existing_indexes(connection)
+        missing = [index for index in declared_indexes() if index.name in names and index.name not in existing]
+        if any(index.table is User.__table__ and index.unique for index in missing):
+            _check_unique_emails(connection)
+        for index in missing:
+            index.create(connection)
+            logger.info(f"Created index {index.name}")
+
+    return create_missing_indexes
+
+
+def create_missing_indexes_concurrently(engine):
+    with engine.connect() as connection:
+        connection = connection.execution_options(isolation_level="AUTOCOMMIT")
+        existing = _existing_indexes(connection)
+        for index in declared_indexes():
+            if existing.get(index.name) is True:
+                continue
+            if index.name in existing:
+                connection.execute(text(f'DROP INDEX CONCURRENTLY "{index.name}"'))
+            if index.table is User.__table__ and index.unique:
+                _check_unique_emails(connection)
+            statement = str(CreateIndex(index).compile(dialect=connection.dialect)).replace("INDEX", "INDEX CONCURRENTLY", 1)
+            connection.execute(text(statement))
+            logger.info(f"Created index {index.name}")
+
+
+if __name__ == "__main__":
+    from core.database import dispose, get_active_engine
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        create_missing_indexes_concurrently(get_active_engine())
+    finally:
+        dispose()
@@ -0,0 +1,159 @@
+"""
+Schema version 2: ISO-string timestamp columns become TIMESTAMP WITH TIME ZONE.
+
+The conversion is done online so that large tables are never rewritten under an exclusive lock:
+
+1. prepare   - add a nullable "<column>__ts" shadow column per timestamp column and a trigger
+               that keeps it in sync for rows written by the running application
+2. backfill  - convert existing rows in primary-key order, committing one chunk at a time
+3. validate  - prove the shadow columns are complete with a NOT VALID + VALIDATE check constraint,
+               which does not block writes
+4. swap      - in one short transaction drop the string column and rename the shadow column in place
+
+For large tables run the steps ahead of the deploy, while the previous release is still serving:
+
+    python -m migrations.timestamp_columns --chunk-size 10000
+
+Schema bootstrap runs the same steps in a single transaction for databases that were not migrated beforehand.
+"""
+
+import argparse
+import logging
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+
+# table -> (primary key, timestamp columns)
+TIMESTAMP_COLUMNS = {
+    "restaurant": ("restaurant_id", ["created_at", "updated_at"]),
+    "user": ("user_id", ["created_at", "updated_at"]),
+    "interaction": ("interaction_id", ["interaction_date"]),
+    "order": ("order_id", ["created_at", "updated_at"]),
+    "call_plan": ("call_plan_id", ["created_at", "updated_at"]),
+    "performance_metric": ("metric_id", ["created_at", "updated_at"]),
+}
+
+
+def _shadow(column: str) -> str:
+    return f"{column}__ts"
+
+
+def _trigger_name(table: str) -> str:
+    return f"{table}_timestamp_columns_sync"
+
+
+def _check_name(table: str) -> str:
+    return f"{table}_timestamp_columns_filled"
+
+
+def _pending_tables(connection) -> list:
+    """Tables whose timestamp columns are still stored as strings"""
+    rows = connection.execute(
+        text("SELECT table_name, column_name FROM information_schema.columns WHERE table_schema = current_schema() AND data_type <> 'timestamp with time zone'")
+    ).fetchall()
+    string_columns = {(row[0], row[1]) for row in rows}
+    return [table for table, (_, columns) in TIMESTAMP_COLUMNS.items() if any((table, column) in string_columns for column in columns)]
+
+
+def prepare(connection, tables: list):
+    for table in tables:
+        _, columns = TIMESTAMP_COLUMNS[table]
+        for column in columns:
+            connection.execute(text(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "{_shadow(column)}" TIMESTAMP WITH TIME ZONE'))
+
+        assignments = "; ".join(f'NEW."{_shadow(column)}" := NEW."{column}"::timestamptz' for column in columns)
+        connection.execute(text(f'CREATE OR REPLACE FUNCTION "{_trigger_name(table)}"() RETURNS trigger AS $$ BEGIN {assignments}; RETURN NEW; END; $$ LANGUAGE plpgsql'))
+        connection.execute(text(f'DROP TRIGGER IF EXISTS "{_trigger_name(table)}" ON "{table}"'))
+        connection.execute(text(f'CREATE TRIGGER "{_trigger_name(table)}" BEFORE INSERT OR UPDATE ON "{table}" FOR EACH ROW EXECUTE FUNCTION "{_trigger_name(table)}"()'))
+
+
+def backfill_table(connection_factory, table: str, chunk_size: int) -> int:
+    """Convert existing rows in primary key order, one transaction per chunk. Returns the number of rows converted"""
+    primary_key, columns = TIMESTAMP_COLUMNS[table]
+    assignments = ", ".join(f'"{_shadow(column)}" = t."{column}"::timestamptz' for column in columns)
+    statement = text(
+        f'WITH batch AS (SELECT "{primary_key}" FROM "{table}" WHERE "{primary_key}" > :last_key ORDER BY "{primary_key}" LIMIT :chunk_size) '
+        f'UPDATE "{table}" AS t SET {assignments} FROM batch WHERE t."{primary_key}" = batch."{primary_key}" RETURNING t."{primary_key}"'
+    )
+
+    converted, last_key = 0, ""
+    while True:
+        with connection_factory() as connection:
+            keys = [row[0] for row in connection.execute(statement, {"last_key": last_key, "chunk_size": chunk_size})]
+        if not keys:
+            break
+        converted += len(keys)
+        last_key = max(keys)
+        logger.info(f'Backfilled {converted} rows of "{table}"')
+    return converted
+
+
+def validate(connection, tables: list):
+    for table in tables:
+        _, columns = TIMESTAMP_COLUMNS[table]
+        condition = " AND ".join(f'"{_shadow(column)}" IS NOT NULL' for column in columns)
+        connection.execute(text(f'ALTER TABLE "{table}" DROP CONSTRAINT IF EXISTS "{_check_name(table)}"'))
+        connection.execute(text(f'ALTER TABLE "{table}" ADD CONSTRAINT "{_check_name(table)}" CHECK ({condition}) NOT VALID'))
+        connection.execute(text(f'ALTER TABLE "{table}" VALIDATE CONSTRAINT "{_check_name(table)}"'))
+
+
+def swap(connection, tables: list):
+    for table in tables:
+        _, columns = TIMESTAMP_COLUMNS[table]
+        connection.execute(text(f'LOCK TABLE "{table}" IN ACCESS EXCLUSIVE MODE'))
+        connection.execute(text(f'DROP TRIGGER IF EXISTS "{_trigger_name(table)}" ON "{table}"'))
+        connection.execute(text(f'DROP FUNCTION IF EXISTS "{_trigger_name(table)}"()'))
+        for column in columns:
+            connection.execute(text(f'ALTER TABLE "{table}" DROP COLUMN "{column}"'))
+            connection.execute(text(f'ALTER TABLE "{table}" RENAME COLUMN "{_shadow(column)}" TO "{column}"'))
+            # The validated check constraint lets SET NOT NULL skip the table scan
+            connection.execute(text(f'ALTER TABLE "{table}" ALTER COLUMN "{column}" SET NOT NULL'))
+        connection.execute(text(f'ALTER TABLE "{table}" DROP CONSTRAINT IF EXISTS "{_check_name(table)}"'))
+        logger.info(f'Timestamp columns of "{table}" converted')
+
+
+def migrate_in_place(connection):
+    """Schema bootstrap step, runs every phase inside the bootstrap transaction"""
+    tables = _pending_tables(connection)
+    if not tables:
+        return
+    prepare(connection, tables)
+    for table in tables:
+        _, columns = TIMESTAMP_COLUMNS[table]
+        assignments = ", ".join(f'"{_shadow(column)}" = "{column}"::timestamptz' for column in columns)
+        connection.execute(text(f'UPDATE "{table}" SET {assignments}'))
+    validate(connection, tables)
+    swap(connection, tables)
+
+
+def migrate_online(engine, chunk_size: int):
+    with engine.begin() as connection:
+        tables = _pending_tables(connection)
+        if tables:
+            prepare(connection, tables)
+    if not tables:
+        logger.info("Timestamp columns are already converted")
+        return
+
+    for table in tables:
+        backfill_table(engine.begin, table, chunk_size)
+    with engine.begin() as connection:
+        validate(connection, tables)
+    with engine.begin() as connection:
+        connection.execute(text("SET LOCAL lock_timeout = '5s'"))
+        swap(connection, tables)
+
+
+if __name__ == "__main__":
+    from core.database import dispose, get_active_engine
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunk-size", type=int, default=10000, help="Rows converted per transaction")
+    args = parser.parse_args()
+    try:
+        migrate_online(get_active_engine(), args.chunk_size)
+    finally:
+        dispose()
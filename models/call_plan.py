@@ -1,22 +1,24 @@
-from sqlalchemy import Column, String, Integer, ForeignKey, Date
-from datetime import datetime, date
+from sqlalchemy import Column, String, Integer, ForeignKey, Date, DateTime, Index
 import uuid
 
-from models.base_model import Base
+from models.base_model import Base, utc_now
 
 
 class CallPlan(Base):
     __tablename__ = "call_plan"
+    # Serves a key account manager's calls in next call date order
+    __table_args__ = (Index("ix_call_plan_user_id_next_call_date", "user_id", "next_call_date"),)
 
-    call_plan_id = Column(String, primary_key=True, default=uuid.uuid4)
+    call_plan_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     restaurant_id = Column(String, ForeignKey("restaurant.restaurant_id"), nullable=False)
     user_id = Column(String, ForeignKey("user.user_id"), nullable=False)
     frequency_days = Column(Integer, nullable=False)  # Number of days between calls
     last_call_date = Column(Date, nullable=True)
-    next_call_date = Column(Date, nullable=False)
+    next_call_date = Column(Date, nullable=False, index=True)
     notes = Column(String, nullable=True)
-    created_at = Column(String, nullable=False, default=datetime.now)
-    updated_at = Column(String, nullable=False, default=datetime.now)
+    reminded_for = Column(Date, nullable=True)  # Due date of the last reminder run that sent this plan
+    created_at = Column(DateTime(timezone=True), nullable=False, default=utc_now)
+    updated_at = Column(DateTime(timezone=True), nullable=False, default=utc_now)
 
     def __repr__(self):
         return f"<CallPlan {self.call_plan_id}>"
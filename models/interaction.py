@@ -1,8 +1,8 @@
 import uuid
-from sqlalchemy import Column, String, Enum, ForeignKey
+from sqlalchemy import Column, String, Enum, ForeignKey, DateTime, Index
 from enum import Enum as PyEnum
 
-from models.base_model import Base
+from models.base_model import Base, utc_now
 
 
 class InteractionType(PyEnum):
@@ -15,12 +15,14 @@ class InteractionType(PyEnum):
 
 class Interaction(Base):
     __tablename__ = "interaction"
+    # Serves lookups by restaurant and the latest interaction of a restaurant
+    __table_args__ = (Index("ix_interaction_restaurant_id_interaction_date", "restaurant_id", "interaction_date"),)
 
-    interaction_id = Column(String, primary_key=True, default=uuid.uuid4)
+    interaction_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String, ForeignKey("user.user_id"), nullable=False, index=True)
-    restaurant_id = Column(String, ForeignKey("restaurant.restaurant_id"), nullable=False, index=True)
+    restaurant_id = Column(String, ForeignKey("restaurant.restaurant_id"), nullable=False)
     interaction_type = Column(Enum(InteractionType, values_callable=lambda x: [e.value for e in x]), nullable=False)
-    interaction_date = Column(String, nullable=False)
+    interaction_date = Column(DateTime(timezone=True), nullable=False, default=utc_now)
     notes = Column(String, nullable=True)
 
     def __repr__(self):
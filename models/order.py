@@ -1,7 +1,7 @@
 import uuid
-from sqlalchemy import Column, String, Enum, ForeignKey, Integer
+from sqlalchemy import Column, String, Enum, ForeignKey, Integer, DateTime, Index
 from enum import Enum as PyEnum
-from models.base_model import Base
+from models.base_model import Base, utc_now
 
 
 class OrderStatus(PyEnum):
@@ -13,17 +13,38 @@ class OrderStatus(PyEnum):
     CANCELED = "Canceled"
 
 
+# Statuses an order can move to from each status. Reopening is the only way out of CANCELED, so whether a change
+# cancels or reopens an order follows from the status it moves to
+ORDER_STATUS_TRANSITIONS = {
+    OrderStatus.NEW: {OrderStatus.CONFIRMED, OrderStatus.CANCELED},
+    OrderStatus.CONFIRMED: {OrderStatus.PREPARING, OrderStatus.CANCELED},
+    OrderStatus.PREPARING: {OrderStatus.READY, OrderStatus.CANCELED},
+    OrderStatus.READY: {OrderStatus.DELIVERED, OrderStatus.CANCELED},
+    OrderStatus.DELIVERED: set(),
+    OrderStatus.CANCELED: {OrderStatus.NEW},
+}
+
+
+def previous_statuses(status: OrderStatus) -> set:
+    """Statuses an order can be in to move to status"""
+    return {previous for previous, following in ORDER_STATUS_TRANSITIONS.items() if status in following}
+
+
 class Order(Base):
     __tablename__ = "order"
+    # Serves both the per-restaurant listing and the per-period metrics range scan
+    __table_args__ = (Index("ix_order_restaurant_id_created_at", "restaurant_id", "created_at"),)
 
-    order_id = Column(String, primary_key=True, default=uuid.uuid4)
+    order_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     restaurant_id = Column(String, ForeignKey("restaurant.restaurant_id"), nullable=False)
-    user_id = Column(String, ForeignKey("user.user_id"), nullable=False)
-    interaction_id = Column(String, ForeignKey("interaction.interaction_id"), nullable=False)
+    user_id = Column(String, ForeignKey("user.user_id"), nullable=False, index=True)
+    interaction_id = Column(String, ForeignKey("interaction.interaction_id"), nullable=False, index=True)
     status = Column(Enum(OrderStatus), default=OrderStatus.NEW)
     amount = Column(Integer, nullable=False)
-    created_at = Column(String, nullable=False)
-    updated_at = Column(String, nullable=False)
+    # Incremented on every change, clients send it back in If-Match to detect concurrent changes
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    created_at = Column(DateTime(timezone=True), nullable=False, default=utc_now)
+    updated_at = Column(DateTime(timezone=True), nullable=False, default=utc_now)
 
     def __repr__(self):
         return f"<Order {self.order_id}>"
@@ -0,0 +1,45 @@
+from sqlalchemy import BigInteger, Column, Date, DateTime, ForeignKey, Integer, String, column, table
+
+from models.base_model import Base, utc_now
+
+
+class OrderRollup(Base):
+    """Running order totals of a restaurant for one calendar month (UTC), canceled orders are not counted"""
+
+    __tablename__ = "order_rollup"
+
+    restaurant_id = Column(String, ForeignKey("restaurant.restaurant_id"), primary_key=True)
+    month = Column(Date, primary_key=True)  # First day of the month
+    order_count = Column(Integer, nullable=False, default=0)
+    amount_sum = Column(BigInteger, nullable=False, default=0)
+    first_order_at = Column(DateTime(timezone=True), nullable=True)
+    last_order_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), nullable=False, default=utc_now)
+
+    def __repr__(self):
+        return f"<OrderRollup {self.restaurant_id} {self.month}>"
+
+
+# Materialized view holding the same monthly totals recomputed from the orders, created and
+# refreshed by jobs/refresh_rollup_view.py. It is not part of Base.metadata, create_all cannot build views.
+order_rollup_view = table(
+    "order_rollup_view",
+    column("restaurant_id", String),
+    column("month", Date),
+    column("order_count", Integer),
+    column("amount_sum", BigInteger),
+    column("first_order_at", DateTime(timezone=True)),
+    column("last_order_at", DateTime(timezone=True)),
+)
+
+
+class RollupViewRefresh(Base):
+    """When a materialized view was last refreshed, it holds the orders committed up to that moment"""
+
+    __tablename__ = "rollup_view_refresh"
+
+    view_name = Column(String, primary_key=True)
+    refreshed_at = Column(DateTime(timezone=True), nullable=False)
+
+    def __repr__(self):
+        return f"<RollupViewRefresh {self.view_name} {self.refreshed_at}>"
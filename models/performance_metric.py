@@ -1,14 +1,18 @@
-from sqlalchemy import Column, String, Integer, Float, ForeignKey, Date
-from datetime import datetime
+from sqlalchemy import Column, String, Integer, Float, ForeignKey, Date, DateTime, Index
 import uuid
 
-from models.base_model import Base
+from models.base_model import Base, utc_now
 
 
 class PerformanceMetric(Base):
     __tablename__ = "performance_metric"
+    __table_args__ = (
+        Index("ix_performance_metric_period_start_period_end", "period_start", "period_end"),
+        # One row per restaurant and period, metric generation upserts on it
+        Index("uq_performance_metric_period", "restaurant_id", "period_start", "period_end", unique=True),
+    )
 
-    metric_id = Column(String, primary_key=True, default=uuid.uuid4)
+    metric_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     restaurant_id = Column(String, ForeignKey("restaurant.restaurant_id"), nullable=False, index=True)
     period_start = Column(Date, nullable=False)
     period_end = Column(Date, nullable=False)
@@ -16,8 +20,8 @@ class PerformanceMetric(Base):
     total_amount = Column(Float, default=0.0)
     average_order_value = Column(Float, default=0.0)
     order_frequency = Column(Float, default=0.0)  # Average days between orders
-    created_at = Column(String, nullable=False, default=datetime.now)
-    updated_at = Column(String, nullable=False, default=datetime.now)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=utc_now)
+    updated_at = Column(DateTime(timezone=True), nullable=False, default=utc_now)
 
     def __repr__(self):
         return f"<PerformanceMetric {self.restaurant_id} {self.period_start}-{self.period_end}>"
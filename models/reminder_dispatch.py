@@ -0,0 +1,18 @@
+from sqlalchemy import Column, Date, DateTime, String
+
+from models.base_model import Base
+
+
+class ReminderDispatch(Base):
+    """Progress of a reminder dispatch and the lease of the worker running it, one row per dispatch"""
+
+    __tablename__ = "reminder_dispatch"
+
+    name = Column(String, primary_key=True)
+    dispatched_through = Column(Date, nullable=True)  # Due date of the last completed run
+    run_until = Column(Date, nullable=True)  # Due date covered by the run in progress
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f"<ReminderDispatch {self.name} {self.dispatched_through}>"
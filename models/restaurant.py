@@ -1,9 +1,8 @@
-from sqlalchemy import Column, ForeignKey, String, Enum
-from datetime import datetime
+from sqlalchemy import Column, ForeignKey, String, Enum, DateTime
 import uuid
 from enum import Enum as PyEnum
 
-from models.base_model import Base
+from models.base_model import Base, utc_now
 
 
 class RestaurantStatus(PyEnum):
@@ -17,14 +16,14 @@ class RestaurantStatus(PyEnum):
 class Restaurant(Base):
     __tablename__ = "restaurant"
 
-    restaurant_id = Column(String, primary_key=True, default=uuid.uuid4)
+    restaurant_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     name = Column(String, nullable=False)
     address = Column(String, nullable=False)
     phone = Column(String, nullable=False)
     email = Column(String, nullable=False)
     status = Column(Enum(RestaurantStatus), default=RestaurantStatus.NEW)
-    created_at = Column(String, nullable=False, default=datetime.now)
-    updated_at = Column(String, nullable=False, default=datetime.now)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=utc_now)
+    updated_at = Column(DateTime(timezone=True), nullable=False, default=utc_now)
 
     def __repr__(self):
         return f"<Restaurant {self.name}>"
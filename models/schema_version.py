@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String
+from datetime import datetime
+
+from models.base_model import Base
+
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+
+    version = Column(Integer, primary_key=True)
+    description = Column(String, nullable=True)
+    applied_at = Column(String, nullable=False, default=lambda: datetime.now().isoformat())
+
+    def __repr__(self):
+        return f"<SchemaVersion {self.version}>"
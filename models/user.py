@@ -1,9 +1,8 @@
-from sqlalchemy import Column, ForeignKey, String, Enum
-from datetime import datetime
+from sqlalchemy import Column, ForeignKey, String, Enum, DateTime
 import uuid
 from enum import Enum as PyEnum
 
-from models.base_model import Base
+from models.base_model import Base, utc_now
 
 
 class UserRole(PyEnum):
@@ -16,15 +15,15 @@ class UserRole(PyEnum):
 class User(Base):
     __tablename__ = "user"
 
-    user_id = Column(String, primary_key=True, default=uuid.uuid4)
+    user_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     name = Column(String, nullable=False)
-    email = Column(String, nullable=False)
+    email = Column(String, nullable=False, unique=True, index=True)
     phone = Column(String, nullable=False)
     role = Column(Enum(UserRole), default=UserRole.STAFF)
     hashed_password = Column(String, nullable=False)
-    restaurant_id = Column(String, ForeignKey("restaurant.restaurant_id"), nullable=False)
-    created_at = Column(String, nullable=False, default=datetime.now)
-    updated_at = Column(String, nullable=False, default=datetime.now)
+    restaurant_id = Column(String, ForeignKey("restaurant.restaurant_id"), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=utc_now)
+    updated_at = Column(DateTime(timezone=True), nullable=False, default=utc_now)
 
     def __repr__(self):
         return f"<Contact {self.name}>"
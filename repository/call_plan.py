@@ -1,38 +1,83 @@
 import logging
-from typing import Optional, List
+from typing import Iterator, Optional, List, Tuple
 from datetime import date, timedelta
+from sqlalchemy import Date, String, column, func, select, tuple_, update, values
 
+from models.base_model import utc_now
 from models.call_plan import CallPlan
 from core.custom_exception import handle_exception
 from core.database import managed_transaction, DbConnector
 
 logger = logging.getLogger(__name__)
 
+# Call plans read per transaction when loading the whole schedule
+SCHEDULE_CHUNK_SIZE = 10_000
+
+
+def iter_schedule(engine, chunk_size: int = SCHEDULE_CHUNK_SIZE) -> Iterator[Tuple[str, str, str, date]]:
+    """(call_plan_id, user_id, restaurant_id, next_call_date) of every call plan, read in call_plan_id order in short
+    transactions of chunk_size rows. Blocking, run it off the event loop. Reads the primary: a lagging replica would
+    undo the scheduler's most recent writes when it reconciles"""
+    after = None
+    while True:
+        statement = select(CallPlan.call_plan_id, CallPlan.user_id, CallPlan.restaurant_id, CallPlan.next_call_date)
+        if after is not None:
+            statement = statement.where(CallPlan.call_plan_id > after)
+        with engine.connect() as connection:
+            rows = connection.execute(statement.order_by(CallPlan.call_plan_id).limit(chunk_size)).all()
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        after = rows[-1][0]
+
 
 class CallPlanRepository:
     @managed_transaction
     async def create(self, restaurant_id: str, user_id: str, frequency_days: int, next_call_date: date, notes: Optional[str] = None, db: Optional[DbConnector] = None) -> CallPlan:
         try:
             call_plan = CallPlan(restaurant_id=restaurant_id, user_id=user_id, frequency_days=frequency_days, next_call_date=next_call_date, notes=notes)
-            db.Session.add(call_plan)
+            db.add(call_plan)
+            await db.flush()
             return call_plan
         except Exception as e:
             logger.error(f"Error creating call plan: {str(e)}")
             handle_exception(message="Failed to create call plan")
 
-    @managed_transaction
-    async def get_due_calls(self, due_date: date, db: Optional[DbConnector] = None) -> List[CallPlan]:
+    @managed_transaction(read_only=True)
+    async def get_due_calls(
+        self, user_id: str, due_date: date, limit: int, after: Optional[Tuple[date, str]] = None, db: Optional[DbConnector] = None
+    ) -> List[CallPlan]:
+        """The user's calls due by due_date in (next_call_date, call_plan_id) order, starting after the given key"""
         try:
-            query = db.Session.query(CallPlan).filter(CallPlan.next_call_date <= due_date).all()
-            return query
+            query = select(CallPlan).where(CallPlan.user_id == user_id, CallPlan.next_call_date <= due_date)
+            if after:
+                after_date, after_id = after
+                # The plain bound lets the (user_id, next_call_date) index scan start at the key, the row comparison skips its ties
+                query = query.where(CallPlan.next_call_date >= after_date, tuple_(CallPlan.next_call_date, CallPlan.call_plan_id) > tuple_(after_date, after_id))
+            query = query.order_by(CallPlan.next_call_date, CallPlan.call_plan_id).limit(limit)
+            return (await db.execute(query)).scalars().all()
         except Exception as e:
             logger.error(f"Error fetching due calls: {str(e)}")
             handle_exception(message="Failed to fetch due calls")
 
+    @managed_transaction(read_only=True)
+    async def count_due_calls(self, user_id: str, due_date: date, overdue_before: date, db: Optional[DbConnector] = None) -> Tuple[int, int]:
+        """Number of the user's calls due by due_date and how many of them are due before overdue_before"""
+        try:
+            result = await db.execute(
+                select(func.count(), func.count().filter(CallPlan.next_call_date < overdue_before)).where(
+                    CallPlan.user_id == user_id, CallPlan.next_call_date <= due_date
+                )
+            )
+            return tuple(result.one())
+        except Exception as e:
+            logger.error(f"Error counting due calls: {str(e)}")
+            handle_exception(message="Failed to fetch due calls")
+
     @managed_transaction
     async def update_after_call(self, call_plan_id: str, call_date: date, db: Optional[DbConnector] = None) -> Optional[CallPlan]:
         try:
-            call_plan = db.Session.query(CallPlan).filter(CallPlan.call_plan_id == call_plan_id).first()
+            call_plan = (await db.execute(select(CallPlan).where(CallPlan.call_plan_id == call_plan_id))).scalars().first()
             if call_plan:
                 call_plan.last_call_date = call_date
                 call_plan.next_call_date = call_date + timedelta(days=call_plan.frequency_days)
@@ -41,3 +86,22 @@ class CallPlanRepository:
         except Exception as e:
             logger.error(f"Error updating call plan: {str(e)}")
             handle_exception(message="Failed to update call plan")
+
+    @managed_transaction
+    async def update_after_calls(self, calls: List[Tuple[str, date]], db: Optional[DbConnector] = None) -> List[CallPlan]:
+        """Record a call on every (call_plan_id, call_date) pair in one UPDATE ... FROM (VALUES ...), returns the updated
+        plans, ids that match no plan are left out. Each call_plan_id may only appear once"""
+        try:
+            recorded = values(column("call_plan_id", String), column("call_date", Date), name="recorded_calls").data(calls)
+            statement = (
+                update(CallPlan)
+                .where(CallPlan.call_plan_id == recorded.c.call_plan_id)
+                .values(last_call_date=recorded.c.call_date, next_call_date=recorded.c.call_date + CallPlan.frequency_days, updated_at=utc_now())
+                .returning(CallPlan)
+                # The returned rows carry the new values, there are no loaded objects to synchronize
+                .execution_options(synchronize_session=False)
+            )
+            return (await db.execute(statement)).scalars().all()
+        except Exception as e:
+            logger.error(f"Error updating call plans: {str(e)}")
+            handle_exception(message="Failed to update call plans")
@@ -1,5 +1,7 @@
 import logging
 from typing import Optional, List
+from datetime import datetime
+from sqlalchemy import select, update
 
 from models.interaction import Interaction, InteractionType
 from core.custom_exception import handle_exception
@@ -12,20 +14,21 @@ logger = logging.getLogger(__name__)
 class InteractionRepository(BaseRepository):
     @managed_transaction
     async def create(
-        self, user_id: str, restaurant_id: str, interaction_type: InteractionType, interaction_date: str, notes: Optional[str] = None, db: Optional[DbConnector] = None
+        self, user_id: str, restaurant_id: str, interaction_type: InteractionType, interaction_date: datetime, notes: Optional[str] = None, db: Optional[DbConnector] = None
     ) -> Interaction:
         try:
             interaction = Interaction(user_id=user_id, restaurant_id=restaurant_id, interaction_type=interaction_type, interaction_date=interaction_date, notes=notes)
-            db.Session.add(interaction)
+            db.add(interaction)
+            await db.flush()
             return interaction
         except Exception as e:
             logger.error(f"Error creating interaction: {str(e)}")
             handle_exception(message="Failed to create interaction")
 
-    @managed_transaction
+    @managed_transaction(read_only=True)
     async def get_all(self, db: Optional[DbConnector] = None) -> List[Interaction]:
         try:
-            query = db.Session.query(Interaction).all()
+            query = (await db.execute(select(Interaction))).scalars().all()
             return query
         except Exception as e:
             logger.error(f"Error fetching all interactions: {str(e)}")
@@ -34,25 +37,25 @@ class InteractionRepository(BaseRepository):
     @managed_transaction
     async def get_by_id(self, interaction_id: str, db: Optional[DbConnector] = None) -> Optional[Interaction]:
         try:
-            query = db.Session.query(Interaction).filter(Interaction.interaction_id == interaction_id).first()
+            query = (await db.execute(select(Interaction).where(Interaction.interaction_id == interaction_id))).scalars().first()
             return query
         except Exception as e:
             logger.error(f"Error fetching interaction by id: {str(e)}")
             handle_exception(message="Failed to fetch interaction")
 
-    @managed_transaction
+    @managed_transaction(read_only=True)
     async def get_by_restaurant(self, restaurant_id: str, db: Optional[DbConnector] = None) -> List[Interaction]:
         try:
-            query = db.Session.query(Interaction).filter(Interaction.restaurant_id == restaurant_id).all()
+            query = (await db.execute(select(Interaction).where(Interaction.restaurant_id == restaurant_id))).scalars().all()
             return query
         except Exception as e:
             logger.error(f"Error fetching interactions by restaurant: {str(e)}")
             handle_exception(message="Failed to fetch interactions")
 
-    @managed_transaction
+    @managed_transaction(read_only=True)
     async def get_by_contact(self, user_id: str, db: Optional[DbConnector] = None) -> List[Interaction]:
         try:
-            query = db.Session.query(Interaction).filter(Interaction.user_id == user_id).all()
+            query = (await db.execute(select(Interaction).where(Interaction.user_id == user_id))).scalars().all()
             return query
         except Exception as e:
             logger.error(f"Error fetching interactions by contact: {str(e)}")
@@ -62,7 +65,7 @@ class InteractionRepository(BaseRepository):
     async def update(self, interaction_id: str, interaction_data: dict, db: Optional[DbConnector] = None) -> Optional[Interaction]:
         try:
             if interaction_data:
-                db.Session.query(Interaction).filter(Interaction.interaction_id == interaction_id).update(interaction_data)
+                await db.execute(update(Interaction).where(Interaction.interaction_id == interaction_id).values(**interaction_data))
                 return await self.get_by_id(interaction_id, db=db)
             return None
         except Exception as e:
@@ -74,7 +77,7 @@ class InteractionRepository(BaseRepository):
         try:
             interaction = await self.get_by_id(interaction_id, db=db)
             if interaction:
-                db.Session.delete(interaction)
+                await db.delete(interaction)
                 return True
             return False
         except Exception as e:
@@ -1,56 +1,68 @@
 import logging
 from typing import Optional, List
+from datetime import datetime
+from sqlalchemy import select, update
 
-from models.order import Order
+from models.base_model import utc_now
+from models.order import Order, OrderStatus
 from core.custom_exception import handle_exception
 from core.database import managed_transaction, DbConnector
 from repository.base_repository import BaseRepository
 
 logger = logging.getLogger(__name__)
 
+# The status, amount, restaurant and creation time feed the status transitions and the monthly rollups
+UPDATABLE_FIELDS = {"user_id", "interaction_id"}
+
 
 class OrderRepository(BaseRepository):
     @managed_transaction
-    async def create(self, restaurant_id: str, user_id: str, interaction_id: str, amount: int, created_at: str, updated_at: str, db: Optional[DbConnector] = None) -> Order:
+    async def create(
+        self, restaurant_id: str, user_id: str, interaction_id: str, amount: int, created_at: datetime, updated_at: datetime, db: Optional[DbConnector] = None
+    ) -> Order:
         try:
             order = Order(restaurant_id=restaurant_id, user_id=user_id, interaction_id=interaction_id, amount=amount, created_at=created_at, updated_at=updated_at)
-            db.Session.add(order)
+            db.add(order)
+            await db.flush()
             return order
         except Exception as e:
             logger.error(f"Error creating order: {str(e)}")
             handle_exception(message="Failed to create order")
 
-    @managed_transaction
+    @managed_transaction(read_only=True)
     async def get_all(self, db: Optional[DbConnector] = None) -> List[Order]:
         try:
-            query = db.Session.query(Order).all()
+            query = (await db.execute(select(Order))).scalars().all()
             return query
         except Exception as e:
             logger.error(f"Error fetching all orders: {str(e)}")
             handle_exception(message="Failed to fetch orders")
 
     @managed_transaction
-    async def get_by_id(self, order_id: str, db: Optional[DbConnector] = None) -> Optional[Order]:
+    async def get_by_id(self, order_id: str, for_update: bool = False, db: Optional[DbConnector] = None) -> Optional[Order]:
         try:
-            query = db.Session.query(Order).filter(Order.order_id == order_id).first()
+            statement = select(Order).where(Order.order_id == order_id)
+            if for_update:
+                statement = statement.with_for_update()
+            query = (await db.execute(statement)).scalars().first()
             return query
         except Exception as e:
             logger.error(f"Error fetching order by id: {str(e)}")
             handle_exception(message="Failed to fetch order")
 
-    @managed_transaction
+    @managed_transaction(read_only=True)
     async def get_by_restaurant(self, restaurant_id: str, db: Optional[DbConnector] = None) -> List[Order]:
         try:
-            query = db.Session.query(Order).filter(Order.restaurant_id == restaurant_id).all()
+            query = (await db.execute(select(Order).where(Order.restaurant_id == restaurant_id))).scalars().all()
             return query
         except Exception as e:
             logger.error(f"Error fetching orders by restaurant: {str(e)}")
             handle_exception(message="Failed to fetch orders")
 
-    @managed_transaction
+    @managed_transaction(read_only=True)
     async def get_by_contact(self, user_id: str, db: Optional[DbConnector] = None) -> List[Order]:
         try:
-            query = db.Session.query(Order).filter(Order.user_id == user_id).all()
+            query = (await db.execute(select(Order).where(Order.user_id == user_id))).scalars().all()
             return query
         except Exception as e:
             logger.error(f"Error fetching orders by contact: {str(e)}")
@@ -58,21 +70,45 @@ class OrderRepository(BaseRepository):
 
     @managed_transaction
     async def update(self, order_id: str, order_data: dict, db: Optional[DbConnector] = None) -> Optional[Order]:
+        """Update the fields of an order that neither its status nor the monthly rollups depend on"""
+        if not order_data.keys() <= UPDATABLE_FIELDS:
+            handle_exception(message=f"Only {', '.join(sorted(UPDATABLE_FIELDS))} of an order can be updated, its status changes through transition_status")
         try:
             if order_data:
-                db.Session.query(Order).filter(Order.order_id == order_id).update(order_data)
+                await db.execute(update(Order).where(Order.order_id == order_id).values(**order_data, version=Order.version + 1, updated_at=utc_now()))
                 return await self.get_by_id(order_id, db=db)
             return None
         except Exception as e:
             logger.error(f"Error updating order: {str(e)}")
             handle_exception(message="Failed to update order")
 
+    @managed_transaction
+    async def transition_status(
+        self, order_id: str, status: OrderStatus, previous: set, expected_version: Optional[int] = None, db: Optional[DbConnector] = None
+    ) -> Optional[Order]:
+        """Move the order to status in one UPDATE ... RETURNING, provided it is in one of the previous statuses and,
+        when given, still at expected_version. Returns None if the order does not match"""
+        try:
+            statement = update(Order).where(Order.order_id == order_id, Order.status.in_(previous))
+            if expected_version is not None:
+                statement = statement.where(Order.version == expected_version)
+            statement = (
+                statement.values(status=status, version=Order.version + 1, updated_at=utc_now())
+                .returning(Order)
+                # The returned row carries the new values, there are no loaded objects to synchronize
+                .execution_options(synchronize_session=False)
+            )
+            return (await db.execute(statement)).scalars().first()
+        except Exception as e:
+            logger.error(f"Error changing order status: {str(e)}")
+            handle_exception(message="Failed to update order status")
+
     @managed_transaction
     async def delete(self, order_id: str, db: Optional[DbConnector] = None) -> bool:
         try:
             order = await self.get_by_id(order_id, db=db)
             if order:
-                db.Session.delete(order)
+                await db.delete(order)
                 return True
             return False
         except Exception as e:
@@ -0,0 +1,127 @@
+import logging
+from datetime import date, datetime, timezone
+from typing import Optional
+from sqlalchemy import Date, case, cast, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+
+from models.base_model import utc_now
+from models.order import Order, OrderStatus
+from models.order_rollup import OrderRollup
+from core.custom_exception import handle_exception
+from core.database import managed_transaction, DbConnector
+
+logger = logging.getLogger(__name__)
+
+
+def month_of(moment: datetime) -> date:
+    """Rollup month of an order, months are calendar months in UTC"""
+    return moment.astimezone(timezone.utc).date().replace(day=1)
+
+
+def _month_range(month: date) -> tuple:
+    next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+    return datetime.combine(month, datetime.min.time(), timezone.utc), datetime.combine(next_month, datetime.min.time(), timezone.utc)
+
+
+def counted_orders(restaurant_id, month: date) -> tuple:
+    """Conditions selecting the orders a rollup row counts"""
+    month_start, month_end = _month_range(month)
+    return (
+        Order.restaurant_id == restaurant_id,
+        Order.created_at >= month_start,
+        Order.created_at < month_end,
+        Order.status.is_distinct_from(OrderStatus.CANCELED),
+    )
+
+
+def expected_rollups():
+    """Rollup rows recomputed from the raw orders, the source of truth for reconciliation"""
+    order_month = cast(func.date_trunc("month", func.timezone("UTC", Order.created_at)), Date)
+    return (
+        select(
+            Order.restaurant_id.label("restaurant_id"),
+            order_month.label("month"),
+            func.count().label("order_count"),
+            func.coalesce(func.sum(Order.amount), 0).label("amount_sum"),
+            func.min(Order.created_at).label("first_order_at"),
+            func.max(Order.created_at).label("last_order_at"),
+        )
+        .where(Order.status.is_distinct_from(OrderStatus.CANCELED))
+        .group_by(Order.restaurant_id, order_month)
+    )
+
+
+ROLLUP_INCREMENT_COLUMNS = ["restaurant_id", "month", "order_count", "amount_sum", "first_order_at", "last_order_at", "updated_at"]
+
+
+def rollup_increments(source=None):
+    """Upsert adding the totals of new orders to their monthly rollup, from the ROLLUP_INCREMENT_COLUMNS parameters or
+    from a select of those columns. Sort the months of a bulk upsert by (restaurant_id, month) so that concurrent
+    writers lock the rollup rows in the same order"""
+    statement = insert(OrderRollup) if source is None else insert(OrderRollup).from_select(ROLLUP_INCREMENT_COLUMNS, source)
+    return statement.on_conflict_do_update(
+        index_elements=[OrderRollup.restaurant_id, OrderRollup.month],
+        set_={
+            "order_count": OrderRollup.order_count + statement.excluded.order_count,
+            "amount_sum": OrderRollup.amount_sum + statement.excluded.amount_sum,
+            # least() and greatest() skip NULL, the bounds of an emptied month
+            "first_order_at": func.least(OrderRollup.first_order_at, statement.excluded.first_order_at),
+            "last_order_at": func.greatest(OrderRollup.last_order_at, statement.excluded.last_order_at),
+            "updated_at": statement.excluded.updated_at,
+        },
+    )
+
+
+class OrderRollupRepository:
+    @managed_transaction
+    async def add_order(self, restaurant_id: str, created_at: datetime, amount: int, db: Optional[DbConnector] = None):
+        """Count an order in its month, call it in the transaction that places (or restores) the order"""
+        try:
+            await db.execute(
+                rollup_increments(),
+                {
+                    "restaurant_id": restaurant_id,
+                    "month": month_of(created_at),
+                    "order_count": 1,
+                    "amount_sum": amount,
+                    "first_order_at": created_at,
+                    "last_order_at": created_at,
+                    "updated_at": utc_now(),
+                },
+            )
+        except Exception as e:
+            logger.error(f"Error adding order to rollup: {str(e)}")
+            handle_exception(message="Failed to update order rollup")
+
+    @managed_transaction
+    async def remove_order(self, restaurant_id: str, created_at: datetime, amount: int, db: Optional[DbConnector] = None):
+        """Stop counting an order, call it in the transaction that cancels it after its status has changed"""
+        try:
+            month = month_of(created_at)
+            remaining = select(Order.created_at).where(*counted_orders(restaurant_id, month))
+            # Only removing the first or last order of the month moves a bound, then it is looked up on the (restaurant_id, created_at) index
+            first_order_at = remaining.order_by(Order.created_at.asc()).limit(1).scalar_subquery()
+            last_order_at = remaining.order_by(Order.created_at.desc()).limit(1).scalar_subquery()
+            await db.execute(
+                update(OrderRollup)
+                .where(OrderRollup.restaurant_id == restaurant_id, OrderRollup.month == month)
+                .values(
+                    order_count=OrderRollup.order_count - 1,
+                    amount_sum=OrderRollup.amount_sum - amount,
+                    first_order_at=case((OrderRollup.first_order_at == created_at, first_order_at), else_=OrderRollup.first_order_at),
+                    last_order_at=case((OrderRollup.last_order_at == created_at, last_order_at), else_=OrderRollup.last_order_at),
+                    updated_at=utc_now(),
+                )
+            )
+        except Exception as e:
+            logger.error(f"Error removing order from rollup: {str(e)}")
+            handle_exception(message="Failed to update order rollup")
+
+    @managed_transaction(read_only=True)
+    async def get_month(self, restaurant_id: str, month: date, db: Optional[DbConnector] = None) -> Optional[OrderRollup]:
+        try:
+            result = await db.execute(select(OrderRollup).where(OrderRollup.restaurant_id == restaurant_id, OrderRollup.month == month))
+            return result.scalars().first()
+        except Exception as e:
+            logger.error(f"Error fetching order rollup: {str(e)}")
+            handle_exception(message="Failed to fetch order rollup")
@@ -1,79 +1,269 @@
 import logging
-from typing import Optional, List
-from datetime import date
-from sqlalchemy import func
+import uuid
+from typing import Callable, Optional, List
+from datetime import date, datetime, time, timedelta, timezone
+from sqlalchemy import Date, Float, Integer, cast, func, literal_column, select
+from sqlalchemy.dialects.postgresql import distinct_on, insert
 
+from models.base_model import utc_now
 from models.performance_metric import PerformanceMetric
-from models.order import Order
+from models.order import Order, OrderStatus
+from models.order_rollup import OrderRollup, RollupViewRefresh, order_rollup_view
+from models.restaurant import Restaurant
 from core.custom_exception import handle_exception
 from core.database import managed_transaction, DbConnector
 
 logger = logging.getLogger(__name__)
 
+# Metrics restaurants can be ranked by
+RANKING_COLUMNS = {
+    "total_orders": PerformanceMetric.total_orders,
+    "total_amount": PerformanceMetric.total_amount,
+    "average_order_value": PerformanceMetric.average_order_value,
+    "order_frequency": PerformanceMetric.order_frequency,
+}
+
+
+def _day_start(day: date) -> datetime:
+    # Range bounds instead of func.date(column) keep the created_at filters usable by an index
+    return datetime.combine(day, time.min, timezone.utc)
+
+
+def _in_period(start_date: date, end_date: date) -> tuple:
+    return (
+        Order.created_at >= _day_start(start_date),
+        Order.created_at < _day_start(end_date + timedelta(days=1)),
+        Order.status.is_distinct_from(OrderStatus.CANCELED),
+    )
+
+
+def _is_calendar_month(start_date: date, end_date: date) -> bool:
+    """Whether the period is exactly one month, which the order rollups can answer"""
+    next_day = end_date + timedelta(days=1)
+    return start_date.day == 1 and next_day.day == 1 and (next_day.year * 12 + next_day.month) - (start_date.year * 12 + start_date.month) == 1
+
+
+def _metric_columns() -> tuple:
+    """Order count, amount sum, average amount and average days between consecutive orders"""
+    # The gaps between consecutive orders add up to last - first, so their mean needs no sorted window
+    # over the orders. With one order or none there is no gap and the frequency is 0 as before.
+    span_days = func.extract("epoch", func.max(Order.created_at) - func.min(Order.created_at)) / 86400
+    return (
+        func.count().label("total_orders"),
+        cast(func.coalesce(func.sum(Order.amount), 0), Float).label("total_amount"),
+        cast(func.coalesce(func.avg(Order.amount), 0), Float).label("average_order_value"),
+        cast(func.coalesce(span_days / func.nullif(func.count() - 1, 0), 0), Float).label("order_frequency"),
+    )
+
+
+def _period_aggregate(restaurant_id: str, start_date: date, end_date: date):
+    return select(*_metric_columns()).where(Order.restaurant_id == restaurant_id, *_in_period(start_date, end_date))
+
+
+def _rollup_source() -> str:
+    """Where monthly metrics are read from: "table" for the order_rollup table, "view" for order_rollup_view"""
+    from core.config import APP_CONFIG
+
+    return APP_CONFIG.get("order_rollup_source", "table")
+
+
+async def _month_rollups(db: DbConnector, start_date: date, end_date: date):
+    """Table of the rollups holding the month's totals, None when the month has to be aggregated from its orders"""
+    if _rollup_source() != "view":
+        return OrderRollup.__table__
+    result = await db.execute(select(RollupViewRefresh.refreshed_at).where(RollupViewRefresh.view_name == order_rollup_view.name))
+    refreshed_at = result.scalar()
+    # The view is complete only for months that were over when it was last refreshed, the current month is aggregated live
+    if refreshed_at is not None and _day_start(end_date + timedelta(days=1)) <= refreshed_at:
+        return order_rollup_view
+    return None
+
+
+def _rollup_metric_columns(rollups) -> tuple:
+    """The same metrics read from a month's order rollup, NULL columns of a missing rollup give zeros"""
+    span_days = func.extract("epoch", rollups.c.last_order_at - rollups.c.first_order_at) / 86400
+    return (
+        func.coalesce(rollups.c.order_count, 0).label("total_orders"),
+        cast(func.coalesce(rollups.c.amount_sum, 0), Float).label("total_amount"),
+        cast(func.coalesce(rollups.c.amount_sum / func.nullif(cast(rollups.c.order_count, Float), 0), 0), Float).label("average_order_value"),
+        cast(func.coalesce(span_days / func.nullif(rollups.c.order_count - 1, 0), 0), Float).label("order_frequency"),
+    )
+
+
+def _rollup_aggregate(restaurant_id: str, month: date, rollups=OrderRollup.__table__):
+    return select(*_rollup_metric_columns(rollups)).where(rollups.c.restaurant_id == restaurant_id, rollups.c.month == month)
+
+
+def _upsert_metrics():
+    """Insert metrics, replacing the values of a period that was already generated"""
+    statement = insert(PerformanceMetric)
+    updated_columns = ("total_orders", "total_amount", "average_order_value", "order_frequency", "updated_at")
+    return statement.on_conflict_do_update(
+        index_elements=[PerformanceMetric.restaurant_id, PerformanceMetric.period_start, PerformanceMetric.period_end],
+        set_={column: statement.excluded[column] for column in updated_columns},
+    )
+
+
+def _all_restaurants_aggregate(start_date: date, end_date: date, rollups=None):
+    """One grouped pass over the period's orders (or the month's rollups), restaurants without orders get zeros"""
+    if rollups is not None:
+        return (
+            select(Restaurant.restaurant_id, *_rollup_metric_columns(rollups))
+            .outerjoin(rollups, (rollups.c.restaurant_id == Restaurant.restaurant_id) & (rollups.c.month == start_date))
+            .order_by(Restaurant.restaurant_id)
+        )
+    per_restaurant = select(Order.restaurant_id, *_metric_columns()).where(*_in_period(start_date, end_date)).group_by(Order.restaurant_id).subquery()
+    return (
+        select(
+            Restaurant.restaurant_id,
+            func.coalesce(per_restaurant.c.total_orders, 0).label("total_orders"),
+            func.coalesce(per_restaurant.c.total_amount, 0).label("total_amount"),
+            func.coalesce(per_restaurant.c.average_order_value, 0).label("average_order_value"),
+            func.coalesce(per_restaurant.c.order_frequency, 0).label("order_frequency"),
+        )
+        .outerjoin(per_restaurant, per_restaurant.c.restaurant_id == Restaurant.restaurant_id)
+        .order_by(Restaurant.restaurant_id)
+    )
+
 
 class PerformanceRepository:
     @managed_transaction
     async def calculate_metrics(self, restaurant_id: str, start_date: date, end_date: date, db: Optional[DbConnector] = None) -> PerformanceMetric:
         try:
-            # Get orders for the period
-            orders = db.Session.query(Order).filter(Order.restaurant_id == restaurant_id, func.date(Order.created_at) >= start_date, func.date(Order.created_at) <= end_date).all()
-
-            total_orders = len(orders)
-            total_amount = sum(order.amount for order in orders)
-            avg_order_value = total_amount / total_orders if total_orders > 0 else 0
-
-            # Calculate order frequency
-            if total_orders > 1:
-                date_diff = (end_date - start_date).days
-                order_frequency = date_diff / total_orders
+            rollups = await _month_rollups(db, start_date, end_date) if _is_calendar_month(start_date, end_date) else None
+            if rollups is not None:
+                # A month is a single row of the rollups, no month without orders has one
+                result = await db.execute(_rollup_aggregate(restaurant_id, start_date, rollups))
+                total_orders, total_amount, avg_order_value, order_frequency = result.one_or_none() or (0, 0.0, 0.0, 0.0)
             else:
-                order_frequency = 0
-
-            metric = PerformanceMetric(
-                restaurant_id=restaurant_id,
-                period_start=start_date,
-                period_end=end_date,
-                total_orders=total_orders,
-                total_amount=total_amount,
-                average_order_value=avg_order_value,
-                order_frequency=order_frequency,
-            )
+                # Aggregate the period's orders in the database instead of loading them
+                result = await db.execute(_period_aggregate(restaurant_id, start_date, end_date))
+                total_orders, total_amount, avg_order_value, order_frequency = result.one()
 
-            db.Session.add(metric)
-            return metric
+            current_time = utc_now()
+            result = await db.execute(
+                _upsert_metrics()
+                .values(
+                    metric_id=str(uuid.uuid4()),
+                    restaurant_id=restaurant_id,
+                    period_start=start_date,
+                    period_end=end_date,
+                    total_orders=total_orders,
+                    total_amount=total_amount,
+                    average_order_value=avg_order_value,
+                    order_frequency=order_frequency,
+                    created_at=current_time,
+                    updated_at=current_time,
+                )
+                .returning(PerformanceMetric)
+                .execution_options(populate_existing=True)
+            )
+            return result.scalars().one()
 
         except Exception as e:
             logger.error(f"Error calculating performance metrics: {str(e)}")
             handle_exception(message="Failed to calculate performance metrics")
 
     @managed_transaction
+    async def calculate_all_metrics(
+        self, start_date: date, end_date: date, batch_size: int = 5000, progress: Optional[Callable[[int, int], None]] = None, db: Optional[DbConnector] = None
+    ) -> int:
+        """Insert the period's metrics of every restaurant, returns the number of restaurants"""
+        try:
+            rollups = await _month_rollups(db, start_date, end_date) if _is_calendar_month(start_date, end_date) else None
+            rows = (await db.execute(_all_restaurants_aggregate(start_date, end_date, rollups))).mappings().all()
+            current_time = utc_now()
+            for offset in range(0, len(rows), batch_size):
+                metrics = [
+                    {
+                        **row,
+                        "metric_id": str(uuid.uuid4()),
+                        "period_start": start_date,
+                        "period_end": end_date,
+                        "created_at": current_time,
+                        "updated_at": current_time,
+                    }
+                    for row in rows[offset : offset + batch_size]
+                ]
+                await db.execute(_upsert_metrics(), metrics)
+                if progress:
+                    progress(offset + len(metrics), len(rows))
+            return len(rows)
+        except Exception as e:
+            logger.error(f"Error calculating performance metrics of all restaurants: {str(e)}")
+            handle_exception(message="Failed to calculate performance metrics")
+
+    @managed_transaction(read_only=True)
     async def get_restaurant_metrics(self, restaurant_id: str, db: Optional[DbConnector] = None) -> List[PerformanceMetric]:
         try:
-            return db.Session.query(PerformanceMetric).filter(PerformanceMetric.restaurant_id == restaurant_id).order_by(PerformanceMetric.period_start.desc()).all()
+            result = await db.execute(
+                select(PerformanceMetric).where(PerformanceMetric.restaurant_id == restaurant_id).order_by(PerformanceMetric.period_start.desc())
+            )
+            return result.scalars().all()
         except Exception as e:
             logger.error(f"Error fetching restaurant metrics: {str(e)}")
             handle_exception(message="Failed to fetch performance metrics")
 
-    @managed_transaction
+    @managed_transaction(read_only=True)
     async def get_metrics_by_period(self, restaurant_id: str, start_date: date, end_date: date, db: Optional[DbConnector] = None) -> List[PerformanceMetric]:
         try:
-            metrics = (
-                db.Session.query(PerformanceMetric)
-                .filter(
-                    PerformanceMetric.restaurant_id == restaurant_id, func.date(PerformanceMetric.created_at) >= start_date, func.date(PerformanceMetric.created_at) <= end_date
+            result = await db.execute(
+                select(PerformanceMetric)
+                .where(
+                    PerformanceMetric.restaurant_id == restaurant_id,
+                    PerformanceMetric.created_at >= _day_start(start_date),
+                    PerformanceMetric.created_at < _day_start(end_date + timedelta(days=1)),
                 )
                 .order_by(PerformanceMetric.period_start.asc())
-                .all()
             )
-            return metrics
+            return result.scalars().all()
         except Exception as e:
             logger.error(f"Error fetching metrics by period: {str(e)}")
             handle_exception(message="Failed to fetch metrics")
 
-    @managed_transaction
+    @managed_transaction(read_only=True)
     async def get_all_restaurant_metrics(self, start_date: date, end_date: date, db: Optional[DbConnector] = None) -> List[PerformanceMetric]:
         try:
-            return db.Session.query(PerformanceMetric).filter(PerformanceMetric.period_start >= start_date, PerformanceMetric.period_end <= end_date).all()
+            result = await db.execute(select(PerformanceMetric).where(PerformanceMetric.period_start >= start_date, PerformanceMetric.period_end <= end_date))
+            return result.scalars().all()
         except Exception as e:
             logger.error(f"Error fetching all restaurant metrics: {str(e)}")
             handle_exception(message="Failed to fetch metrics")
+
+    @managed_transaction(read_only=True)
+    async def get_top_restaurants(self, metric: str, limit: int, start_date: date, end_date: date, db: Optional[DbConnector] = None) -> List[dict]:
+        """Restaurants with the highest value of metric in their latest metric overlapping the period, best first"""
+        try:
+            latest = (
+                select(PerformanceMetric.restaurant_id, RANKING_COLUMNS[metric].label("metric_value"))
+                .where(PerformanceMetric.period_start <= end_date, PerformanceMetric.period_end >= start_date)
+                .ext(distinct_on(PerformanceMetric.restaurant_id))
+                .order_by(PerformanceMetric.restaurant_id, PerformanceMetric.period_start.desc(), PerformanceMetric.updated_at.desc())
+                .subquery()
+            )
+            result = await db.execute(select(latest).order_by(latest.c.metric_value.desc(), latest.c.restaurant_id).limit(limit))
+            return [dict(row) for row in result.mappings()]
+        except Exception as e:
+            logger.error(f"Error fetching restaurant rankings: {str(e)}")
+            handle_exception(message="Failed to fetch rankings")
+
+    @managed_transaction(read_only=True)
+    async def get_metric_series(self, start_date: date, end_date: date, db: Optional[DbConnector] = None) -> List[tuple]:
+        """(restaurant_id, month number, total_orders, total_amount, average_order_value, order_frequency) of every monthly metric starting
+        within the period, in no particular order. Month number is year * 12 + month - 1, so consecutive months differ by one"""
+        try:
+            # Selecting table columns rather than mapped attributes skips ORM row processing, a large share of the cost at a million rows
+            metric = PerformanceMetric.__table__.c
+            month_number = (func.extract("year", metric.period_start) * 12 + func.extract("month", metric.period_start) - 1).cast(Integer)
+            result = await db.execute(
+                select(metric.restaurant_id, month_number, *(metric[name] for name in RANKING_COLUMNS)).where(
+                    metric.period_start >= start_date,
+                    metric.period_start <= end_date,
+                    # Calendar months only, the unique period index then leaves one row per restaurant and month
+                    metric.period_end == (metric.period_start + literal_column("interval '1 month - 1 day'")).cast(Date),
+                )
+            )
+            return result.all()
+        except Exception as e:
+            logger.error(f"Error fetching metric series: {str(e)}")
+            handle_exception(message="Failed to fetch metrics")
@@ -0,0 +1,78 @@
+import logging
+from typing import Dict, List, Optional
+from datetime import date
+from sqlalchemy import func, select
+
+from models.call_plan import CallPlan
+from models.interaction import Interaction
+from models.order_rollup import OrderRollup
+from models.restaurant import Restaurant
+from core.custom_exception import handle_exception
+from core.database import managed_transaction, DbConnector
+
+logger = logging.getLogger(__name__)
+
+
+def _portfolio(user_id: str):
+    """A key account manager's restaurants are the ones they have call plans for"""
+    return select(CallPlan.restaurant_id).where(CallPlan.user_id == user_id)
+
+
+class PortfolioRepository:
+    """One grouped query per dashboard column, each covering the whole portfolio and safe to run concurrently"""
+
+    @managed_transaction(read_only=True)
+    async def get_restaurants(self, user_id: str, db: Optional[DbConnector] = None) -> List[Dict]:
+        try:
+            result = await db.execute(
+                select(Restaurant.restaurant_id, Restaurant.name, Restaurant.status).where(Restaurant.restaurant_id.in_(_portfolio(user_id))).order_by(Restaurant.name)
+            )
+            return result.mappings().all()
+        except Exception as e:
+            logger.error(f"Error fetching portfolio restaurants: {str(e)}")
+            handle_exception(message="Failed to fetch portfolio")
+
+    @managed_transaction(read_only=True)
+    async def get_call_plan_summary(self, user_id: str, due_date: date, db: Optional[DbConnector] = None) -> Dict[str, Dict]:
+        """Number of calls due by due_date and the earliest next call of every restaurant in the portfolio"""
+        try:
+            result = await db.execute(
+                select(
+                    CallPlan.restaurant_id,
+                    func.count().filter(CallPlan.next_call_date <= due_date).label("due_calls"),
+                    func.min(CallPlan.next_call_date).label("next_call_date"),
+                )
+                .where(CallPlan.user_id == user_id)
+                .group_by(CallPlan.restaurant_id)
+            )
+            return {row["restaurant_id"]: row for row in result.mappings()}
+        except Exception as e:
+            logger.error(f"Error fetching portfolio call plans: {str(e)}")
+            handle_exception(message="Failed to fetch portfolio")
+
+    @managed_transaction(read_only=True)
+    async def get_last_interactions(self, user_id: str, db: Optional[DbConnector] = None) -> Dict[str, Dict]:
+        try:
+            portfolio = _portfolio(user_id).distinct().subquery()
+            # A correlated max() is answered from the end of the (restaurant_id, interaction_date) index instead of
+            # aggregating every interaction of the restaurant
+            last_interaction = select(func.max(Interaction.interaction_date)).where(Interaction.restaurant_id == portfolio.c.restaurant_id).scalar_subquery()
+            result = await db.execute(select(portfolio.c.restaurant_id, last_interaction.label("last_interaction_at")))
+            return {row["restaurant_id"]: row["last_interaction_at"] for row in result.mappings()}
+        except Exception as e:
+            logger.error(f"Error fetching portfolio interactions: {str(e)}")
+            handle_exception(message="Failed to fetch portfolio")
+
+    @managed_transaction(read_only=True)
+    async def get_month_orders(self, user_id: str, month: date, db: Optional[DbConnector] = None) -> Dict[str, Dict]:
+        """Order count and revenue of the month from the order rollups, one row per restaurant"""
+        try:
+            result = await db.execute(
+                select(OrderRollup.restaurant_id, OrderRollup.order_count, OrderRollup.amount_sum).where(
+                    OrderRollup.month == month, OrderRollup.restaurant_id.in_(_portfolio(user_id))
+                )
+            )
+            return {row["restaurant_id"]: row for row in result.mappings()}
+        except Exception as e:
+            logger.error(f"Error fetching portfolio orders: {str(e)}")
+            handle_exception(message="Failed to fetch portfolio")
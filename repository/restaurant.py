@@ -1,5 +1,6 @@
 import logging
 from typing import Optional, List
+from sqlalchemy import select, update
 
 from models.restaurant import Restaurant, RestaurantStatus
 from core.custom_exception import handle_exception
@@ -15,16 +16,17 @@ class RestaurantRepository(BaseRepository):
     async def create(self, name: str, address: str, phone: str, email: str, db: Optional[DbConnector] = None) -> Restaurant:
         try:
             restaurant = Restaurant(name=name, address=address, phone=phone, email=email)
-            db.Session.add(restaurant)
+            db.add(restaurant)
+            await db.flush()
             return restaurant
         except Exception as e:
             logger.error(f"Error creating restaurant: {str(e)}")
             handle_exception(message="Failed to create restaurant")
 
-    @managed_transaction
+    @managed_transaction(read_only=True)
     async def get_all(self, db: Optional[DbConnector] = None) -> List[Restaurant]:
         try:
-            query = db.Session.query(Restaurant).all()
+            query = (await db.execute(select(Restaurant))).scalars().all()
             return query
         except Exception as e:
             logger.error(f"Error fetching all restaurants: {str(e)}")
@@ -33,16 +35,16 @@ class RestaurantRepository(BaseRepository):
     @managed_transaction
     async def get_by_id(self, restaurant_id: str, db: Optional[DbConnector] = None) -> Optional[Restaurant]:
         try:
-            query = db.Session.query(Restaurant).filter(Restaurant.restaurant_id == restaurant_id).first()
+            query = (await db.execute(select(Restaurant).where(Restaurant.restaurant_id == restaurant_id))).scalars().first()
             return query
         except Exception as e:
             logger.error(f"Error fetching restaurant by id: {str(e)}")
             handle_exception(message="Failed to fetch restaurant")
 
-    @managed_transaction
+    @managed_transaction(read_only=True)
     async def get_by_owner(self, owner_id: str, db: Optional[DbConnector] = None) -> List[Restaurant]:
         try:
-            query = db.Session.query(Restaurant).filter(Restaurant.owner_id == owner_id).all()
+            query = (await db.execute(select(Restaurant).where(Restaurant.owner_id == owner_id))).scalars().all()
             return query
         except Exception as e:
             logger.error(f"Error fetching restaurants by owner: {str(e)}")
@@ -64,7 +66,7 @@ class RestaurantRepository(BaseRepository):
     async def update(self, restaurant_id: str, restaurant_update: dict, db: Optional[DbConnector] = None) -> Optional[Restaurant]:
         try:
             if restaurant_update:
-                db.Session.query(Restaurant).filter(Restaurant.restaurant_id == restaurant_id).update(restaurant_update)
+                await db.execute(update(Restaurant).where(Restaurant.restaurant_id == restaurant_id).values(**restaurant_update))
                 return await self.get_by_id(restaurant_id, db=db)
             return None
         except Exception as e:
@@ -76,7 +78,7 @@ class RestaurantRepository(BaseRepository):
         try:
             restaurant = await self.get_by_id(restaurant_id, db=db)
             if restaurant:
-                db.Session.delete(restaurant)
+                await db.delete(restaurant)
                 return True
             return False
         except Exception as e:
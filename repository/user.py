@@ -1,5 +1,7 @@
 import logging
 from typing import Optional, List
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
 
 from models.user import User
 from core.custom_exception import handle_exception
@@ -14,16 +16,21 @@ class UserRepository(BaseRepository):
     async def create(self, name: str, email: str, phone: str, role: str, restaurant_id: str, password: str, db: Optional[DbConnector] = None) -> User:
         try:
             contact = User(name=name, email=email, phone=phone, role=role, restaurant_id=restaurant_id, hashed_password=password)
-            db.Session.add(contact)
+            db.add(contact)
+            await db.flush()
             return contact
+        except IntegrityError as e:
+            if "ix_user_email" not in str(e.orig):
+                raise
+            handle_exception(error_code=409, message="A contact with this email already exists", should_log_exception=False)
         except Exception as e:
             logger.error(f"Error creating contact: {str(e)}")
             handle_exception(message="Failed to create contact")
 
-    @managed_transaction
+    @managed_transaction(read_only=True)
     async def get_all(self, db: Optional[DbConnector] = None) -> List[User]:
         try:
-            query = db.Session.query(User).all()
+            query = (await db.execute(select(User))).scalars().all()
             return query
         except Exception as e:
             logger.error(f"Error fetching all contacts: {str(e)}")
@@ -32,7 +39,7 @@ class UserRepository(BaseRepository):
     @managed_transaction
     async def get_by_id(self, user_id: str, db: Optional[DbConnector] = None) -> Optional[User]:
         try:
-            query = db.Session.query(User).filter(User.user_id == user_id).first()
+            query = (await db.execute(select(User).where(User.user_id == user_id))).scalars().first()
             return query
         except Exception as e:
             logger.error(f"Error fetching contact by id: {str(e)}")
@@ -41,16 +48,16 @@ class UserRepository(BaseRepository):
     @managed_transaction
     async def get_by_email(self, email: str, db: Optional[DbConnector] = None) -> Optional[User]:
         try:
-            query = db.Session.query(User).filter(User.email == email).first()
+            query = (await db.execute(select(User).where(User.email == email))).scalars().first()
             return query
         except Exception as e:
             logger.error(f"Error fetching contact by email: {str(e)}")
             handle_exception(message="Failed to fetch contact")
 
-    @managed_transaction
+    @managed_transaction(read_only=True)
     async def get_by_restaurant(self, restaurant_id: str, db: Optional[DbConnector] = None) -> List[User]:
         try:
-            query = db.Session.query(User).filter(User.restaurant_id == restaurant_id).all()
+            query = (await db.execute(select(User).where(User.restaurant_id == restaurant_id))).scalars().all()
             return query
         except Exception as e:
             logger.error(f"Error fetching contacts by restaurant: {str(e)}")
@@ -60,7 +67,7 @@ class UserRepository(BaseRepository):
     async def update(self, user_id: str, contact_data: dict, db: Optional[DbConnector] = None) -> Optional[User]:
         try:
             if contact_data:
-                db.Session.query(User).filter(User.user_id == user_id).update(contact_data)
+                await db.execute(update(User).where(User.user_id == user_id).values(**contact_data))
                 return await self.get_by_id(user_id, db=db)
             return None
         except Exception as e:
@@ -72,7 +79,7 @@ class UserRepository(BaseRepository):
         try:
             contact = await self.get_by_id(user_id, db=db)
             if contact:
-                db.Session.delete(contact)
+                await db.delete(contact)
                 return True
             return False
         except Exception as e:
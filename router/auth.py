@@ -28,7 +28,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), service: AuthS
     "/register",
     response_model=UserResponse,
     status_code=status.HTTP_201_CREATED,
-    responses={201: {"description": "Contact created successfully"}, 400: {"description": "Invalid input"}, 422: {"description": "Validation error"}},
+    responses={201: {"description": "Contact created successfully"}, 400: {"description": "Invalid input"}, 409: {"description": "Email already registered"}, 422: {"description": "Validation error"}},
 )
 async def create_contact(user: UserCreate, auth_service: AuthService = Depends(get_auth_service)):
     """Create a new contact"""
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from datetime import date
 from typing import Optional
 
@@ -6,8 +6,10 @@ from fastapi.security import OAuth2PasswordBearer
 
 from services.call_plan import CallPlanService
 from repository.call_plan import CallPlanRepository
-from schema.call_plan import CallPlanCreate, CallPlanResponse, CallPlanListResponse
+from repository.user import UserRepository
+from schema.call_plan import CallPlanCreate, CallPlanResponse, CallPlanListResponse, RecordCallsRequest, RecordCallsResponse, ScheduledCallListResponse
 
+# No shared unit of work: the due calls page and its counts are read concurrently, each in its own session
 router = APIRouter(prefix="/call-plans", tags=["call-plans"])
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/v1/auth/login")
@@ -15,7 +17,7 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/v1/auth/login")
 
 def get_call_plan_service() -> CallPlanService:
     repository = CallPlanRepository()
-    return CallPlanService(repository)
+    return CallPlanService(repository, UserRepository())
 
 
 @router.post("/", response_model=CallPlanResponse, status_code=status.HTTP_201_CREATED)
@@ -26,13 +28,36 @@ async def create_call_plan(call_plan: CallPlanCreate, service: CallPlanService =
 
 @router.get("/due-calls", response_model=CallPlanListResponse)
 async def get_due_calls(
+    request: Request,
     due_date: Optional[date] = Query(default=None, description="Date to check for due calls (YYYY-MM-DD). Defaults to today if not provided.", examples="2024-12-23"),
+    limit: int = Query(default=50, ge=1, le=500, description="Number of calls per page"),
+    cursor: Optional[str] = Query(default=None, description="next_cursor of the previous page"),
     service: CallPlanService = Depends(get_call_plan_service),
     token: str = Depends(oauth2_scheme),
 ):
-    """Get all calls due by the specified date"""
-    calls = await service.get_due_calls(due_date)
-    return CallPlanListResponse(total=len(calls), call_plans=calls)
+    """Get the logged-in user's calls due by the specified date, the earliest first, one page at a time"""
+    return await service.get_due_calls(request.state.user.get("sub"), due_date, limit, cursor)
+
+
+@router.get("/upcoming", response_model=ScheduledCallListResponse)
+async def get_upcoming_calls(
+    request: Request,
+    due_date: Optional[date] = Query(default=None, description="Only return calls due by this date (YYYY-MM-DD), e.g. today for the calls due now"),
+    limit: int = Query(default=10, ge=1, le=500, description="Number of calls to return"),
+    service: CallPlanService = Depends(get_call_plan_service),
+    token: str = Depends(oauth2_scheme),
+):
+    """Get the logged-in user's next calls from the in-process schedule, without querying the call plans"""
+    calls = await service.get_scheduled_calls(request.state.user.get("sub"), due_date, limit)
+    return ScheduledCallListResponse(total=len(calls), calls=calls)
+
+
+@router.post("/record-calls", response_model=RecordCallsResponse)
+async def record_calls(batch: RecordCallsRequest, service: CallPlanService = Depends(get_call_plan_service), token: str = Depends(oauth2_scheme)):
+    """Record a batch of calls at once, reporting for each whether its call plan was found"""
+    results = await service.record_calls_made([(call.call_plan_id, call.call_date) for call in batch.calls])
+    recorded = sum(1 for result in results if result["status"] == "recorded")
+    return RecordCallsResponse(recorded=recorded, not_found=len(results) - recorded, results=results)
 
 
 @router.post("/{call_plan_id}/record-call")
@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends
+from fastapi.security import OAuth2PasswordBearer
+
+from core.config import AUTH_CONTROLLER
+from core.instrumentation import get_recent_requests, get_slow_queries
+from security.authorization import RoleFilter
+from services.call_plan import get_call_plan_scheduler
+
+
+router = APIRouter(prefix="/debug", tags=["debug"])
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/v1/auth/login")
+
+
+@router.get("/sql")
+async def get_sql_stats(_: None = Depends(AUTH_CONTROLLER.requires(RoleFilter(["Admin"]))), token: str = Depends(oauth2_scheme)):
+    """Get SQL statement statistics of the most recent sampled requests"""
+    requests = get_recent_requests()
+    return {"total": len(requests), "requests": requests}
+
+
+@router.get("/slow-queries")
+async def get_slow_query_log(_: None = Depends(AUTH_CONTROLLER.requires(RoleFilter(["Admin"]))), token: str = Depends(oauth2_scheme)):
+    """Get the most recent slow queries with their captured plans"""
+    queries = get_slow_queries()
+    return {"total": len(queries), "queries": queries}
+
+
+@router.get("/call-plan-scheduler")
+async def get_call_plan_scheduler_stats(_: None = Depends(AUTH_CONTROLLER.requires(RoleFilter(["Admin"]))), token: str = Depends(oauth2_scheme)):
+    """Get the size of the in-process call plan schedule and how far it drifted from the database"""
+    scheduler = get_call_plan_scheduler()
+    return scheduler.stats() if scheduler is not None else {"enabled": False}
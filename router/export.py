@@ -0,0 +1,37 @@
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from fastapi.security import OAuth2PasswordBearer
+
+from core.config import AUTH_CONTROLLER
+from core.database import get_active_engine
+from security.authorization import RoleFilter
+from services.export import EXPORTED_TABLES, arrow_stream
+
+router = APIRouter(prefix="/exports", tags=["exports"])
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/v1/auth/login")
+
+
+@router.get("/{table_name}", response_class=StreamingResponse)
+async def export_table(
+    table_name: str,
+    # The month after the exported one bounds the query, so it has to be a valid date too
+    year: Optional[int] = Query(default=None, ge=1, le=9998, description="Only export this month, together with month"),
+    month: Optional[int] = Query(default=None, ge=1, le=12, description="Month to export (1-12)"),
+    _: None = Depends(AUTH_CONTROLLER.requires(RoleFilter(["Admin"]))),
+    token: str = Depends(oauth2_scheme),
+):
+    """Stream order, interaction or performance_metric as an Arrow IPC stream of record batches"""
+    if table_name not in EXPORTED_TABLES:
+        raise HTTPException(status_code=404, detail=f"Table must be one of {', '.join(EXPORTED_TABLES)}")
+    if (year is None) != (month is None):
+        raise HTTPException(status_code=400, detail="year and month go together")
+    # A sync generator, Starlette pulls each batch from the server-side cursor in its thread pool
+    return StreamingResponse(
+        arrow_stream(get_active_engine(), table_name, date(year, month, 1) if year else None),
+        media_type="application/vnd.apache.arrow.stream",
+        headers={"Content-Disposition": f'attachment; filename="{table_name}.arrows"'},
+    )
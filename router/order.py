@@ -1,16 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
 from typing import Optional
 
 from fastapi.security import OAuth2PasswordBearer
 
+from core.database import get_active_engine, get_unit_of_work
 from services.order import OrderService
 from services.interaction import InteractionService
 from repository.order import OrderRepository
 from repository.interaction import InteractionRepository
-from schema.order import OrderCreate, OrderResponse, OrderListResponse
+from repository.order_rollup import OrderRollupRepository
+from schema.order import OrderCreate, OrderImportResponse, OrderResponse, OrderListResponse
+from services.order_import import IMPORT_FORMATS, import_upload
 from models.order import OrderStatus
 
-router = APIRouter(prefix="/orders", tags=["orders"])
+# Every repository call made while serving an order request shares one session and one commit
+router = APIRouter(prefix="/orders", tags=["orders"], dependencies=[Depends(get_unit_of_work, scope="function")])
+# Bulk imports commit each chunk of orders on their own connection, a request session would sit idle for the whole upload
+bulk_router = APIRouter(prefix="/orders", tags=["orders"])
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/v1/auth/login")
 
@@ -18,7 +24,7 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/v1/auth/login")
 def get_order_service() -> OrderService:
     repository = OrderRepository()
     interaction_service = InteractionService(InteractionRepository())
-    return OrderService(repository, interaction_service)
+    return OrderService(repository, interaction_service, OrderRollupRepository())
 
 
 @router.post(
@@ -32,6 +38,27 @@ async def place_order(order: OrderCreate, service: OrderService = Depends(get_or
     return await service.place_order(order.model_dump())
 
 
+@bulk_router.post(
+    "/bulk",
+    response_model=OrderImportResponse,
+    responses={
+        200: {"description": "Orders imported, rejected ones are reported"},
+        400: {"description": "Unknown format, or a body that is not UTF-8"},
+        500: {"description": "Internal server error"},
+    },
+)
+async def import_orders(
+    request: Request,
+    format: Optional[str] = Query(default=None, description="ndjson or csv. Defaults to csv for a text/csv body and to ndjson otherwise."),
+    token: str = Depends(oauth2_scheme),
+):
+    """Import many orders at once from NDJSON (one order per line) or CSV (a header row, then one order per row)"""
+    import_format = format or ("csv" if request.headers.get("content-type", "").startswith("text/csv") else "ndjson")
+    if import_format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of {', '.join(IMPORT_FORMATS)}")
+    return await import_upload(request.stream(), import_format, get_active_engine())
+
+
 @router.get(
     "/restaurants/{restaurant_id}",
     response_model=OrderListResponse,
@@ -43,11 +70,36 @@ async def list_restaurant_orders(restaurant_id: str, service: OrderService = Dep
     return OrderListResponse(total=len(orders), orders=orders)
 
 
+def _if_match_version(if_match: Optional[str]) -> Optional[int]:
+    """Version named by an If-Match header, None when any version matches"""
+    if if_match is None or if_match.strip() == "*":
+        return None
+    tag = if_match.strip().removeprefix("W/").strip('"')
+    if not tag.isdigit():
+        raise HTTPException(status_code=400, detail="If-Match must be the ETag of the order")
+    return int(tag)
+
+
 @router.patch(
     "/{order_id}/status",
     response_model=OrderResponse,
-    responses={200: {"description": "Order status updated successfully"}, 404: {"description": "Order not found"}, 500: {"description": "Internal server error"}},
+    responses={
+        200: {"description": "Order status updated successfully"},
+        400: {"description": "Invalid If-Match header"},
+        404: {"description": "Order not found"},
+        409: {"description": "The order cannot move to this status, or changed since the If-Match version"},
+        500: {"description": "Internal server error"},
+    },
 )
-async def update_order_status(order_id: str, status: OrderStatus, service: OrderService = Depends(get_order_service), token: str = Depends(oauth2_scheme)):
+async def update_order_status(
+    order_id: str,
+    status: OrderStatus,
+    response: Response,
+    if_match: Optional[str] = Header(None, description="ETag of the order (its version), the change is refused if the order has changed since"),
+    service: OrderService = Depends(get_order_service),
+    token: str = Depends(oauth2_scheme),
+):
     """Update the status of an order"""
-    return await service.update_order_status(order_id, status)
+    order = await service.update_order_status(order_id, status, _if_match_version(if_match))
+    response.headers["ETag"] = f'"{order.version}"'
+    return order
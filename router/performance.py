@@ -1,9 +1,12 @@
 from fastapi import APIRouter, Depends, Query
 from datetime import date
-from typing import Optional
+from typing import Literal, Optional
 
 from fastapi.security import OAuth2PasswordBearer
 
+from core.config import AUTH_CONTROLLER
+from security.authorization import RoleFilter
+
 from services.performance import PerformanceService
 from repository.performance import PerformanceRepository
 from schema.performance import PerformanceMetricResponse, PerformanceMetricListResponse
@@ -12,6 +15,10 @@ router = APIRouter(prefix="/performance", tags=["performance"])
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/v1/auth/login")
 
+# Validated by FastAPI, other values are rejected with a 422
+Metric = Literal["total_orders", "total_amount", "average_order_value", "order_frequency"]
+TrendStatistic = Literal["slope", "percent_change", "volatility"]
+
 
 def get_performance_service() -> PerformanceService:
     repository = PerformanceRepository()
@@ -30,6 +37,18 @@ async def generate_metrics(
     return await service.generate_monthly_metrics(restaurant_id, year, month)
 
 
+@router.post("/metrics")
+async def generate_all_metrics(
+    year: int = Query(..., description="Year to generate metrics for"),
+    month: int = Query(..., ge=1, le=12, description="Month to generate metrics for (1-12)"),
+    service: PerformanceService = Depends(get_performance_service),
+    _: None = Depends(AUTH_CONTROLLER.requires(RoleFilter(["Admin"]))),
+    token: str = Depends(oauth2_scheme),
+):
+    """Generate performance metrics of every restaurant for a specific month"""
+    return await service.generate_all_monthly_metrics(year, month)
+
+
 @router.get("/restaurants/{restaurant_id}/metrics")
 async def get_restaurant_metrics(restaurant_id: str, service: PerformanceService = Depends(get_performance_service), token: str = Depends(oauth2_scheme)):
     """Get all performance metrics for a restaurant"""
@@ -48,9 +67,22 @@ async def get_restaurant_trends(
     return await service.analyze_restaurant_trends(restaurant_id, months)
 
 
+@router.get("/trends")
+async def get_portfolio_trends(
+    months: int = Query(default=12, ge=2, le=36, description="Number of months to analyze"),
+    metric: Metric = Query(default="total_amount", description="Metric to sort by"),
+    sort_by: TrendStatistic = Query(default="slope", description="Trend statistic to sort by"),
+    limit: int = Query(default=100, ge=1, le=10000, description="Number of restaurants to return"),
+    service: PerformanceService = Depends(get_performance_service),
+    token: str = Depends(oauth2_scheme),
+):
+    """Get performance trends of all restaurants, sorted by a trend statistic of a metric"""
+    return await service.analyze_portfolio_trends(months, metric, sort_by, limit)
+
+
 @router.get("/restaurants/rankings")
 async def get_restaurant_rankings(
-    metric: str = Query(default="total_orders", enum=["total_orders", "total_amount", "average_order_value", "order_frequency"], description="Metric to rank by"),
+    metric: Metric = Query(default="total_orders", description="Metric to rank by"),
     limit: int = Query(default=10, ge=1, le=100, description="Number of restaurants to return"),
     service: PerformanceService = Depends(get_performance_service),
     token: str = Depends(oauth2_scheme),
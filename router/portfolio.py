@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Depends, Request
+from fastapi.security import OAuth2PasswordBearer
+
+from services.portfolio import PortfolioService
+from repository.portfolio import PortfolioRepository
+from repository.user import UserRepository
+from schema.portfolio import PortfolioResponse
+
+# No shared unit of work: the dashboard queries run concurrently, each in its own session
+router = APIRouter(prefix="/portfolio", tags=["portfolio"])
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/v1/auth/login")
+
+
+def get_portfolio_service() -> PortfolioService:
+    return PortfolioService(PortfolioRepository(), UserRepository())
+
+
+@router.get("", response_model=PortfolioResponse)
+async def get_portfolio(request: Request, service: PortfolioService = Depends(get_portfolio_service), token: str = Depends(oauth2_scheme)):
+    """Get status, last interaction, due calls and this month's orders of every restaurant of the logged-in key account manager"""
+    return await service.get_portfolio(request.state.user.get("sub"))
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import date, datetime
 import uuid
 
@@ -33,7 +33,53 @@ class CallPlanResponse(CallPlanBase):
 
 
 class CallPlanListResponse(BaseModel):
-    """Schema for list of call plans response"""
+    """Schema for a page of due call plans response"""
 
-    total: int = Field(..., description="Total number of call plans")
-    call_plans: List[CallPlanResponse] = Field(..., description="List of call plans")
+    total: int = Field(..., description="Total number of call plans due by the date")
+    overdue: int = Field(..., description="Number of those call plans due before today")
+    call_plans: List[CallPlanResponse] = Field(..., description="Call plans of the page, the earliest next call first")
+    next_cursor: Optional[str] = Field(None, description="Cursor of the next page, null on the last page")
+
+
+class ScheduledCallResponse(BaseModel):
+    """Schema for a call of the in-process schedule"""
+
+    call_plan_id: str = Field(..., description="Unique identifier for the call plan")
+    restaurant_id: str = Field(..., description="ID of the restaurant to be called")
+    next_call_date: date = Field(..., description="Date of the next scheduled call")
+
+
+class ScheduledCallListResponse(BaseModel):
+    """Schema for list of scheduled calls response"""
+
+    total: int = Field(..., description="Number of calls returned")
+    calls: List[ScheduledCallResponse] = Field(..., description="Calls, the earliest next call first")
+
+
+class RecordedCall(BaseModel):
+    """Schema for one call of a batch"""
+
+    call_plan_id: str = Field(..., description="ID of the call plan the call was made for")
+    call_date: Optional[date] = Field(None, description="Date the call was made. Defaults to today if not provided.")
+
+
+class RecordCallsRequest(BaseModel):
+    """Schema for recording a batch of calls"""
+
+    calls: List[RecordedCall] = Field(..., description="Calls made, at most 1000", min_length=1, max_length=1000)
+
+
+class RecordCallResult(BaseModel):
+    """Schema for the outcome of one call of a batch"""
+
+    call_plan_id: str = Field(..., description="ID of the call plan")
+    status: Literal["recorded", "not_found"] = Field(..., description="Whether the call was recorded or no such call plan exists")
+    call_plan: Optional[CallPlanResponse] = Field(None, description="The updated call plan, null if not found")
+
+
+class RecordCallsResponse(BaseModel):
+    """Schema for record calls response"""
+
+    recorded: int = Field(..., description="Number of call plans updated")
+    not_found: int = Field(..., description="Number of calls whose call plan does not exist")
+    results: List[RecordCallResult] = Field(..., description="Outcome of every call, in request order")
@@ -1,4 +1,5 @@
 from typing import Optional
+from datetime import datetime
 from pydantic import BaseModel, Field
 import uuid
 
@@ -18,7 +19,7 @@ class InteractionCreate(InteractionBase):
 
 class InteractionResponse(InteractionBase):
     interaction_id: uuid.UUID = Field(..., description="Unique identifier for the interaction", default_factory=uuid.uuid4)
-    interaction_date: str = Field(..., description="Date and time of the interaction")
+    interaction_date: datetime = Field(..., description="Date and time of the interaction")
 
     class Config:
         from_attributes = True
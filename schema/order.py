@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from models.order import OrderStatus
 import uuid
@@ -19,6 +19,7 @@ class OrderResponse(BaseModel):
     interaction_id: uuid.UUID = Field(..., description="ID of the interaction associated with this order")
     status: OrderStatus = Field(..., description="Current status of the order")
     amount: int = Field(..., description="Order amount in cents")
+    version: int = Field(..., description="Incremented on every change, send it as If-Match to change the status")
     created_at: datetime = Field(..., description="Timestamp when the order was created")
     updated_at: datetime = Field(..., description="Timestamp when the order was last updated")
     notes: Optional[str] = Field(None, description="Optional notes about the order")
@@ -30,3 +31,22 @@ class OrderResponse(BaseModel):
 class OrderListResponse(BaseModel):
     total: int
     orders: list[OrderResponse]
+
+
+class OrderImport(OrderCreate):
+    """One order of a bulk import"""
+
+    created_at: Optional[datetime] = Field(None, description="When the order was placed, UTC if no offset is given. Defaults to the time of the import.")
+    status: OrderStatus = Field(OrderStatus.NEW, description="Status of the order")
+
+
+class OrderImportError(BaseModel):
+    line: int = Field(..., description="Line of the rejected order in the uploaded file")
+    message: str = Field(..., description="Why the order was rejected")
+
+
+class OrderImportResponse(BaseModel):
+    received: int = Field(..., description="Number of orders in the file")
+    inserted: int = Field(..., description="Number of orders stored")
+    failed: int = Field(..., description="Number of orders rejected")
+    errors: List[OrderImportError] = Field(..., description="Rejected orders, the first 1000")
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from typing import List
-from datetime import date
+from datetime import date, datetime
 import uuid
 
 
@@ -20,8 +20,8 @@ class PerformanceMetricResponse(PerformanceMetricBase):
     """Schema for performance metric response"""
 
     metric_id: uuid.UUID = Field(..., description="Unique identifier for the performance metric")
-    created_at: str = Field(..., description="Timestamp when the metric was created")
-    updated_at: str = Field(..., description="Timestamp when the metric was last updated")
+    created_at: datetime = Field(..., description="Timestamp when the metric was created")
+    updated_at: datetime = Field(..., description="Timestamp when the metric was last updated")
 
     class Config:
         from_attributes = True
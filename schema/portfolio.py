@@ -0,0 +1,26 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from datetime import date, datetime
+
+from models.restaurant import RestaurantStatus
+
+
+class PortfolioRestaurant(BaseModel):
+    """Schema for one restaurant on a key account manager's dashboard"""
+
+    restaurant_id: str = Field(..., description="ID of the restaurant")
+    name: str = Field(..., description="Name of the restaurant")
+    status: Optional[RestaurantStatus] = Field(None, description="Lead status of the restaurant")
+    last_interaction_at: Optional[datetime] = Field(None, description="Timestamp of the latest interaction with the restaurant")
+    due_calls: int = Field(..., description="Number of calls due by today")
+    next_call_date: Optional[date] = Field(None, description="Earliest scheduled call")
+    month_order_count: int = Field(..., description="Number of orders this month")
+    month_revenue: int = Field(..., description="Total amount of this month's orders")
+
+
+class PortfolioResponse(BaseModel):
+    """Schema for a key account manager's dashboard"""
+
+    total: int = Field(..., description="Total number of restaurants in the portfolio")
+    due_calls: int = Field(..., description="Number of calls due by today across the portfolio")
+    restaurants: List[PortfolioRestaurant] = Field(..., description="Restaurants of the portfolio, by name")
@@ -1,31 +1,210 @@
+import asyncio
+import base64
+import binascii
+import heapq
 import logging
-from typing import Optional, List
-from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from datetime import date, datetime, timedelta, timezone
+
+from fastapi import HTTPException
 
 from models.call_plan import CallPlan
-from repository.call_plan import CallPlanRepository
+from core.database import get_active_engine
+from repository.call_plan import CallPlanRepository, iter_schedule
+from repository.user import UserRepository
 from core.custom_exception import handle_exception
 
 logger = logging.getLogger(__name__)
 
 
+def encode_cursor(call_plan: CallPlan) -> str:
+    """Opaque page cursor holding the (next_call_date, call_plan_id) key of the last call on the page"""
+    return base64.urlsafe_b64encode(f"{call_plan.next_call_date.isoformat()}|{call_plan.call_plan_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[date, str]:
+    try:
+        next_call_date, call_plan_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return date.fromisoformat(next_call_date), call_plan_id
+    except (binascii.Error, UnicodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _heaps_of(plans: Dict[str, Tuple[str, str, date]]) -> Dict[str, List[Tuple[date, str]]]:
+    heaps = {}
+    for call_plan_id, (user_id, _, next_call_date) in plans.items():
+        heaps.setdefault(user_id, []).append((next_call_date, call_plan_id))
+    for heap in heaps.values():
+        heapq.heapify(heap)
+    return heaps
+
+
+class CallPlanScheduler:
+    """Next call dates of every call plan kept in process, in a min-heap per key account manager.
+    This process's writes update it as they happen, writes of other workers show up when it is reconciled with the database"""
+
+    def __init__(self):
+        self.loaded = False
+        # call_plan_id -> (user_id, restaurant_id, next_call_date), heap entries that no longer match it are stale
+        self._plans: Dict[str, Tuple[str, str, date]] = {}
+        self._heaps: Dict[str, List[Tuple[date, str]]] = {}
+        self._stale = 0
+        # Numbered writes since the last reconciliation, so that one loading the database does not undo them
+        self.writes = 0
+        self._written: Dict[str, int] = {}
+        self._reconciled_at: Optional[datetime] = None
+        self._reconciliations = 0
+        self._last_drift = {"missing": 0, "extra": 0, "changed": 0}
+        self._total_drift = 0
+
+    def schedule(self, call_plan_id: str, user_id: str, restaurant_id: str, next_call_date: date):
+        plan = (user_id, restaurant_id, next_call_date)
+        self.writes += 1
+        self._written[call_plan_id] = self.writes
+        previous = self._plans.get(call_plan_id)
+        if previous == plan:
+            return
+        if previous is not None:
+            self._stale += 1
+        self._plans[call_plan_id] = plan
+        heapq.heappush(self._heaps.setdefault(user_id, []), (next_call_date, call_plan_id))
+        # Stale entries are dropped lazily, rebuilding once they outnumber the live ones keeps that amortized O(1)
+        if self._stale > len(self._plans):
+            self._rebuild()
+
+    def due(self, user_id: str, due_date: Optional[date] = None, limit: int = 50) -> List[Dict]:
+        """The user's earliest limit calls, only those due by due_date if given, without touching the heap.
+        Walks the heap from its root, so it costs O(limit log limit) whatever the number of call plans"""
+        heap = self._heaps.get(user_id, [])
+        calls, seen = [], set()
+        frontier = [(heap[0], 0)] if heap else []
+        while frontier and len(calls) < limit:
+            (next_call_date, call_plan_id), position = heapq.heappop(frontier)
+            if due_date is not None and next_call_date > due_date:
+                break
+            plan = self._plans.get(call_plan_id)
+            # A plan moved away and back again has two matching entries
+            if plan is not None and plan[0] == user_id and plan[2] == next_call_date and call_plan_id not in seen:
+                seen.add(call_plan_id)
+                calls.append({"call_plan_id": call_plan_id, "restaurant_id": plan[1], "next_call_date": next_call_date})
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+        return calls
+
+    def snapshot(self) -> Tuple[int, Dict[str, Tuple[str, str, date]], bool]:
+        """The write counter, a copy of the schedule and whether it was loaded, to build a reconciliation from"""
+        return self.writes, dict(self._plans), self.loaded
+
+    @staticmethod
+    def build(rows: Iterable[Tuple[str, str, str, date]], current: Dict[str, Tuple[str, str, date]], loaded: bool) -> Tuple[Dict, Dict, Dict[str, set]]:
+        """The schedule of the call plans read from the database, its heaps, and the ids of the plans it has missing,
+        extra or changed compared to current. Touches no shared state, so it can run in a worker thread"""
+        plans = {call_plan_id: (user_id, restaurant_id, next_call_date) for call_plan_id, user_id, restaurant_id, next_call_date in rows}
+        drift = {"missing": set(), "extra": set(), "changed": set()}
+        if loaded:
+            drift["missing"] = plans.keys() - current.keys()
+            drift["extra"] = current.keys() - plans.keys()
+            drift["changed"] = {call_plan_id for call_plan_id, plan in plans.items() if current.get(call_plan_id, plan) != plan}
+        return plans, _heaps_of(plans), drift
+
+    def install(self, plans: Dict, heaps: Dict, drift: Dict[str, set], since: int) -> Dict[str, int]:
+        """Replace the schedule with a built one, keeping the writes numbered after since (made while it was read).
+        Returns how far the schedule had drifted from the database"""
+        written = {call_plan_id: write for call_plan_id, write in self._written.items() if write > since}
+        stale = 0
+        for call_plan_id in written:
+            plan = self._plans[call_plan_id]
+            if plans.get(call_plan_id) != plan:
+                stale += call_plan_id in plans
+                plans[call_plan_id] = plan
+                heapq.heappush(heaps.setdefault(plan[0], []), (plan[2], call_plan_id))
+        drift = {kind: len(call_plan_ids - written.keys()) for kind, call_plan_ids in drift.items()}
+        self._plans, self._heaps, self._written, self._stale = plans, heaps, written, stale
+
+        self.loaded = True
+        self._reconciled_at = datetime.now(timezone.utc)
+        self._reconciliations += 1
+        self._last_drift = drift
+        self._total_drift += sum(drift.values())
+        return drift
+
+    def reconcile(self, rows: Iterable[Tuple[str, str, str, date]], since: int) -> Dict[str, int]:
+        """Replace the schedule with the call plans read from the database, keeping the writes numbered after since"""
+        return self.install(*self.build(rows, self._plans, self.loaded), since)
+
+    def _rebuild(self):
+        self._heaps, self._stale = _heaps_of(self._plans), 0
+
+    def stats(self) -> Dict:
+        return {
+            "loaded": self.loaded,
+            "call_plans": len(self._plans),
+            "users": len(self._heaps),
+            "stale_entries": self._stale,
+            "reconciled_at": self._reconciled_at,
+            "reconciliations": self._reconciliations,
+            "last_drift": self._last_drift,
+            "total_drift": self._total_drift,
+        }
+
+
+_call_plan_scheduler: Optional[CallPlanScheduler] = None
+
+
+def get_call_plan_scheduler() -> Optional[CallPlanScheduler]:
+    """The process's scheduler, None unless call_plan_scheduler.enabled is set"""
+    global _call_plan_scheduler
+    if _call_plan_scheduler is None:
+        from core.config import APP_CONFIG
+
+        if APP_CONFIG.get("call_plan_scheduler", {}).get("enabled", False):
+            _call_plan_scheduler = CallPlanScheduler()
+    return _call_plan_scheduler
+
+
+def _schedule(call_plan: CallPlan):
+    scheduler = get_call_plan_scheduler()
+    if scheduler is not None:
+        scheduler.schedule(call_plan.call_plan_id, call_plan.user_id, call_plan.restaurant_id, call_plan.next_call_date)
+
+
 class CallPlanService:
-    def __init__(self, repository: CallPlanRepository):
+    def __init__(self, repository: CallPlanRepository, user_repository: UserRepository):
         self.repository = repository
+        self.user_repository = user_repository
 
     async def create_call_plan(self, call_plan_data: dict) -> CallPlan:
         try:
             next_call_date = date.today() + timedelta(days=call_plan_data["frequency_days"])
-            return await self.repository.create(**call_plan_data, next_call_date=next_call_date)
+            call_plan = await self.repository.create(**call_plan_data, next_call_date=next_call_date)
+            _schedule(call_plan)
+            return call_plan
         except Exception as e:
             logger.error(f"Error in create_call_plan service: {str(e)}")
             handle_exception(message="Failed to create call plan")
 
-    async def get_due_calls(self, due_date: Optional[date] = None) -> List[CallPlan]:
+    async def get_due_calls(self, email: str, due_date: Optional[date] = None, limit: int = 50, cursor: Optional[str] = None) -> dict:
+        """A page of the user's calls due by due_date, the earliest first, with the due and overdue totals"""
         try:
+            after = decode_cursor(cursor) if cursor else None
+            user = await self.user_repository.get_by_email(email)
+            if user is None:
+                raise HTTPException(status_code=404, detail="User not found")
+
+            today = date.today()
             if due_date is None:
-                due_date = date.today()
-            return await self.repository.get_due_calls(due_date)
+                due_date = today
+            # One extra row tells whether another page follows. Both queries run in their own session, in parallel
+            # with the async and threadpool session modes
+            calls, (total, overdue) = await asyncio.gather(
+                self.repository.get_due_calls(user.user_id, due_date, limit + 1, after),
+                self.repository.count_due_calls(user.user_id, due_date, today),
+            )
+            next_cursor = encode_cursor(calls[limit - 1]) if len(calls) > limit else None
+            return {"total": total, "overdue": overdue, "call_plans": calls[:limit], "next_cursor": next_cursor}
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error in get_due_calls service: {str(e)}")
             handle_exception(message="Failed to fetch due calls")
@@ -34,7 +213,73 @@ class CallPlanService:
         try:
             if call_date is None:
                 call_date = date.today()
-            return await self.repository.update_after_call(call_plan_id, call_date)
+            call_plan = await self.repository.update_after_call(call_plan_id, call_date)
+            if call_plan:
+                _schedule(call_plan)
+            return call_plan
         except Exception as e:
             logger.error(f"Error in record_call_made service: {str(e)}")
             handle_exception(message="Failed to record call")
+
+    async def record_calls_made(self, calls: List[Tuple[str, Optional[date]]]) -> List[Dict]:
+        """Record a batch of calls in one statement, returns the outcome of every call in request order"""
+        try:
+            today = date.today()
+            # A plan called more than once in the batch is scheduled from its latest call
+            latest = {}
+            for call_plan_id, call_date in calls:
+                call_date = call_date or today
+                latest[call_plan_id] = max(call_date, latest.get(call_plan_id, call_date))
+
+            call_plans = {call_plan.call_plan_id: call_plan for call_plan in await self.repository.update_after_calls(list(latest.items()))}
+            for call_plan in call_plans.values():
+                _schedule(call_plan)
+            return [
+                {"call_plan_id": call_plan_id, "status": "recorded" if call_plan_id in call_plans else "not_found", "call_plan": call_plans.get(call_plan_id)}
+                for call_plan_id, _ in calls
+            ]
+        except Exception as e:
+            logger.error(f"Error in record_calls_made service: {str(e)}")
+            handle_exception(message="Failed to record calls")
+
+    async def get_scheduled_calls(self, email: str, due_date: Optional[date] = None, limit: int = 50) -> List[Dict]:
+        """The user's earliest calls, only those due by due_date if given. Served from the in-process scheduler when it
+        is enabled, from the database otherwise"""
+        try:
+            user = await self.user_repository.get_by_email(email)
+            if user is None:
+                raise HTTPException(status_code=404, detail="User not found")
+            scheduler = get_call_plan_scheduler()
+            if scheduler is None:
+                call_plans = await self.repository.get_due_calls(user.user_id, due_date or date.max, limit)
+                return [{"call_plan_id": plan.call_plan_id, "restaurant_id": plan.restaurant_id, "next_call_date": plan.next_call_date} for plan in call_plans]
+            if not scheduler.loaded:
+                await self.reconcile_scheduler()
+            return scheduler.due(user.user_id, due_date, limit)
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error in get_scheduled_calls service: {str(e)}")
+            handle_exception(message="Failed to fetch scheduled calls")
+
+    async def reconcile_scheduler(self) -> Dict[str, int]:
+        """Reload the scheduler from the database, returns how far it had drifted"""
+        scheduler = get_call_plan_scheduler()
+        since, current, loaded = scheduler.snapshot()
+        # Reading and indexing every call plan runs in a worker thread, only installing the result runs on the event loop
+        built = await asyncio.to_thread(lambda: CallPlanScheduler.build(iter_schedule(get_active_engine()), current, loaded))
+        return scheduler.install(*built, since)
+
+
+async def reconcile_periodically(interval_seconds: float):
+    """Load the scheduler, then reconcile it every interval_seconds until cancelled, started by the application lifespan
+    when call_plan_scheduler.enabled is set"""
+    service = CallPlanService(CallPlanRepository(), UserRepository())
+    while True:
+        try:
+            drift = await service.reconcile_scheduler()
+            if any(drift.values()):
+                logger.info(f"Call plan scheduler had drifted from the database: {drift}")
+        except Exception:
+            logger.error("Error reconciling the call plan scheduler", exc_info=True)
+        await asyncio.sleep(interval_seconds)
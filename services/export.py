@@ -0,0 +1,140 @@
+import itertools
+import logging
+import os
+from datetime import date, datetime, timezone
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import BigInteger, Date, DateTime, Enum, Float, Integer, String, cast, func, select
+
+from models.base_model import Base
+from models.interaction import Interaction
+from models.order import Order
+from models.performance_metric import PerformanceMetric
+
+logger = logging.getLogger(__name__)
+
+# Exported tables and the column their rows are partitioned by month on
+EXPORTED_TABLES = {
+    "order": Order.created_at,
+    "interaction": Interaction.interaction_date,
+    "performance_metric": PerformanceMetric.period_start,
+}
+
+# Rows fetched from the server-side cursor at a time, each fetch becomes one record batch
+DEFAULT_BATCH_SIZE = 50_000
+
+# Checked in order, Enum and BigInteger are subclasses of String and Integer
+_ARROW_TYPES = [(String, pa.string()), (BigInteger, pa.int64()), (Integer, pa.int64()), (Float, pa.float64()), (Date, pa.date32())]
+
+
+def _arrow_type(column) -> pa.DataType:
+    if isinstance(column.type, DateTime):
+        return pa.timestamp("us", tz="UTC" if column.type.timezone else None)
+    for column_type, arrow_type in _ARROW_TYPES:
+        if isinstance(column.type, column_type):
+            return arrow_type
+    raise ValueError(f"No Arrow type for column {column.name} of type {column.type}")
+
+
+def arrow_schema(table_name: str) -> pa.Schema:
+    return pa.schema([pa.field(column.name, _arrow_type(column), nullable=column.nullable) for column in Base.metadata.tables[table_name].columns])
+
+
+def _month_of(partition_column):
+    """First day of the row's month, months of timestamps are UTC calendar months like the order rollups"""
+    if isinstance(partition_column.type, DateTime):
+        return cast(func.date_trunc("month", func.timezone("UTC", partition_column)), Date)
+    return cast(func.date_trunc("month", partition_column), Date)
+
+
+def _month_bounds(partition_column, month: date) -> tuple:
+    next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+    if isinstance(partition_column.type, DateTime):
+        return datetime.combine(month, datetime.min.time(), timezone.utc), datetime.combine(next_month, datetime.min.time(), timezone.utc)
+    return month, next_month
+
+
+def record_batches(connection, table_name: str, month: Optional[date] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[Tuple[date, pa.RecordBatch]]:
+    """(month, batch) pairs of the table's rows in partition order, every batch holds rows of a single month.
+    Rows come from a server-side cursor batch_size at a time, so memory does not grow with the table"""
+    table = Base.metadata.tables[table_name]
+    partition_column = EXPORTED_TABLES[table_name]
+    schema = arrow_schema(table_name)
+    # Enums are exported as their stored labels, Arrow cannot convert the Python enum members
+    columns = [cast(column, String) if isinstance(column.type, Enum) else column for column in table.columns]
+    query = select(_month_of(partition_column), *columns).order_by(partition_column)
+    if month:
+        month_start, month_end = _month_bounds(partition_column, month)
+        query = query.where(partition_column >= month_start, partition_column < month_end)
+
+    result = connection.execution_options(yield_per=batch_size).execute(query)
+    for rows in result.partitions():
+        months, *values = zip(*rows)
+        batch = pa.RecordBatch.from_arrays([pa.array(column, type=field.type) for column, field in zip(values, schema)], schema=schema)
+        offset = 0
+        for batch_month, run in itertools.groupby(months):
+            length = sum(1 for _ in run)
+            yield batch_month, batch.slice(offset, length)
+            offset += length
+
+
+def export_parquet(
+    engine, directory: str, table_names: Iterable[str] = EXPORTED_TABLES, month: Optional[date] = None, batch_size: int = DEFAULT_BATCH_SIZE
+) -> Dict[str, int]:
+    """Write every table to <directory>/<table>/month=YYYY-MM/part-0.parquet, returns the exported row count per table"""
+    counts = {}
+    for table_name in table_names:
+        writer, writer_month, count = None, None, 0
+        try:
+            with engine.connect() as connection:
+                for batch_month, batch in record_batches(connection, table_name, month, batch_size):
+                    # Rows arrive in month order, so each partition is written by one writer from start to end
+                    if batch_month != writer_month:
+                        if writer:
+                            writer.close()
+                        partition = os.path.join(directory, table_name, f"month={batch_month:%Y-%m}")
+                        os.makedirs(partition, exist_ok=True)
+                        writer, writer_month = pq.ParquetWriter(os.path.join(partition, "part-0.parquet"), batch.schema), batch_month
+                    writer.write_batch(batch)
+                    count += batch.num_rows
+        finally:
+            if writer:
+                writer.close()
+        counts[table_name] = count
+        logger.info(f"Exported {count} rows of {table_name}")
+    return counts
+
+
+class _ChunkSink:
+    """File-like object collecting what the Arrow stream writer writes, drained after every batch"""
+
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def arrow_stream(engine, table_name: str, month: Optional[date] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[bytes]:
+    """The table as an Arrow IPC stream, produced one record batch at a time"""
+    sink = _ChunkSink()
+    with engine.connect() as connection, pa.ipc.new_stream(sink, arrow_schema(table_name)) as writer:
+        yield sink.drain()
+        for _, batch in record_batches(connection, table_name, month, batch_size):
+            writer.write_batch(batch)
+            yield sink.drain()
+    # Closing the writer wrote the end-of-stream marker
+    yield sink.drain()
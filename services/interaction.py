@@ -1,7 +1,7 @@
 import logging
 from typing import Optional, List
-from datetime import datetime
 
+from models.base_model import utc_now
 from models.interaction import Interaction
 from repository.interaction import InteractionRepository
 from core.custom_exception import handle_exception
@@ -15,7 +15,7 @@ class InteractionService:
 
     async def create_interaction(self, interaction_data) -> Interaction:
         try:
-            interaction_date = datetime.now().isoformat()
+            interaction_date = utc_now()
             return await self.repository.create(**interaction_data, interaction_date=interaction_date)
         except Exception as e:
             logger.error(f"Error in create_interaction service: {str(e)}")
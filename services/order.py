@@ -1,10 +1,12 @@
-from datetime import datetime
 from typing import List, Optional
 from fastapi import HTTPException
 import logging
 
-from models.order import Order, OrderStatus
+from core.database import unit_of_work
+from models.base_model import utc_now
+from models.order import Order, OrderStatus, previous_statuses
 from repository.order import OrderRepository
+from repository.order_rollup import OrderRollupRepository
 from services.interaction import InteractionService
 from models.interaction import InteractionType
 
@@ -13,50 +15,67 @@ logger = logging.getLogger(__name__)
 
 
 class OrderService:
-    def __init__(self, repository: OrderRepository, interaction_service: InteractionService):
+    def __init__(self, repository: OrderRepository, interaction_service: InteractionService, rollup_repository: OrderRollupRepository):
         self.repository = repository
         self.interaction_service = interaction_service
+        self.rollup_repository = rollup_repository
 
     async def place_order(self, order_data: dict) -> Order:
         """Place a new order"""
         try:
-            current_time = datetime.now().isoformat()
+            current_time = utc_now()
 
-            # Create interaction record for the order
-            interaction = await self.interaction_service.create_interaction(
-                {
-                    "restaurant_id": order_data["restaurant_id"],
-                    "user_id": order_data["user_id"],
-                    "interaction_type": InteractionType.ORDER.value,
-                    "notes": order_data.get("notes"),
-                }
-            )
+            # The order, its interaction and the monthly rollup are committed together
+            async with unit_of_work():
+                # Create interaction record for the order
+                interaction = await self.interaction_service.create_interaction(
+                    {
+                        "restaurant_id": order_data["restaurant_id"],
+                        "user_id": order_data["user_id"],
+                        "interaction_type": InteractionType.ORDER.value,
+                        "notes": order_data.get("notes"),
+                    }
+                )
 
-            # Create the order
-            order = await self.repository.create(
-                restaurant_id=order_data["restaurant_id"],
-                user_id=order_data["user_id"],
-                interaction_id=interaction.interaction_id,
-                amount=order_data["amount"],
-                created_at=current_time,
-                updated_at=current_time,
-            )
+                # Create the order
+                order = await self.repository.create(
+                    restaurant_id=order_data["restaurant_id"],
+                    user_id=order_data["user_id"],
+                    interaction_id=interaction.interaction_id,
+                    amount=order_data["amount"],
+                    created_at=current_time,
+                    updated_at=current_time,
+                )
+                await self.rollup_repository.add_order(order.restaurant_id, order.created_at, order.amount)
             return order
 
         except Exception as e:
             logger.error(f"Error in place_order service: {str(e)}")
             raise HTTPException(status_code=500, detail="Failed to place order")
 
-    async def update_order_status(self, order_id: str, new_status: OrderStatus) -> Order:
-        """Update the status of an order"""
+    async def update_order_status(self, order_id: str, new_status: OrderStatus, expected_version: Optional[int] = None) -> Order:
+        """Move an order to new_status if ORDER_STATUS_TRANSITIONS allows it from the order's current status and, when
+        expected_version is given, nobody changed the order since that version"""
         try:
-            order = await self.repository.get_by_id(order_id)
-            if not order:
-                raise HTTPException(status_code=404, detail="Order not found")
+            async with unit_of_work():
+                previous = previous_statuses(new_status)
+                order = await self.repository.transition_status(order_id, new_status, previous, expected_version)
+                if order is None:
+                    # Only a refused change reads the order, to tell why
+                    current = await self.repository.get_by_id(order_id)
+                    if not current:
+                        raise HTTPException(status_code=404, detail="Order not found")
+                    if expected_version is not None and current.version != expected_version:
+                        raise HTTPException(status_code=409, detail=f"Order is at version {current.version}, not {expected_version}")
+                    raise HTTPException(status_code=409, detail=f"Order cannot move from {current.status.value} to {new_status.value}")
 
-            current_time = datetime.now().isoformat()
-            updated_order = await self.repository.update(order_id, {"status": new_status, "updated_at": current_time})
-            return updated_order
+                # Only canceling leaves and only reopening enters the counted statuses, the transition guarantees
+                # the order was in the other state, so concurrent changes adjust the rollup once
+                if new_status == OrderStatus.CANCELED:
+                    await self.rollup_repository.remove_order(order.restaurant_id, order.created_at, order.amount)
+                elif OrderStatus.CANCELED in previous:
+                    await self.rollup_repository.add_order(order.restaurant_id, order.created_at, order.amount)
+            return order
 
         except HTTPException:
             raise
@@ -0,0 +1,202 @@
+import asyncio
+import csv
+import io
+import itertools
+import logging
+import uuid
+from datetime import timezone
+from typing import AsyncIterator, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import BigInteger, Date, DateTime, Integer, String, bindparam, func, insert, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from models.base_model import utc_now
+from models.interaction import Interaction, InteractionType
+from models.order import Order, OrderStatus
+from models.restaurant import Restaurant
+from models.user import User
+from repository.order_rollup import ROLLUP_INCREMENT_COLUMNS, month_of, rollup_increments
+from schema.order import OrderImport
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ("ndjson", "csv")
+# Orders validated and stored per transaction
+DEFAULT_CHUNK_SIZE = 5_000
+# Rejected orders listed in the report, all of them are counted
+MAX_REPORTED_ERRORS = 1000
+
+INTERACTION_COLUMNS = ["interaction_id", "user_id", "restaurant_id", "interaction_type", "interaction_date", "notes"]
+ROLLUP_ARRAY_TYPES = [String, Date, Integer, BigInteger, DateTime(timezone=True), DateTime(timezone=True)]
+ORDER_COLUMNS = ["order_id", "restaurant_id", "user_id", "interaction_id", "status", "amount", "created_at", "updated_at"]
+
+# (line, order, error): each parsed line holds either a valid order or the reason it was rejected
+ParsedOrder = Tuple[int, Optional[OrderImport], Optional[str]]
+
+
+class InvalidImportFile(ValueError):
+    """The file cannot be read any further, the orders of the chunks before the failure stay imported"""
+
+
+def _describe(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in detail['loc']) or 'line'}: {detail['msg']}" for detail in error.errors())
+
+
+def parse_ndjson(lines: Iterable) -> Iterator[ParsedOrder]:
+    """One JSON object per line, blank lines are skipped"""
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, OrderImport.model_validate_json(line), None
+        except ValidationError as e:
+            yield line_number, None, _describe(e)
+
+
+def parse_csv(lines: Iterable[str]) -> Iterator[ParsedOrder]:
+    """A header row naming the OrderImport fields, then one order per row. Empty fields count as missing"""
+    reader = csv.DictReader(lines)
+    for row in reader:
+        try:
+            yield reader.line_num, OrderImport.model_validate({field: value for field, value in row.items() if value not in ("", None)}), None
+        except ValidationError as e:
+            yield reader.line_num, None, _describe(e)
+
+
+def _existing_ids(connection, column, ids: set) -> set:
+    return set(connection.execute(select(column).where(column.in_(ids))).scalars())
+
+
+def _write_rows(connection, table, columns: List[str], rows: List[tuple]):
+    """COPY the rows into the table with psycopg 3, multi-row INSERTs with other drivers"""
+    if connection.dialect.driver == "psycopg":
+        column_list = ", ".join(f'"{column}"' for column in columns)
+        with connection.connection.driver_connection.cursor() as cursor:
+            with cursor.copy(f'COPY "{table.name}" ({column_list}) FROM STDIN') as copy:
+                for row in rows:
+                    copy.write_row(row)
+    else:
+        connection.execute(insert(table), [dict(zip(columns, row)) for row in rows])
+
+
+def _store(connection, orders: List[OrderImport]):
+    """Insert the orders, their interactions and their rollup totals, in the caller's transaction"""
+    now = utc_now()
+    interactions, order_rows, rollups = [], [], {}
+    for order in orders:
+        created_at = order.created_at or now
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        interaction_id = str(uuid.uuid4())
+        # COPY bypasses the Enum types, so the labels are written as the columns store them
+        interactions.append((interaction_id, order.user_id, order.restaurant_id, InteractionType.ORDER.value, created_at, order.notes))
+        order_rows.append((str(uuid.uuid4()), order.restaurant_id, order.user_id, interaction_id, order.status.name, order.amount, created_at, now))
+        if order.status != OrderStatus.CANCELED:
+            key = (order.restaurant_id, month_of(created_at))
+            total = rollups.get(key)
+            if total is None:
+                rollups[key] = [1, order.amount, created_at, created_at]
+            else:
+                total[0] += 1
+                total[1] += order.amount
+                total[2] = min(total[2], created_at)
+                total[3] = max(total[3], created_at)
+
+    _write_rows(connection, Interaction.__table__, INTERACTION_COLUMNS, interactions)
+    _write_rows(connection, Order.__table__, ORDER_COLUMNS, order_rows)
+    if rollups:
+        # One statement reading the totals from arrays, instead of one execution per month
+        columns = list(zip(*((*key, *total) for key, total in sorted(rollups.items()))))
+        increments = func.unnest(*(bindparam(None, list(values), type_=ARRAY(type_)) for values, type_ in zip(columns, ROLLUP_ARRAY_TYPES)))
+        increments = increments.table_valued(*ROLLUP_INCREMENT_COLUMNS[:-1]).render_derived(name="increments")
+        connection.execute(rollup_increments(select(*increments.columns, literal(now, DateTime(timezone=True)))))
+
+
+def import_orders(engine, parsed: Iterable[ParsedOrder], chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict:
+    """Store the valid orders chunk by chunk, each chunk in its own transaction together with its interactions and
+    rollups. Returns the counts and the first MAX_REPORTED_ERRORS rejected orders"""
+    received = inserted = failed = 0
+    errors = []
+
+    def reject(line: int, message: str):
+        nonlocal failed
+        failed += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"line": line, "message": message})
+
+    parsed = iter(parsed)
+    try:
+        while chunk := list(itertools.islice(parsed, chunk_size)):
+            received += len(chunk)
+            rejected = [(line, error) for line, _, error in chunk if error is not None]
+            valid = [(line, order) for line, order, error in chunk if error is None]
+            accepted = []
+            try:
+                if valid:
+                    with engine.begin() as connection:
+                        restaurants = _existing_ids(connection, Restaurant.restaurant_id, {order.restaurant_id for _, order in valid})
+                        users = _existing_ids(connection, User.user_id, {order.user_id for _, order in valid})
+                        for line, order in valid:
+                            if order.restaurant_id not in restaurants:
+                                rejected.append((line, f"restaurant_id: Restaurant {order.restaurant_id} not found"))
+                            elif order.user_id not in users:
+                                rejected.append((line, f"user_id: User {order.user_id} not found"))
+                            else:
+                                accepted.append(order)
+                        if accepted:
+                            _store(connection, accepted)
+                inserted += len(accepted)
+            except Exception:
+                logger.error(f"Error storing {len(valid)} imported orders", exc_info=True)
+                known = {line for line, _ in rejected}
+                rejected += [(line, "Failed to store the order") for line, _ in valid if line not in known]
+            for line, message in sorted(rejected):
+                reject(line, message)
+    except UnicodeDecodeError as e:
+        # CSV is decoded in blocks, so the failing line is unknown
+        raise InvalidImportFile(f"The file is not valid UTF-8 ({e.reason}), the {inserted} orders imported before it are kept")
+    return {"received": received, "inserted": inserted, "failed": failed, "errors": errors}
+
+
+def parse_file(file: BinaryIO, import_format: str) -> Iterator[ParsedOrder]:
+    if import_format == "csv":
+        return parse_csv(io.TextIOWrapper(file, encoding="utf-8", newline=""))
+    return parse_ndjson(file)
+
+
+class _BodyReader(io.RawIOBase):
+    """Blocking reader over a request body for a worker thread, pulling each chunk from the event loop when needed"""
+
+    def __init__(self, chunks: AsyncIterator[bytes], loop: asyncio.AbstractEventLoop):
+        self._chunks = chunks.__aiter__()
+        self._loop = loop
+        self._chunk = b""
+        self._offset = 0
+        self._finished = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while self._offset == len(self._chunk) and not self._finished:
+            try:
+                self._chunk, self._offset = asyncio.run_coroutine_threadsafe(self._chunks.__anext__(), self._loop).result(), 0
+            except StopAsyncIteration:
+                self._finished = True
+        size = min(len(buffer), len(self._chunk) - self._offset)
+        buffer[:size] = self._chunk[self._offset : self._offset + size]
+        self._offset += size
+        return size
+
+
+async def import_upload(chunks: AsyncIterator[bytes], import_format: str, engine, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict:
+    """Import an uploaded file as it arrives in the request body. Parsing and the blocking COPY run in a worker thread,
+    which reads the body from the event loop a chunk at a time, so a chunk of orders is stored while the next one is
+    still being uploaded"""
+    body = io.BufferedReader(_BodyReader(chunks, asyncio.get_running_loop()))
+    try:
+        return await asyncio.to_thread(import_orders, engine, parse_file(body, import_format), chunk_size)
+    except InvalidImportFile as e:
+        raise HTTPException(status_code=400, detail=str(e))
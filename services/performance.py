@@ -1,11 +1,125 @@
+import logging
+import time
 from datetime import date, timedelta
-from typing import List, Dict
+from typing import Callable, List, Dict, Optional
 from fastapi import HTTPException
 from collections import defaultdict
 
+import numpy as np
+
 from repository.performance import PerformanceRepository
 from models.performance_metric import PerformanceMetric
 
+logger = logging.getLogger(__name__)
+
+
+def _month_bounds(year: int, month: int) -> tuple:
+    start_date = date(year, month, 1)
+    if month == 12:
+        end_date = date(year + 1, 1, 1) - timedelta(days=1)
+    else:
+        end_date = date(year, month + 1, 1) - timedelta(days=1)
+    return start_date, end_date
+
+
+def _log_progress(done: int, total: int):
+    logger.info(f"Stored metrics of {done}/{total} restaurants")
+
+
+TREND_METRICS = ["total_orders", "total_amount", "average_order_value", "order_frequency"]
+TREND_STATISTICS = ["slope", "percent_change", "volatility"]
+
+
+def series_trends(months: np.ndarray, values: np.ndarray, starts: np.ndarray) -> Dict[str, np.ndarray]:
+    """Least-squares slope per month, percent change from the first to the last month and volatility (standard deviation of the
+    month-over-month percent changes) of many series at once. Rows of a series are contiguous and ordered by month, starts holds
+    the first row of every series and values one column per metric; every statistic comes back as a (series, metric) array"""
+    counts = np.diff(np.append(starts, len(months)))
+    ends = starts + counts - 1
+
+    # Centering x per series makes the slope sum((x - mean(x)) * y) / sum((x - mean(x))^2) without centering y
+    x = months.astype(np.float64)
+    x -= np.repeat(np.add.reduceat(x, starts) / counts, counts)
+    sxx = np.add.reduceat(x * x, starts)[:, None]
+    sxy = np.add.reduceat(x[:, None] * values, starts, axis=0)
+    slope = np.divide(sxy, sxx, out=np.zeros_like(sxy), where=sxx > 0)
+
+    first, last = values[starts], values[ends]
+    percent_change = np.divide((last - first) * 100, first, out=np.zeros_like(first), where=first != 0)
+
+    # Change of every row over the previous one, left out at the start of a series and after a zero
+    previous = np.roll(values, 1, axis=0)
+    valid = (previous != 0) & ~np.isnan(previous) & ~np.isnan(values)
+    valid[starts] = False
+    change = np.divide(values - previous, previous, out=np.zeros_like(values), where=valid)
+    n = np.add.reduceat(valid.astype(np.int64), starts, axis=0)
+    mean = np.divide(np.add.reduceat(change, starts, axis=0), n, out=np.zeros_like(slope), where=n > 0)
+    mean_square = np.divide(np.add.reduceat(change * change, starts, axis=0), n, out=np.zeros_like(slope), where=n > 0)
+    volatility = np.sqrt(np.maximum(mean_square - mean * mean, 0)) * 100
+
+    return {"slope": slope, "percent_change": percent_change, "volatility": volatility}
+
+
+def group_series(rows: List[tuple]) -> tuple:
+    """Turn (series id, month number, *values) rows in any order into the arrays series_trends takes: series ids in series order,
+    month numbers, a values matrix and the first row of every series, rows sorted by series and month"""
+    # Numbering series in order of appearance through a dict is far cheaper than sorting the id strings
+    numbers: Dict[str, int] = {}
+    groups = np.fromiter((numbers.setdefault(row[0], len(numbers)) for row in rows), dtype=np.int64, count=len(rows))
+    columns = list(zip(*rows))
+    months = np.fromiter(columns[1], dtype=np.int64, count=len(rows))
+    values = np.array(columns[2:], dtype=np.float64).T
+    order = np.lexsort((months, groups))
+    groups, months, values = groups[order], months[order], values[order]
+    return np.array(list(numbers)), months, values, np.flatnonzero(np.diff(groups, prepend=-1))
+
+
+def _finite_or_none(value: float) -> Optional[float]:
+    return float(value) if np.isfinite(value) else None
+
+
+# Rankings are cached at the largest limit the rankings endpoint accepts and sliced per request
+LEADERBOARD_SIZE = 100
+
+
+class LeaderboardCache:
+    """Top restaurants per metric kept in process, dropped on metric writes or after ttl_seconds"""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self.generation = 0
+        self._entries = {}
+
+    def get(self, metric: str, end_date: date) -> Optional[List[Dict]]:
+        entry = self._entries.get(metric)
+        if entry is None:
+            return None
+        expires_at, cached_end_date, rankings = entry
+        if cached_end_date != end_date or time.monotonic() >= expires_at:
+            return None
+        return rankings
+
+    def put(self, metric: str, end_date: date, rankings: List[Dict], generation: int):
+        # Rankings read before the latest invalidation may already be stale
+        if generation == self.generation:
+            self._entries[metric] = (time.monotonic() + self.ttl_seconds, end_date, rankings)
+
+    def invalidate(self):
+        self.generation += 1
+        self._entries.clear()
+
+
+_leaderboard_cache: Optional[LeaderboardCache] = None
+
+
+def get_leaderboard_cache() -> LeaderboardCache:
+    global _leaderboard_cache
+    if _leaderboard_cache is None:
+        from core.config import APP_CONFIG
+
+        _leaderboard_cache = LeaderboardCache(float(APP_CONFIG.get("leaderboard_cache_ttl_seconds", 30)))
+    return _leaderboard_cache
+
 
 class PerformanceService:
     def __init__(self, repository: PerformanceRepository):
@@ -14,13 +128,21 @@ class PerformanceService:
     async def generate_monthly_metrics(self, restaurant_id: str, year: int, month: int) -> PerformanceMetric:
         """Generate performance metrics for a specific month"""
         try:
-            start_date = date(year, month, 1)
-            if month == 12:
-                end_date = date(year + 1, 1, 1) - timedelta(days=1)
-            else:
-                end_date = date(year, month + 1, 1) - timedelta(days=1)
+            start_date, end_date = _month_bounds(year, month)
+            metric = await self.repository.calculate_metrics(restaurant_id, start_date, end_date)
+            get_leaderboard_cache().invalidate()
+            return metric
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to generate metrics: {str(e)}")
 
-            return await self.repository.calculate_metrics(restaurant_id, start_date, end_date)
+    async def generate_all_monthly_metrics(self, year: int, month: int, progress: Optional[Callable[[int, int], None]] = None) -> Dict:
+        """Generate the month's performance metrics of every restaurant in one pass"""
+        try:
+            start_date, end_date = _month_bounds(year, month)
+            started = time.perf_counter()
+            restaurants = await self.repository.calculate_all_metrics(start_date, end_date, progress=progress or _log_progress)
+            get_leaderboard_cache().invalidate()
+            return {"period_start": start_date, "period_end": end_date, "restaurants": restaurants, "duration_seconds": round(time.perf_counter() - started, 3)}
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to generate metrics: {str(e)}")
 
@@ -59,18 +181,47 @@ class PerformanceService:
     async def get_restaurant_rankings(self, metric: str, limit: int) -> List[Dict]:
         """Get restaurant rankings by specified metric"""
         try:
-            # Get last month's metrics for all restaurants
+            # Rank by the latest metric of every restaurant within the last 30 days
             end_date = date.today()
             start_date = end_date - timedelta(days=30)
 
-            metrics = await self.repository.get_all_restaurant_metrics(start_date, end_date)
+            cache = get_leaderboard_cache()
+            rankings = cache.get(metric, end_date)
+            if rankings is None:
+                generation = cache.generation
+                rankings = await self.repository.get_top_restaurants(metric, LEADERBOARD_SIZE, start_date, end_date)
+                cache.put(metric, end_date, rankings, generation)
+            return rankings[:limit]
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to get rankings: {str(e)}")
 
-            # Sort by specified metric
-            sorted_metrics = sorted(metrics, key=lambda x: getattr(x, metric), reverse=True)[:limit]
+    async def analyze_portfolio_trends(self, months: int, metric: str, sort_by: str, limit: int) -> List[Dict]:
+        """Analyze performance trends of every restaurant, sorted by the given statistic of metric in descending order"""
+        try:
+            end_date = date.today()
+            start_date = end_date - timedelta(days=months * 30)
 
-            return [{"restaurant_id": m.restaurant_id, "metric_value": getattr(m, metric)} for m in sorted_metrics]
+            rows = await self.repository.get_metric_series(start_date, end_date)
+            if not rows:
+                return []
+
+            restaurant_ids, month_numbers, values, starts = group_series(rows)
+            trends = series_trends(month_numbers, values, starts)
+            key = trends[sort_by][:, TREND_METRICS.index(metric)]
+            # Ties are broken by restaurant id, restaurants without a value for the key go last
+            top = np.lexsort((restaurant_ids, -np.nan_to_num(key, nan=-np.inf)))[:limit]
+
+            counts = np.diff(np.append(starts, len(month_numbers)))
+            return [
+                {
+                    "restaurant_id": str(restaurant_ids[i]),
+                    "months": int(counts[i]),
+                    "trends": {name: {stat: _finite_or_none(trends[stat][i, j]) for stat in TREND_STATISTICS} for j, name in enumerate(TREND_METRICS)},
+                }
+                for i in top
+            ]
         except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to get rankings: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Failed to analyze portfolio trends: {str(e)}")
 
     def _calculate_trend(self, values: List[float]) -> float:
         """Calculate trend percentage change"""
@@ -0,0 +1,56 @@
+import asyncio
+import logging
+from datetime import date
+
+from fastapi import HTTPException
+
+from models.base_model import utc_now
+from repository.order_rollup import month_of
+from repository.portfolio import PortfolioRepository
+from repository.user import UserRepository
+from core.custom_exception import handle_exception
+
+logger = logging.getLogger(__name__)
+
+
+class PortfolioService:
+    def __init__(self, repository: PortfolioRepository, user_repository: UserRepository):
+        self.repository = repository
+        self.user_repository = user_repository
+
+    async def get_portfolio(self, email: str) -> dict:
+        """Dashboard of every restaurant the user has call plans for, built from four grouped queries whatever the portfolio size"""
+        try:
+            user = await self.user_repository.get_by_email(email)
+            if user is None:
+                raise HTTPException(status_code=404, detail="User not found")
+
+            # Each query runs in its own session, so with the async and threadpool session modes they run in parallel
+            restaurants, call_plans, last_interactions, month_orders = await asyncio.gather(
+                self.repository.get_restaurants(user.user_id),
+                self.repository.get_call_plan_summary(user.user_id, date.today()),
+                self.repository.get_last_interactions(user.user_id),
+                self.repository.get_month_orders(user.user_id, month_of(utc_now())),
+            )
+
+            portfolio = []
+            for restaurant in restaurants:
+                restaurant_id = restaurant["restaurant_id"]
+                call_plan = call_plans.get(restaurant_id)
+                orders = month_orders.get(restaurant_id)
+                portfolio.append(
+                    {
+                        **restaurant,
+                        "last_interaction_at": last_interactions.get(restaurant_id),
+                        "due_calls": call_plan["due_calls"] if call_plan else 0,
+                        "next_call_date": call_plan["next_call_date"] if call_plan else None,
+                        "month_order_count": orders["order_count"] if orders else 0,
+                        "month_revenue": orders["amount_sum"] if orders else 0,
+                    }
+                )
+            return {"total": len(portfolio), "due_calls": sum(restaurant["due_calls"] for restaurant in portfolio), "restaurants": portfolio}
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error in get_portfolio service: {str(e)}")
+            handle_exception(message="Failed to fetch portfolio")
@@ -1,6 +1,10 @@
 import pytest
+from datetime import date
 from fastapi.testclient import TestClient
+from core.config import APP_CONFIG
 from main import app
+import services.call_plan as call_plan_service
+from services.call_plan import CallPlanScheduler
 from tests.login_fixture import login_user
 
 client = TestClient(app)
@@ -17,3 +21,103 @@ def test_get_due_calls(login_user):
     response = client.get("/v1/call-plans/due-calls", headers={"Authorization": f"Bearer {login_user}"})
     assert response.status_code == 200
     assert "call_plans" in response.json()
+
+
+def test_get_due_calls_pages(login_user):
+    headers = {"Authorization": f"Bearer {login_user}"}
+    call_plan_data = {"restaurant_id": "24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4", "user_id": "2b890904-0356-494c-afc4-7222f406ce85", "frequency_days": 1}
+    for _ in range(3):
+        assert client.post("/v1/call-plans/", json=call_plan_data, headers=headers).status_code == 201
+
+    params = {"due_date": "2099-12-31", "limit": 2}
+    first = client.get("/v1/call-plans/due-calls", params=params, headers=headers).json()
+    assert first["total"] >= 3 and 0 <= first["overdue"] <= first["total"]
+
+    keys, page = [], first
+    while True:
+        assert len(page["call_plans"]) <= 2
+        keys += [(call["next_call_date"], call["call_plan_id"]) for call in page["call_plans"]]
+        if not page["next_cursor"]:
+            break
+        page = client.get("/v1/call-plans/due-calls", params={**params, "cursor": page["next_cursor"]}, headers=headers).json()
+    assert keys == sorted(keys) and len(set(keys)) == len(keys) == first["total"]
+    assert all(call["user_id"] == "2b890904-0356-494c-afc4-7222f406ce85" for call in first["call_plans"])
+
+
+def test_get_due_calls_invalid_cursor(login_user):
+    response = client.get("/v1/call-plans/due-calls", params={"cursor": "not-a-cursor"}, headers={"Authorization": f"Bearer {login_user}"})
+    assert response.status_code == 400
+
+
+@pytest.fixture(params=[True, False], ids=["scheduler", "database"])
+def call_plan_scheduler(request, monkeypatch):
+    monkeypatch.setitem(APP_CONFIG, "call_plan_scheduler", {"enabled": request.param})
+    monkeypatch.setattr(call_plan_service, "_call_plan_scheduler", None)
+    return request.param
+
+
+def test_get_upcoming_calls(login_user, call_plan_scheduler):
+    headers = {"Authorization": f"Bearer {login_user}"}
+    call_plan_data = {"restaurant_id": "24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4", "user_id": "2b890904-0356-494c-afc4-7222f406ce85", "frequency_days": 365}
+    call_plan_id = client.post("/v1/call-plans/", json=call_plan_data, headers=headers).json()["call_plan_id"]
+
+    calls = client.get("/v1/call-plans/upcoming", params={"limit": 500}, headers=headers).json()["calls"]
+    assert call_plan_id in [call["call_plan_id"] for call in calls]
+    assert [call["next_call_date"] for call in calls] == sorted(call["next_call_date"] for call in calls)
+
+    # Recording a call moves it in the schedule without a reload
+    assert client.post(f"/v1/call-plans/{call_plan_id}/record-call", params={"call_date": "2000-01-01"}, headers=headers).status_code == 200
+    calls = client.get("/v1/call-plans/upcoming", params={"due_date": "2001-01-01", "limit": 500}, headers=headers).json()["calls"]
+    assert {"call_plan_id": call_plan_id, "restaurant_id": call_plan_data["restaurant_id"], "next_call_date": "2000-12-31"} in calls
+
+
+def test_call_plan_scheduler_reconcile():
+    scheduler = CallPlanScheduler()
+    scheduler.reconcile([("a", "kam", "r", date(2024, 1, 3)), ("b", "kam", "r", date(2024, 1, 1)), ("c", "other", "r", date(2024, 1, 2))], since=0)
+    scheduler.schedule("a", "kam", "r", date(2023, 12, 31))
+    scheduler.schedule("a", "kam", "r", date(2024, 1, 5))
+    assert [call["call_plan_id"] for call in scheduler.due("kam")] == ["b", "a"]
+    assert [call["call_plan_id"] for call in scheduler.due("kam", due_date=date(2024, 1, 4))] == ["b"]
+
+    since = scheduler.writes
+    scheduler.schedule("d", "kam", "r", date(2024, 1, 2))
+    # The database lost "b", moved "c" and does not have "d" yet, which was written while it was read
+    drift = scheduler.reconcile([("a", "kam", "r", date(2024, 1, 5)), ("c", "other", "r", date(2024, 2, 1)), ("e", "kam", "r", date(2024, 1, 9))], since)
+    assert drift == {"missing": 1, "extra": 1, "changed": 1}
+    assert [call["call_plan_id"] for call in scheduler.due("kam")] == ["d", "a", "e"]
+    assert scheduler.stats()["total_drift"] == 3
+
+
+def test_call_plan_scheduler_keeps_writes_made_while_building():
+    scheduler = CallPlanScheduler()
+    scheduler.reconcile([("a", "kam", "r", date(2024, 1, 3))], since=0)
+    since, current, loaded = scheduler.snapshot()
+    # Built off the event loop from rows read before the write below reached the database
+    built = CallPlanScheduler.build([("a", "kam", "r", date(2024, 1, 3)), ("b", "kam", "r", date(2024, 1, 4))], current, loaded)
+    scheduler.schedule("a", "kam", "r", date(2024, 1, 9))
+
+    assert scheduler.install(*built, since) == {"missing": 1, "extra": 0, "changed": 0}
+    assert [(call["call_plan_id"], call["next_call_date"]) for call in scheduler.due("kam")] == [("b", date(2024, 1, 4)), ("a", date(2024, 1, 9))]
+    assert scheduler.stats()["stale_entries"] == 1
+
+
+def test_record_calls(login_user):
+    headers = {"Authorization": f"Bearer {login_user}"}
+    call_plan_data = {"restaurant_id": "24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4", "user_id": "2b890904-0356-494c-afc4-7222f406ce85", "frequency_days": 10}
+    first, second = (client.post("/v1/call-plans/", json=call_plan_data, headers=headers).json()["call_plan_id"] for _ in range(2))
+
+    calls = [
+        {"call_plan_id": first, "call_date": "2024-03-01"},
+        {"call_plan_id": "no-such-plan", "call_date": "2024-03-01"},
+        {"call_plan_id": second, "call_date": "2024-03-05"},
+        {"call_plan_id": second, "call_date": "2024-03-02"},
+    ]
+    response = client.post("/v1/call-plans/record-calls", json={"calls": calls}, headers=headers)
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["recorded"], body["not_found"]) == (3, 1)
+    assert [result["status"] for result in body["results"]] == ["recorded", "not_found", "recorded", "recorded"]
+    assert body["results"][0]["call_plan"]["next_call_date"] == "2024-03-11"
+    # The latest call of a plan called twice in the batch wins
+    assert body["results"][3]["call_plan"]["last_call_date"] == "2024-03-05"
+    assert body["results"][3]["call_plan"]["next_call_date"] == "2024-03-15"
@@ -0,0 +1,43 @@
+import pytest
+from fastapi.testclient import TestClient
+from core.config import APP_CONFIG
+from core.instrumentation import _explain_statement
+from main import app
+import services.call_plan as call_plan_service
+from tests.login_fixture import login_user
+
+client = TestClient(app)
+
+
+def test_server_timing_header(login_user):
+    response = client.get("/v1/restaurants/24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4", headers={"Authorization": f"Bearer {login_user}"})
+    assert response.status_code == 200
+    assert response.headers["Server-Timing"].startswith("db;dur=")
+
+
+def test_get_sql_stats(login_user):
+    client.get("/v1/restaurants/24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4", headers={"Authorization": f"Bearer {login_user}"})
+    response = client.get("/v1/debug/sql", headers={"Authorization": f"Bearer {login_user}"})
+    assert response.status_code == 200
+    assert response.json()["requests"][-1]["statement_count"] >= 1
+
+
+def test_get_slow_queries(login_user):
+    response = client.get("/v1/debug/slow-queries", headers={"Authorization": f"Bearer {login_user}"})
+    assert response.status_code == 200
+    assert "queries" in response.json()
+
+
+def test_only_plain_selects_are_explained_with_analyze():
+    assert _explain_statement("SELECT * FROM restaurant").startswith("EXPLAIN (ANALYZE, BUFFERS)")
+    # ANALYZE would run the write a second time
+    for statement in ("WITH gone AS (DELETE FROM restaurant RETURNING *) SELECT * FROM gone", "SELECT * FROM restaurant FOR UPDATE", "UPDATE restaurant SET name = 'x'"):
+        assert "ANALYZE" not in _explain_statement(statement)
+
+
+def test_get_call_plan_scheduler_stats(login_user, monkeypatch):
+    monkeypatch.setitem(APP_CONFIG, "call_plan_scheduler", {"enabled": True})
+    monkeypatch.setattr(call_plan_service, "_call_plan_scheduler", None)
+    response = client.get("/v1/debug/call-plan-scheduler", headers={"Authorization": f"Bearer {login_user}"})
+    assert response.status_code == 200
+    assert "last_drift" in response.json()
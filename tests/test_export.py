@@ -0,0 +1,56 @@
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+
+from core.database import get_active_engine
+from main import app
+from services.export import export_parquet
+from tests.login_fixture import login_user
+
+client = TestClient(app)
+
+
+def _row_count(table_name: str) -> int:
+    with get_active_engine().connect() as connection:
+        return connection.execute(text(f'SELECT count(*) FROM "{table_name}"')).scalar()
+
+
+def test_export_order_stream(login_user):
+    headers = {"Authorization": f"Bearer {login_user}"}
+    order_data = {"restaurant_id": "24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4", "user_id": "2b890904-0356-494c-afc4-7222f406ce85", "amount": 100}
+    order_id = client.post("/v1/orders/", json=order_data, headers=headers).json()["order_id"]
+
+    response = client.get("/v1/exports/order", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/vnd.apache.arrow.stream"
+    orders = pa.ipc.open_stream(response.content).read_all()
+    assert orders.num_rows == _row_count("order")
+    assert order_id in orders.column("order_id").to_pylist()
+
+    today = date.today()
+    response = client.get("/v1/exports/order", params={"year": today.year - 10, "month": today.month}, headers=headers)
+    assert pa.ipc.open_stream(response.content).read_all().num_rows == 0
+
+
+def test_export_unknown_table(login_user):
+    response = client.get("/v1/exports/user", headers={"Authorization": f"Bearer {login_user}"})
+    assert response.status_code == 404
+
+
+def test_export_rejects_years_out_of_range(login_user):
+    headers = {"Authorization": f"Bearer {login_user}"}
+    assert client.get("/v1/exports/order", params={"year": 0, "month": 1}, headers=headers).status_code == 422
+    assert client.get("/v1/exports/order", params={"year": 9999, "month": 12}, headers=headers).status_code == 422
+
+
+def test_export_parquet_partitions_by_month(tmp_path):
+    counts = export_parquet(get_active_engine(), str(tmp_path), batch_size=2)
+    assert counts == {table_name: _row_count(table_name) for table_name in ("order", "interaction", "performance_metric")}
+
+    orders = ds.dataset(tmp_path / "order", partitioning="hive").to_table()
+    assert orders.num_rows == counts["order"]
+    # Every row sits in the partition of its UTC month
+    assert all(created_at.strftime("%Y-%m") == month for created_at, month in zip(orders.column("created_at").to_pylist(), orders.column("month").to_pylist()))
@@ -0,0 +1,103 @@
+import asyncio
+from datetime import date
+
+import pytest
+from sqlalchemy import event, text
+
+from core.database import get_active_engine
+from repository.call_plan import CallPlanRepository
+from repository.interaction import InteractionRepository
+from repository.order import OrderRepository
+from repository.order_rollup import OrderRollupRepository
+from repository.performance import PerformanceRepository
+from repository.restaurant import RestaurantRepository
+from repository.user import UserRepository
+
+ROWS = 2000
+
+SEED_STATEMENTS = [
+    """INSERT INTO restaurant (restaurant_id, name, address, phone, email, status, created_at, updated_at)
+       SELECT 'index-test-r' || g, 'Restaurant ' || g, 'addr', '1', 'r' || g || '@index.test', 'NEW', now(), now() FROM generate_series(1, :rows) g""",
+    """INSERT INTO "user" (user_id, name, email, phone, role, hashed_password, restaurant_id, created_at, updated_at)
+       SELECT 'index-test-u' || g, 'User ' || g, 'u' || g || '@index.test', '1', 'STAFF', 'x', 'index-test-r' || g, now(), now() FROM generate_series(1, :rows) g""",
+    """INSERT INTO interaction (interaction_id, user_id, restaurant_id, interaction_type, interaction_date)
+       SELECT 'index-test-i' || g, 'index-test-u' || g, 'index-test-r' || g, 'Order', now() FROM generate_series(1, :rows) g""",
+    """INSERT INTO "order" (order_id, restaurant_id, user_id, interaction_id, status, amount, created_at, updated_at)
+       SELECT 'index-test-o' || g, 'index-test-r' || g, 'index-test-u' || g, 'index-test-i' || g, 'NEW', g,
+              timestamptz '2023-01-01' + g * interval '1 hour', now() FROM generate_series(1, :rows) g""",
+    """INSERT INTO call_plan (call_plan_id, restaurant_id, user_id, frequency_days, next_call_date, created_at, updated_at)
+       SELECT 'index-test-c' || g, 'index-test-r' || g, 'index-test-u' || g, 7, date '2023-01-01' + g, now(), now() FROM generate_series(1, :rows) g""",
+    """INSERT INTO performance_metric (metric_id, restaurant_id, period_start, period_end, total_orders, total_amount, average_order_value, order_frequency, created_at, updated_at)
+       SELECT 'index-test-m' || g, 'index-test-r' || g, date '2020-01-01' + g, date '2020-01-01' + g + 30, 1, 1, 1, 0, now(), now() FROM generate_series(1, :rows) g""",
+]
+
+# Child tables first, every seeded row references an index-test restaurant
+CLEANUP_TABLES = ["performance_metric", "order_rollup", "call_plan", '"order"', "interaction", '"user"']
+
+# Repository reads that filter on a column, reads of whole tables (get_all) are left out
+REPOSITORY_READS = {
+    "UserRepository.get_by_id": lambda: UserRepository().get_by_id("index-test-u7"),
+    "UserRepository.get_by_email": lambda: UserRepository().get_by_email("u7@index.test"),
+    "UserRepository.get_by_restaurant": lambda: UserRepository().get_by_restaurant("index-test-r7"),
+    "RestaurantRepository.get_by_id": lambda: RestaurantRepository().get_by_id("index-test-r7"),
+    "InteractionRepository.get_by_id": lambda: InteractionRepository().get_by_id("index-test-i7"),
+    "InteractionRepository.get_by_restaurant": lambda: InteractionRepository().get_by_restaurant("index-test-r7"),
+    "InteractionRepository.get_by_contact": lambda: InteractionRepository().get_by_contact("index-test-u7"),
+    "OrderRepository.get_by_id": lambda: OrderRepository().get_by_id("index-test-o7"),
+    "OrderRepository.get_by_restaurant": lambda: OrderRepository().get_by_restaurant("index-test-r7"),
+    "OrderRepository.get_by_contact": lambda: OrderRepository().get_by_contact("index-test-u7"),
+    "CallPlanRepository.get_due_calls": lambda: CallPlanRepository().get_due_calls("index-test-u7", date(2023, 1, 10), 50),
+    "CallPlanRepository.get_due_calls (next page)": lambda: CallPlanRepository().get_due_calls("index-test-u7", date(2023, 1, 10), 50, (date(2023, 1, 1), "index-test-c1")),
+    "CallPlanRepository.count_due_calls": lambda: CallPlanRepository().count_due_calls("index-test-u7", date(2023, 1, 10), date(2023, 1, 5)),
+    "PerformanceRepository.calculate_metrics": lambda: PerformanceRepository().calculate_metrics("index-test-r7", date(2023, 1, 1), date(2023, 1, 31)),
+    "PerformanceRepository.calculate_metrics (partial month)": lambda: PerformanceRepository().calculate_metrics("index-test-r7", date(2023, 1, 1), date(2023, 1, 15)),
+    "PerformanceRepository.get_top_restaurants": lambda: PerformanceRepository().get_top_restaurants("total_amount", 10, date(2020, 1, 5), date(2020, 2, 4)),
+    "OrderRollupRepository.get_month": lambda: OrderRollupRepository().get_month("index-test-r7", date(2023, 1, 1)),
+    "PerformanceRepository.get_restaurant_metrics": lambda: PerformanceRepository().get_restaurant_metrics("index-test-r7"),
+    "PerformanceRepository.get_metrics_by_period": lambda: PerformanceRepository().get_metrics_by_period("index-test-r7", date(2023, 1, 1), date(2023, 1, 31)),
+    "PerformanceRepository.get_all_restaurant_metrics": lambda: PerformanceRepository().get_all_restaurant_metrics(date(2020, 1, 5), date(2020, 2, 20)),
+}
+
+
+def _cleanup(connection):
+    for table in CLEANUP_TABLES:
+        connection.execute(text(f"DELETE FROM {table} WHERE restaurant_id LIKE 'index-test-%'"))
+    connection.execute(text("DELETE FROM restaurant WHERE restaurant_id LIKE 'index-test-%'"))
+
+
+@pytest.fixture(scope="module")
+def seeded_dataset():
+    engine = get_active_engine()
+    with engine.begin() as connection:
+        _cleanup(connection)
+        for statement in SEED_STATEMENTS:
+            connection.execute(text(statement), {"rows": ROWS})
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("ANALYZE"))
+    yield engine
+    with engine.begin() as connection:
+        _cleanup(connection)
+
+
+@pytest.mark.parametrize("read", REPOSITORY_READS)
+def test_repository_read_uses_index(seeded_dataset, monkeypatch, read):
+    monkeypatch.setenv("DB_SESSION_MODE", "sync")
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(seeded_dataset, "before_cursor_execute", capture)
+    try:
+        asyncio.run(REPOSITORY_READS[read]())
+    finally:
+        event.remove(seeded_dataset, "before_cursor_execute", capture)
+    assert statements
+
+    with seeded_dataset.connect() as connection:
+        # Tiny tables are cheaper to read sequentially, so only fall back to that when no index applies
+        connection.exec_driver_sql("SET enable_seqscan = off")
+        for statement, parameters in statements:
+            plan = "\n".join(row[0] for row in connection.exec_driver_sql(f"EXPLAIN {statement}", parameters))
+            assert "Seq Scan" not in plan and "Index" in plan, f"{read} does not use an index:\n{statement}\n{plan}"
@@ -1,5 +1,14 @@
+import asyncio
+import json
+
 import pytest
 from fastapi.testclient import TestClient
+from core.custom_exception import AppRuntimeException
+from core.database import get_active_engine
+from jobs.reconcile_rollups import find_drift
+from models.order import OrderStatus
+from repository.order import OrderRepository
+from services.order_import import import_upload
 from main import app
 from tests.login_fixture import login_user
 
@@ -18,3 +27,107 @@ def test_get_restaurant_orders(login_user):
     response = client.get("/v1/orders/restaurants/24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4", headers={"Authorization": f"Bearer {login_user}"})
     assert response.status_code == 200
     assert isinstance(response.json()["orders"], list)
+
+
+def test_order_status_transitions(login_user):
+    headers = {"Authorization": f"Bearer {login_user}"}
+    order_data = {"restaurant_id": "24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4", "user_id": "2b890904-0356-494c-afc4-7222f406ce85", "amount": 1000}
+    order = client.post("/v1/orders/", json=order_data, headers=headers).json()
+    assert order["version"] == 1
+
+    response = client.patch(f"/v1/orders/{order['order_id']}/status", params={"status": "Confirmed"}, headers={**headers, "If-Match": '"1"'})
+    assert response.status_code == 200
+    assert (response.json()["status"], response.json()["version"], response.headers["ETag"]) == ("Confirmed", 2, '"2"')
+
+    # A client still holding version 1 lost the race
+    response = client.patch(f"/v1/orders/{order['order_id']}/status", params={"status": "Canceled"}, headers={**headers, "If-Match": '"1"'})
+    assert response.status_code == 409
+    # Confirmed orders cannot go back to New, nor skip to Delivered
+    for status in ("New", "Delivered"):
+        assert client.patch(f"/v1/orders/{order['order_id']}/status", params={"status": status}, headers=headers).status_code == 409
+
+    response = client.patch(f"/v1/orders/{order['order_id']}/status", params={"status": "Preparing"}, headers={**headers, "If-Match": 'W/"2"'})
+    assert (response.status_code, response.json()["version"]) == (200, 3)
+    assert client.patch(f"/v1/orders/{order['order_id']}/status", params={"status": "Ready"}, headers={**headers, "If-Match": "3a"}).status_code == 400
+    assert client.patch("/v1/orders/00000000-0000-0000-0000-000000000000/status", params={"status": "Ready"}, headers=headers).status_code == 404
+
+
+def test_order_update_leaves_the_status_alone(login_user):
+    order_data = {"restaurant_id": "24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4", "user_id": "2b890904-0356-494c-afc4-7222f406ce85", "amount": 1000}
+    order_id = client.post("/v1/orders/", json=order_data, headers={"Authorization": f"Bearer {login_user}"}).json()["order_id"]
+
+    order = asyncio.run(OrderRepository().update(order_id, {"user_id": "2b890904-0356-494c-afc4-7222f406ce85"}))
+    assert (order.status, order.version) == (OrderStatus.NEW, 2)
+    for order_data in ({"status": OrderStatus.CANCELED}, {"amount": 2000}):
+        with pytest.raises(AppRuntimeException):
+            asyncio.run(OrderRepository().update(order_id, order_data))
+    order = asyncio.run(OrderRepository().get_by_id(order_id))
+    assert (order.status, order.amount, order.version) == (OrderStatus.NEW, 1000, 2)
+
+
+def test_import_orders_ndjson(login_user):
+    order = {"restaurant_id": "24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4", "user_id": "2b890904-0356-494c-afc4-7222f406ce85", "amount": 1000}
+    lines = [
+        json.dumps(order),
+        json.dumps({**order, "amount": -5}),
+        "",
+        json.dumps({**order, "restaurant_id": "no-such-restaurant"}),
+        json.dumps({**order, "created_at": "2021-03-05T10:00:00", "notes": "tab\there"}),
+        json.dumps({**order, "created_at": "2021-03-06T10:00:00+02:00", "status": "Canceled"}),
+    ]
+    response = client.post(
+        "/v1/orders/bulk", content="\n".join(lines), headers={"Authorization": f"Bearer {login_user}", "Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["received"], report["inserted"], report["failed"]) == (5, 3, 2)
+    assert [error["line"] for error in report["errors"]] == [2, 4]
+    assert report["errors"][0]["message"].startswith("amount")
+
+    orders = client.get("/v1/orders/restaurants/24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4", headers={"Authorization": f"Bearer {login_user}"}).json()["orders"]
+    imported = {order["created_at"]: order for order in orders if order["created_at"].startswith("2021-03")}
+    assert imported["2021-03-05T10:00:00Z"]["status"] == "New"
+    assert imported["2021-03-06T08:00:00Z"]["status"] == "Canceled"
+    # Imported orders are counted in their monthly rollups like placed ones, canceled ones are not
+    with get_active_engine().connect() as connection:
+        assert find_drift(connection) == []
+
+
+def test_import_orders_csv(login_user):
+    body = (
+        "restaurant_id,user_id,amount,notes\n"
+        "24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4,2b890904-0356-494c-afc4-7222f406ce85,1500,\"comma, inside\"\n"
+        "24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4,2b890904-0356-494c-afc4-7222f406ce85,,\n"
+    )
+    response = client.post("/v1/orders/bulk", content=body, headers={"Authorization": f"Bearer {login_user}", "Content-Type": "text/csv"})
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["received"], report["inserted"], report["failed"]) == (2, 1, 1)
+    assert report["errors"] == [{"line": 3, "message": "amount: Field required"}]
+
+
+def test_import_orders_unknown_format(login_user):
+    response = client.post("/v1/orders/bulk", params={"format": "xml"}, content="<orders/>", headers={"Authorization": f"Bearer {login_user}"})
+    assert response.status_code == 400
+
+
+def test_import_orders_csv_not_utf8(login_user):
+    body = "restaurant_id,user_id,amount,notes\n24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4,2b890904-0356-494c-afc4-7222f406ce85,1500,Caf\xe9\n".encode("latin-1")
+    response = client.post("/v1/orders/bulk", content=body, headers={"Authorization": f"Bearer {login_user}", "Content-Type": "text/csv"})
+    assert response.status_code == 400
+
+
+def test_import_upload_reads_the_body_as_it_arrives():
+    order = {"restaurant_id": "24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4", "user_id": "2b890904-0356-494c-afc4-7222f406ce85", "amount": 700}
+    body = "".join(json.dumps(order) + "\n" for _ in range(5)).encode()
+    received = []
+
+    async def chunks():
+        # Lines split across chunks, as the body arrives from the network
+        for start in range(0, len(body), 7):
+            received.append(start)
+            yield body[start : start + 7]
+
+    report = asyncio.run(import_upload(chunks(), "ndjson", get_active_engine(), chunk_size=2))
+    assert (report["received"], report["inserted"], report["failed"]) == (5, 5, 0)
+    assert len(received) == -(-len(body) // 7)
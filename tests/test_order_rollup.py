@@ -0,0 +1,97 @@
+import asyncio
+import uuid
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+from sqlalchemy import bindparam, text
+
+from core.database import get_active_engine
+from core.config import APP_CONFIG
+from jobs.reconcile_rollups import find_drift, reconcile
+from jobs.refresh_rollup_view import refresh
+from main import app
+from models.base_model import utc_now
+from repository.order_rollup import OrderRollupRepository, month_of
+from tests.login_fixture import login_user
+
+client = TestClient(app)
+
+RESTAURANT_ID = "24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4"
+
+
+def _current_rollup():
+    rollup = asyncio.run(OrderRollupRepository().get_month(RESTAURANT_ID, month_of(utc_now())))
+    return (rollup.order_count, rollup.amount_sum) if rollup else (0, 0)
+
+
+def test_rollup_follows_orders_and_cancellations(login_user):
+    headers = {"Authorization": f"Bearer {login_user}"}
+    count, amount = _current_rollup()
+
+    order_data = {"restaurant_id": RESTAURANT_ID, "user_id": "2b890904-0356-494c-afc4-7222f406ce85", "amount": 250}
+    order_id = client.post("/v1/orders/", json=order_data, headers=headers).json()["order_id"]
+    assert _current_rollup() == (count + 1, amount + 250)
+
+    assert client.patch(f"/v1/orders/{order_id}/status", params={"status": "Canceled"}, headers=headers).status_code == 200
+    assert _current_rollup() == (count, amount)
+
+    # Canceling again is refused and must not count the order twice
+    assert client.patch(f"/v1/orders/{order_id}/status", params={"status": "Canceled"}, headers=headers).status_code == 409
+    assert _current_rollup() == (count, amount)
+
+    # Reopening counts it again
+    assert client.patch(f"/v1/orders/{order_id}/status", params={"status": "New"}, headers=headers).status_code == 200
+    assert _current_rollup() == (count + 1, amount + 250)
+
+
+def test_reconcile_repairs_drift(login_user):
+    order_data = {"restaurant_id": RESTAURANT_ID, "user_id": "2b890904-0356-494c-afc4-7222f406ce85", "amount": 100}
+    assert client.post("/v1/orders/", json=order_data, headers={"Authorization": f"Bearer {login_user}"}).status_code == 201
+
+    engine = get_active_engine()
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE order_rollup SET order_count = order_count + 5 WHERE restaurant_id = :id"), {"id": RESTAURANT_ID})
+
+    drift = reconcile(engine)
+    assert (RESTAURANT_ID, month_of(utc_now())) in drift
+    with engine.connect() as connection:
+        assert find_drift(connection) == []
+
+
+def test_rollup_view_serves_closed_months(login_user, monkeypatch):
+    headers = {"Authorization": f"Bearer {login_user}"}
+    order_data = {"restaurant_id": RESTAURANT_ID, "user_id": "2b890904-0356-494c-afc4-7222f406ce85", "amount": 100}
+    order_id = client.post("/v1/orders/", json=order_data, headers=headers).json()["order_id"]
+
+    # Orders written around OrderService reach the view on refresh, and the current month is aggregated live
+    copied = [str(uuid.uuid4()), str(uuid.uuid4())]
+    engine = get_active_engine()
+    with engine.begin() as connection:
+        for copy_id, created_at in zip(copied, (datetime(2022, 3, 15, tzinfo=timezone.utc), utc_now())):
+            connection.execute(
+                text(
+                    'INSERT INTO "order" (order_id, restaurant_id, user_id, interaction_id, status, amount, created_at, updated_at) '
+                    'SELECT :copy_id, restaurant_id, user_id, interaction_id, status, amount, :created_at, now() FROM "order" WHERE order_id = :order_id'
+                ),
+                {"copy_id": copy_id, "created_at": created_at, "order_id": order_id},
+            )
+    try:
+        monkeypatch.setitem(APP_CONFIG, "order_rollup_source", "view")
+        assert refresh(engine)
+        url = f"/v1/performance/restaurants/{RESTAURANT_ID}/metrics"
+        with engine.connect() as connection:
+            expected = connection.execute(
+                text("""SELECT count(*) FROM "order" WHERE restaurant_id = :id AND created_at >= '2022-03-01' AND created_at < '2022-04-01' AND status <> 'CANCELED'"""),
+                {"id": RESTAURANT_ID},
+            ).scalar()
+        assert client.post(url, params={"year": 2022, "month": 3}, headers=headers).json()["total_orders"] == expected
+
+        today = utc_now()
+        view_metric = client.post(url, params={"year": today.year, "month": today.month}, headers=headers).json()
+        monkeypatch.setitem(APP_CONFIG, "order_rollup_source", "table")
+        table_metric = client.post(url, params={"year": today.year, "month": today.month}, headers=headers).json()
+        assert view_metric["total_orders"] == table_metric["total_orders"] + 1
+    finally:
+        with engine.begin() as connection:
+            connection.execute(text('DELETE FROM "order" WHERE order_id IN :ids').bindparams(bindparam("ids", expanding=True)), {"ids": copied})
+        refresh(engine)
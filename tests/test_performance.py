@@ -1,6 +1,10 @@
+from datetime import date, timedelta
+
+import numpy as np
 import pytest
 from fastapi.testclient import TestClient
 from main import app
+from services.performance import series_trends
 from tests.login_fixture import login_user
 
 client = TestClient(app)
@@ -14,7 +18,97 @@ def test_generate_metrics(login_user):
     assert "metric_id" in response.json()
 
 
+def test_generate_metrics_aggregates_orders(login_user):
+    headers = {"Authorization": f"Bearer {login_user}"}
+    for amount in (100, 300):
+        order_data = {"restaurant_id": "24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4", "user_id": "2b890904-0356-494c-afc4-7222f406ce85", "amount": amount}
+        assert client.post("/v1/orders/", json=order_data, headers=headers).status_code == 201
+
+    today = date.today()
+    response = client.post("/v1/performance/restaurants/24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4/metrics", params={"year": today.year, "month": today.month}, headers=headers)
+    assert response.status_code == 200
+    metric = response.json()
+    assert metric["total_orders"] >= 2
+    assert metric["average_order_value"] == pytest.approx(metric["total_amount"] / metric["total_orders"])
+    assert metric["order_frequency"] >= 0
+
+
+def test_generate_metrics_is_idempotent(login_user):
+    url = "/v1/performance/restaurants/24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4/metrics"
+    first = client.post(url, params={"year": 2023, "month": 2}, headers={"Authorization": f"Bearer {login_user}"})
+    second = client.post(url, params={"year": 2023, "month": 2}, headers={"Authorization": f"Bearer {login_user}"})
+    assert first.status_code == second.status_code == 200
+    assert first.json()["metric_id"] == second.json()["metric_id"]
+
+    metrics = client.get(url, headers={"Authorization": f"Bearer {login_user}"}).json()["metrics"]
+    periods = [(m["period_start"], m["period_end"]) for m in metrics]
+    assert len(periods) == len(set(periods))
+
+
+def test_generate_all_metrics(login_user):
+    response = client.post("/v1/performance/metrics", params={"year": 2023, "month": 1}, headers={"Authorization": f"Bearer {login_user}"})
+    assert response.status_code == 200
+    assert response.json()["restaurants"] >= 1
+
+
 def test_get_restaurant_metrics(login_user):
     response = client.get("/v1/performance/restaurants/24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4/metrics", headers={"Authorization": f"Bearer {login_user}"})
     assert response.status_code == 200
     assert "metrics" in response.json()
+
+
+def test_get_restaurant_rankings(login_user):
+    headers = {"Authorization": f"Bearer {login_user}"}
+    today = date.today()
+    order_data = {"restaurant_id": "24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4", "user_id": "2b890904-0356-494c-afc4-7222f406ce85", "amount": 1_000_000}
+    assert client.post("/v1/orders/", json=order_data, headers=headers).status_code == 201
+    metric = client.post(
+        "/v1/performance/restaurants/24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4/metrics", params={"year": today.year, "month": today.month}, headers=headers
+    ).json()
+
+    # Generating the metric invalidates the cached leaderboard, so the new total is ranked right away
+    response = client.get("/v1/performance/restaurants/rankings", params={"metric": "total_amount", "limit": 100}, headers=headers)
+    assert response.status_code == 200
+    rankings = response.json()
+    assert {"restaurant_id": "24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4", "metric_value": metric["total_amount"]} in rankings
+    assert len({r["restaurant_id"] for r in rankings}) == len(rankings)
+    assert [r["metric_value"] for r in rankings] == sorted((r["metric_value"] for r in rankings), reverse=True)
+
+
+def test_get_restaurant_rankings_rejects_unknown_metrics(login_user):
+    response = client.get("/v1/performance/restaurants/rankings", params={"metric": "revenue"}, headers={"Authorization": f"Bearer {login_user}"})
+    assert response.status_code == 422
+
+
+def test_get_portfolio_trends(login_user):
+    headers = {"Authorization": f"Bearer {login_user}"}
+    today = date.today()
+    previous = date(today.year, today.month, 1) - timedelta(days=1)
+    for day in (previous, today):
+        response = client.post("/v1/performance/restaurants/24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4/metrics", params={"year": day.year, "month": day.month}, headers=headers)
+        assert response.status_code == 200
+
+    response = client.get("/v1/performance/trends", params={"months": 3, "metric": "total_orders", "sort_by": "slope", "limit": 10000}, headers=headers)
+    assert response.status_code == 200
+    trends = response.json()
+    restaurant = next(t for t in trends if t["restaurant_id"] == "24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4")
+    assert restaurant["months"] >= 2
+    assert set(restaurant["trends"]) == {"total_orders", "total_amount", "average_order_value", "order_frequency"}
+    assert restaurant["trends"]["total_orders"]["volatility"] >= 0
+    slopes = [t["trends"]["total_orders"]["slope"] for t in trends]
+    assert slopes == sorted(slopes, reverse=True)
+
+
+def test_get_portfolio_trends_rejects_unknown_sort_keys(login_user):
+    headers = {"Authorization": f"Bearer {login_user}"}
+    assert client.get("/v1/performance/trends", params={"metric": "revenue"}, headers=headers).status_code == 422
+    assert client.get("/v1/performance/trends", params={"sort_by": "median"}, headers=headers).status_code == 422
+
+
+def test_series_trends_matches_least_squares():
+    months = np.array([0, 1, 2, 5, 7, 8])
+    values = np.array([[10.0], [20.0], [15.0], [3.0], [0.0], [6.0]])
+    trends = series_trends(months, values, np.array([0, 3, 5]))
+    assert trends["slope"][:, 0] == pytest.approx([np.polyfit([0, 1, 2], [10, 20, 15], 1)[0], np.polyfit([5, 7], [3, 0], 1)[0], 0])
+    assert trends["percent_change"][:, 0] == pytest.approx([50, -100, 0])
+    assert trends["volatility"][:, 0] == pytest.approx([np.std([1.0, -0.25]) * 100, 0, 0])
@@ -0,0 +1,29 @@
+from fastapi.testclient import TestClient
+from main import app
+from tests.login_fixture import login_user
+
+client = TestClient(app)
+
+RESTAURANT_ID = "24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4"
+USER_ID = "2b890904-0356-494c-afc4-7222f406ce85"
+
+
+def test_get_portfolio(login_user):
+    headers = {"Authorization": f"Bearer {login_user}"}
+    call_plan_data = {"restaurant_id": RESTAURANT_ID, "user_id": USER_ID, "frequency_days": 7}
+    assert client.post("/v1/call-plans/", json=call_plan_data, headers=headers).status_code == 201
+    before = next(r for r in client.get("/v1/portfolio", headers=headers).json()["restaurants"] if r["restaurant_id"] == RESTAURANT_ID)
+
+    order_data = {"restaurant_id": RESTAURANT_ID, "user_id": USER_ID, "amount": 120}
+    assert client.post("/v1/orders/", json=order_data, headers=headers).status_code == 201
+
+    response = client.get("/v1/portfolio", headers=headers)
+    assert response.status_code == 200
+    portfolio = response.json()
+    assert portfolio["total"] == len(portfolio["restaurants"])
+    assert portfolio["due_calls"] == sum(r["due_calls"] for r in portfolio["restaurants"])
+    restaurant = next(r for r in portfolio["restaurants"] if r["restaurant_id"] == RESTAURANT_ID)
+    assert restaurant["month_order_count"] == before["month_order_count"] + 1
+    assert restaurant["month_revenue"] == before["month_revenue"] + 120
+    assert restaurant["last_interaction_at"] is not None
+    assert restaurant["next_call_date"] is not None
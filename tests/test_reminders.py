@@ -0,0 +1,120 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+
+from core.database import get_active_engine
+from core.notifier import FileNotifier, Notifier
+from jobs.dispatch_reminders import dispatch
+
+DISPATCH_NAME = "reminder-test"
+USERS = ["reminder-test-u1", "reminder-test-u2", "reminder-test-u3"]
+
+SEED_STATEMENTS = [
+    """INSERT INTO restaurant (restaurant_id, name, address, phone, email, status, created_at, updated_at)
+       VALUES ('reminder-test-r', 'Restaurant', 'addr', '1', 'r@reminder.test', 'NEW', now(), now())""",
+    """INSERT INTO "user" (user_id, name, email, phone, role, hashed_password, restaurant_id, created_at, updated_at)
+       SELECT 'reminder-test-u' || g, 'KAM ' || g, 'u' || g || '@reminder.test', '1', 'MANAGER', 'x', 'reminder-test-r', now(), now() FROM generate_series(1, 3) g""",
+    # User g has g plans, due on consecutive days of January 1990, and one plan due in February
+    """INSERT INTO call_plan (call_plan_id, restaurant_id, user_id, frequency_days, next_call_date, created_at, updated_at)
+       SELECT 'reminder-test-c' || g || '-' || i, 'reminder-test-r', 'reminder-test-u' || g, 7, date '1990-01-01' + i, now(), now()
+       FROM generate_series(1, 3) g, generate_series(1, g) i""",
+    """INSERT INTO call_plan (call_plan_id, restaurant_id, user_id, frequency_days, next_call_date, created_at, updated_at)
+       VALUES ('reminder-test-later', 'reminder-test-r', 'reminder-test-u1', 7, date '1990-02-10', now(), now())""",
+]
+
+
+class CollectingNotifier(Notifier):
+    def __init__(self, fail_after: int = None):
+        self.digests = []
+        self.fail_after = fail_after
+
+    def send(self, digest):
+        # Plans of other tests are due in these periods too
+        if digest["user_id"] not in USERS:
+            return
+        if self.fail_after is not None and len(self.digests) == self.fail_after:
+            raise RuntimeError("notifier down")
+        self.digests.append(digest)
+
+
+def _cleanup(connection):
+    connection.execute(text("DELETE FROM reminder_dispatch WHERE name = :name"), {"name": DISPATCH_NAME})
+    connection.execute(text("DELETE FROM call_plan WHERE restaurant_id = 'reminder-test-r'"))
+    connection.execute(text("""DELETE FROM "user" WHERE restaurant_id = 'reminder-test-r'"""))
+    connection.execute(text("DELETE FROM restaurant WHERE restaurant_id = 'reminder-test-r'"))
+
+
+@pytest.fixture
+def engine():
+    engine = get_active_engine()
+    with engine.begin() as connection:
+        _cleanup(connection)
+        for statement in SEED_STATEMENTS:
+            connection.execute(text(statement))
+    yield engine
+    with engine.begin() as connection:
+        _cleanup(connection)
+
+
+def test_dispatch_sends_one_digest_per_user(engine):
+    notifier = CollectingNotifier()
+    # Chunks of two rows split the plans of user 3 across chunks
+    result = dispatch(engine, notifier, "worker-a", until=date(1990, 1, 31), name=DISPATCH_NAME, chunk_size=2)
+    assert result["completed"]
+    assert [(digest["user_id"], digest["due_calls"], digest["overdue"]) for digest in notifier.digests] == [(user, n, n) for n, user in enumerate(USERS, 1)]
+    assert [call["next_call_date"] for call in notifier.digests[2]["calls"]] == [date(1990, 1, 2), date(1990, 1, 3), date(1990, 1, 4)]
+
+    # A plan is reminded once per due date, and again on later days while it stays due
+    notifier = CollectingNotifier()
+    dispatch(engine, notifier, "worker-a", until=date(1990, 1, 31), name=DISPATCH_NAME)
+    assert notifier.digests == []
+    dispatch(engine, notifier, "worker-a", until=date(1990, 2, 28), name=DISPATCH_NAME)
+    assert [(digest["user_id"], digest["due_calls"], digest["overdue"]) for digest in notifier.digests] == [
+        ("reminder-test-u1", 2, 2),
+        ("reminder-test-u2", 2, 2),
+        ("reminder-test-u3", 3, 3),
+    ]
+
+
+def test_plan_added_after_the_days_run_is_reminded(engine):
+    dispatch(engine, CollectingNotifier(), "worker-a", until=date(1990, 1, 31), name=DISPATCH_NAME)
+    # Created later that day, due before the previous run's due date
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                """INSERT INTO call_plan (call_plan_id, restaurant_id, user_id, frequency_days, next_call_date, created_at, updated_at)
+                   VALUES ('reminder-test-backdated', 'reminder-test-r', 'reminder-test-u2', 7, date '1990-01-15', now(), now())"""
+            )
+        )
+
+    notifier = CollectingNotifier()
+    dispatch(engine, notifier, "worker-a", until=date(1990, 1, 31), name=DISPATCH_NAME)
+    assert [(digest["user_id"], [call["call_plan_id"] for call in digest["calls"]]) for digest in notifier.digests] == [("reminder-test-u2", ["reminder-test-backdated"])]
+
+
+def test_dispatch_needs_the_lease(engine):
+    with engine.begin() as connection:
+        connection.execute(
+            text("INSERT INTO reminder_dispatch (name, lease_owner, lease_expires_at) VALUES (:name, 'worker-b', now() + interval '1 minute')"), {"name": DISPATCH_NAME}
+        )
+    assert dispatch(engine, CollectingNotifier(), "worker-a", until=date(1990, 1, 31), name=DISPATCH_NAME) is None
+
+
+def test_interrupted_dispatch_resumes_from_last_checkpoint(engine):
+    with pytest.raises(RuntimeError):
+        dispatch(engine, CollectingNotifier(fail_after=2), "worker-a", until=date(1990, 1, 31), name=DISPATCH_NAME, chunk_size=1, lease_seconds=0)
+
+    # The lease has expired, another worker finishes the run without the plans recorded as sent at a chunk boundary
+    notifier = CollectingNotifier()
+    result = dispatch(engine, notifier, "worker-b", until=date(1990, 2, 28), name=DISPATCH_NAME, chunk_size=1)
+    assert result["completed"]
+    assert [digest["user_id"] for digest in notifier.digests] == ["reminder-test-u3"]
+    assert notifier.digests[0]["due_date"] == date(1990, 1, 31)
+
+
+def test_file_notifier_appends_json_lines(tmp_path):
+    notifier = FileNotifier(str(tmp_path / "reminders.jsonl"))
+    notifier.send({"user_id": "u1", "due_date": date(1990, 1, 31)})
+    notifier.send({"user_id": "u2", "due_date": date(1990, 1, 31)})
+    assert (tmp_path / "reminders.jsonl").read_text().splitlines() == ['{"user_id": "u1", "due_date": "1990-01-31"}', '{"user_id": "u2", "due_date": "1990-01-31"}']
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, text
+
+import core.database as database
+from core.database import ReplicaSet
+from models import base_model
+from models.restaurant import Restaurant
+from repository.restaurant import RestaurantRepository
+
+
+@pytest.fixture
+def replica_setup(tmp_path, monkeypatch):
+    """Primary and replica stand-ins backed by two SQLite files"""
+    primary_path = str(tmp_path / "primary.db")
+    replica_path = str(tmp_path / "replica.db")
+
+    def sqlite_engine(connection_overrides: dict = None):
+        return create_engine(f"sqlite:///{(connection_overrides or {}).get('db_name', primary_path)}")
+
+    monkeypatch.setenv("DB_SESSION_MODE", "sync")
+    monkeypatch.setattr(database, "_ENGINES", {})
+    monkeypatch.setattr(database, "_SESSION_FACTORIES", {})
+    monkeypatch.setitem(database.DB_ENGINE_MAPPING, database.default_db, sqlite_engine)
+
+    for path, name in ((primary_path, "primary"), (replica_path, "replica")):
+        engine = create_engine(f"sqlite:///{path}")
+        base_model.Base.metadata.create_all(engine, tables=[Restaurant.__table__])
+        with engine.begin() as connection:
+            connection.execute(
+                text("INSERT INTO restaurant (restaurant_id, name, address, phone, email, created_at, updated_at) VALUES (:id, :name, 'addr', '1', 'e', '2024-12-01 10:00:00', '2024-12-01 10:00:00')"),
+                {"id": name, "name": name},
+            )
+        engine.dispose()
+
+    def use_replicas(replicas):
+        monkeypatch.setattr(database, "_replica_set", ReplicaSet(replicas, eject_seconds=60))
+        return database._replica_set
+
+    yield replica_path, use_replicas
+    database.dispose()
+
+
+def test_read_only_calls_use_replica(replica_setup):
+    replica_path, use_replicas = replica_setup
+    use_replicas([{"db_name": replica_path}])
+
+    restaurants = asyncio.run(RestaurantRepository().get_all())
+    assert [r.name for r in restaurants] == ["replica"]
+
+
+def test_reads_stay_on_primary_after_write(replica_setup):
+    replica_path, use_replicas = replica_setup
+    use_replicas([{"db_name": replica_path}])
+
+    async def write_then_read():
+        with database.read_your_writes():
+            await RestaurantRepository().create(name="new", address="addr", phone="1", email="e")
+            return await RestaurantRepository().get_all()
+
+    restaurants = asyncio.run(write_then_read())
+    assert sorted(r.name for r in restaurants) == ["new", "primary"]
+
+
+def test_written_marker_ends_with_its_scope(replica_setup):
+    replica_path, use_replicas = replica_setup
+    use_replicas([{"db_name": replica_path}])
+
+    async def write_then_read():
+        with database.read_your_writes():
+            await RestaurantRepository().create(name="new", address="addr", phone="1", email="e")
+        # A long-lived task writing outside of a request must not pin its later reads to the primary
+        await RestaurantRepository().create(name="other", address="addr", phone="1", email="e")
+        return await RestaurantRepository().get_all()
+
+    restaurants = asyncio.run(write_then_read())
+    assert [r.name for r in restaurants] == ["replica"]
+
+
+def test_unreachable_replica_is_ejected(replica_setup, tmp_path):
+    _, use_replicas = replica_setup
+    replica_set = use_replicas([{"db_name": str(tmp_path / "missing" / "replica.db")}])
+
+    restaurants = asyncio.run(RestaurantRepository().get_all())
+    assert [r.name for r in restaurants] == ["primary"]
+    assert replica_set.stats()["ejected"] == [0]
+    assert replica_set.choose() is None
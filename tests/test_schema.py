@@ -0,0 +1,55 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+import core.schema as schema
+from core.database import get_active_engine
+from migrations.indexes import declared_indexes
+from models import base_model
+
+SCRATCH_SCHEMA = "schema_upgrade_test"
+# Declared before schema versioning, every existing database has them
+BASELINE_INDEXES = {"ix_interaction_user_id", "ix_performance_metric_restaurant_id"}
+
+
+@pytest.fixture
+def version_2_engine(monkeypatch):
+    """A database at schema version 2, before the versioned indexes, in a scratch Postgres schema"""
+    with get_active_engine().connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text(f"DROP SCHEMA IF EXISTS {SCRATCH_SCHEMA} CASCADE"))
+        connection.execute(text(f"CREATE SCHEMA {SCRATCH_SCHEMA}"))
+    engine = create_engine(get_active_engine().url, connect_args={"options": f"-csearch_path={SCRATCH_SCHEMA}"})
+    base_model.Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for index in declared_indexes():
+            if index.name in BASELINE_INDEXES:
+                continue
+            connection.execute(text(f'DROP INDEX "{index.name}"'))
+        connection.execute(text('ALTER TABLE "order" DROP COLUMN version'))
+        connection.execute(text("INSERT INTO schema_version (version, description, applied_at) VALUES (2, 'upgrade to version 2', now()::text)"))
+    monkeypatch.setattr(schema, "get_active_engine", lambda: engine)
+    yield engine
+    engine.dispose()
+    with get_active_engine().connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text(f"DROP SCHEMA {SCRATCH_SCHEMA} CASCADE"))
+
+
+def test_upgrade_removes_duplicated_metrics_before_the_unique_index(version_2_engine):
+    with version_2_engine.begin() as connection:
+        connection.execute(
+            text("INSERT INTO restaurant (restaurant_id, name, address, phone, email, status, created_at, updated_at) VALUES ('r1', 'R', 'addr', '1', 'e', 'NEW', now(), now())")
+        )
+        # Metric generation used to add a row on every run
+        for metric_id in ("m1", "m2"):
+            connection.execute(
+                text(
+                    "INSERT INTO performance_metric (metric_id, restaurant_id, period_start, period_end, created_at, updated_at) "
+                    "VALUES (:id, 'r1', '2024-01-01', '2024-01-31', now(), now())"
+                ),
+                {"id": metric_id},
+            )
+
+    assert schema.bootstrap_schema() == schema.SCHEMA_VERSION
+    with version_2_engine.connect() as connection:
+        assert connection.execute(text("SELECT count(*) FROM performance_metric")).scalar() == 1
+        indexes = set(connection.execute(text("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema()")).scalars())
+    assert {index.name for index in declared_indexes()} <= indexes
@@ -1,3 +1,5 @@
+import uuid
+
 import pytest
 from fastapi.testclient import TestClient
 from tests.login_fixture import login_user
@@ -9,7 +11,7 @@ client = TestClient(app)
 def test_create_user(login_user):
     user_data = {
         "name": "Test User",
-        "email": "test@example.com",
+        "email": f"test-{uuid.uuid4().hex[:8]}@example.com",
         "phone": "+1234567890",
         "role": "Staff",
         "restaurant_id": "24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4",
@@ -24,3 +26,16 @@ def test_get_user(login_user):
     response = client.get("/v1/user/2b890904-0356-494c-afc4-7222f406ce85", headers={"Authorization": f"Bearer {login_user}"})
     assert response.status_code == 200
     assert "name" in response.json()
+
+
+def test_create_user_with_taken_email(login_user):
+    user_data = {
+        "name": "Test User",
+        "email": "kfc_user1@email.com",
+        "phone": "+1234567890",
+        "role": "Staff",
+        "restaurant_id": "24e3c305-e9b5-46f4-94b9-3d3d8aa0cff4",
+        "password": "password",
+    }
+    response = client.post("/v1/auth/register/", json=user_data, headers={"Authorization": f"Bearer {login_user}"})
+    assert response.status_code == 409